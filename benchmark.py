@@ -0,0 +1,380 @@
+"""
+benchmark.py - Замер производительности моделей YOLO на синтетических или записанных кадрах
+
+Запуск: python benchmark.py [--models segmentation] [--backends torch onnx] [--imgsz 320 640]
+                            [--half 0 1] [--batch 1 4] [--threads 0 4] [--source папка|URL]
+                            [--json results.json] [--compare baseline.json]
+Для каждой комбинации параметров: перцентили задержки вызова модели, пропускная
+способность (кадров/с) и пиковая память процесса (RSS); результаты - таблица и JSON.
+С --compare сравнивает пропускную способность с прошлым запуском и завершается с кодом 1
+при падении больше --tolerance
+
+python benchmark.py --overlay [--people 1 4 16] - время наложения масок в зависимости
+от числа людей на кадре (без моделей): MaskCompositor и прежнее наложение по человеку
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+import cv2
+import numpy as np
+import psutil
+import torch
+
+from config import (
+    YOLO_MODELS, YOLO_CONFIG, DEVICE_INFO, CAMERA_CONFIG, MODEL_BACKEND_CONFIG,
+    INFERENCE_STATS_CONFIG, LOGGING_CONFIG, init_device
+)
+from frame_sources import open_frame_source
+from detections import PersonDetections
+from latency_stats import LatencyHistogram
+from mask_compositor import MaskCompositor
+from model_backends import ExportCache, is_backend_available, load_model, runtime_threads
+from model_manager import ModelManager
+
+logger = logging.getLogger(__name__)
+
+
+class PeakMemorySampler:
+    """Пиковая память процесса (RSS) за время замера: опрос в отдельном потоке"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+        self.peak = 0
+        self._stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop_event.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def _sample_loop(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def load_frames(source: Optional[str], count: int) -> List[np.ndarray]:
+    """Кадры для замера: синтетический поток или папка изображений/видео, загружаются заранее"""
+    if source is None:
+        source = (f"synthetic://?width={CAMERA_CONFIG['width']}&height={CAMERA_CONFIG['height']}"
+                  f"&frames={count}&rate=max")
+    elif '://' not in source:
+        source = f"dir://{source}?rate=max"
+
+    cap = open_frame_source(source)
+    frames = []
+    try:
+        while len(frames) < count:
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                break
+            frames.append(frame)
+    finally:
+        cap.release()
+    return frames
+
+
+def run_case(model, frames: List[np.ndarray], imgsz: int, half: bool, batch: int,
+             iterations: int, warmup: int) -> dict:
+    """Задержка вызова модели на пакетах из batch кадров и пропускная способность"""
+    options = {**YOLO_CONFIG, 'imgsz': imgsz, 'half': half}
+    histogram = LatencyHistogram(INFERENCE_STATS_CONFIG['min_ms'], INFERENCE_STATS_CONFIG['max_ms'],
+                                 INFERENCE_STATS_CONFIG['precision'])
+    batches = itertools.cycle(range(0, len(frames), batch))
+
+    def next_images():
+        start = next(batches)
+        images = frames[start:start + batch]
+        # Последний неполный пакет дополняется с начала
+        return images + frames[:batch - len(images)]
+
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(next_images(), **options)
+
+        if DEVICE_INFO['available']:
+            torch.cuda.reset_peak_memory_stats()
+        with PeakMemorySampler() as memory:
+            total_start = time.perf_counter()
+            for _ in range(iterations):
+                images = next_images()
+                start = time.perf_counter()
+                model(images, **options)
+                if DEVICE_INFO['available']:
+                    torch.cuda.synchronize()
+                histogram.record(time.perf_counter() - start)
+            total_time = time.perf_counter() - total_start
+
+    stats = histogram.get_stats()
+    result = {
+        'iterations': iterations,
+        'p50_ms': stats['p50_ms'],
+        'p90_ms': stats['p90_ms'],
+        'p99_ms': stats['p99_ms'],
+        'max_ms': stats['max_ms'],
+        'frame_ms': round(total_time / (iterations * batch) * 1000, 2),
+        'throughput_fps': round(iterations * batch / total_time, 1),
+        'peak_rss_mb': round(memory.peak / 1024 ** 2, 1)
+    }
+    if DEVICE_INFO['available']:
+        result['gpu_peak_mb'] = round(torch.cuda.max_memory_allocated() / 1024 ** 2, 1)
+    return result
+
+
+def run_threads_case(model, backend: str, threads: int, frames: List[np.ndarray], imgsz: int, half: bool,
+                     batch: int, iterations: int, warmup: int) -> dict:
+    """Замер с threads потоками inference
+
+    torch.set_num_threads не влияет на сессии ONNX Runtime / OpenVINO: для них
+    сессия пересоздается с threads потоками при прогреве (как у копий пула)
+    """
+    if backend in ('torch', 'torchscript'):
+        return run_case(model, frames, imgsz, half, batch, iterations, warmup)
+
+    with runtime_threads(backend, threads) as report:
+        model.predictor = None
+        # Создание сессии приходится на прогрев и не входит в замер
+        metrics = run_case(model, frames, imgsz, half, batch, iterations, max(warmup, 1))
+    if not report['sessions']:
+        raise RuntimeError(f"сессия {backend} создана без ограничения потоков")
+    return metrics
+
+
+def run_benchmark(args, frames: List[np.ndarray]) -> List[dict]:
+    """Все комбинации параметров; модель загружается заново для каждой пары backend/precision"""
+    cache = ExportCache(MODEL_BACKEND_CONFIG['export_dir'])
+    default_threads = torch.get_num_threads()
+    results = []
+
+    for model_key, backend, half in itertools.product(args.models, args.backends, args.half):
+        half = bool(half)
+        case = {'model': model_key, 'backend': backend, 'half': half}
+        if not is_backend_available(backend):
+            logger.warning(f"⚠️ Backend {backend} не установлен - пропуск")
+            continue
+        # FP16 только для PyTorch на GPU
+        if half and (backend != 'torch' or not DEVICE_INFO['available']):
+            logger.info(f"⏭️ {model_key}/{backend}: FP16 недоступен на {DEVICE_INFO['device'].upper()} - пропуск")
+            continue
+
+        load_start = time.time()
+        model, info = load_model(YOLO_MODELS[model_key], backend, cache)
+        if info['backend'] != backend:
+            logger.warning(f"⚠️ {model_key}: backend {backend} не загружен ({info.get('fallback_reason')}) - пропуск")
+            continue
+        if backend == 'torch':
+            model.to(DEVICE_INFO['device'])
+            if half:
+                model.half()
+            model.eval()
+        load_sec = round(time.time() - load_start, 2)
+
+        for imgsz, batch, threads in itertools.product(args.imgsz, args.batch, args.threads):
+            threads = threads or default_threads
+            torch.set_num_threads(threads)
+            logger.info(f"⏱️ {model_key} {backend} {'fp16' if half else info['precision']} "
+                        f"imgsz={imgsz} batch={batch} threads={threads}")
+            try:
+                metrics = run_threads_case(model, backend, threads, frames, imgsz, half, batch,
+                                           args.iterations, args.warmup)
+            except Exception as e:
+                logger.error(f"❌ Ошибка замера: {e}")
+                continue
+
+            results.append({
+                **case,
+                'precision': 'fp16' if half else info['precision'],
+                'imgsz': imgsz,
+                'batch': batch,
+                'threads': threads,
+                'load_sec': load_sec,
+                **metrics
+            })
+
+        del model
+        if DEVICE_INFO['available']:
+            torch.cuda.empty_cache()
+
+    torch.set_num_threads(default_threads)
+    return results
+
+
+def synthetic_people(count: int, frame_shape, rng: np.random.Generator) -> PersonDetections:
+    """Люди с эллиптическими масками в случайных местах кадра"""
+    frame_h, frame_w = frame_shape
+    boxes = np.empty((count, 4), np.float32)
+    masks = []
+    for index in range(count):
+        width, height = rng.integers(40, 120), rng.integers(100, 300)
+        x1, y1 = rng.integers(0, frame_w - width), rng.integers(0, frame_h - height)
+        boxes[index] = (x1, y1, x1 + width, y1 + height)
+        y, x = np.ogrid[:height, :width]
+        masks.append(((x - width / 2) / (width / 2)) ** 2 + ((y - height / 2) / (height / 2)) ** 2 <= 1)
+    return PersonDetections(boxes, np.ones(count, np.float32), boxes.astype(np.int32), masks,
+                            list(range(1, count + 1)))
+
+
+def legacy_overlay(frame: np.ndarray, detections: PersonDetections, opacity: float) -> np.ndarray:
+    """Прежнее наложение: полный кадр маски и addWeighted по всему кадру на каждого человека"""
+    annotated_frame = frame.copy()
+    for (x1, y1, x2, y2), mask in zip(detections.rects, detections.masks):
+        colored_mask = np.zeros_like(frame)
+        colored_mask[y1:y2, x1:x2][mask] = np.random.randint(50, 255, 3)
+        annotated_frame = cv2.addWeighted(annotated_frame, 1.0 - opacity, colored_mask, opacity, 0)
+    return annotated_frame
+
+
+def run_overlay_benchmark(people_counts: List[int], iterations: int) -> List[dict]:
+    """Время наложения масок на кадр CAMERA_CONFIG для разного числа людей"""
+    frame_shape = (CAMERA_CONFIG['height'], CAMERA_CONFIG['width'])
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (*frame_shape, 3), dtype=np.uint8)
+    compositor = MaskCompositor()
+    results = []
+
+    for count in people_counts:
+        detections = synthetic_people(count, frame_shape, rng)
+        result = {'people': count}
+        for name, draw in (('compositor', compositor.draw), ('legacy', legacy_overlay)):
+            histogram = LatencyHistogram(INFERENCE_STATS_CONFIG['min_ms'], INFERENCE_STATS_CONFIG['max_ms'],
+                                         INFERENCE_STATS_CONFIG['precision'])
+            draw(frame, detections, 0.3)
+            for _ in range(iterations):
+                start = time.perf_counter()
+                draw(frame, detections, 0.3)
+                histogram.record(time.perf_counter() - start)
+            stats = histogram.get_stats()
+            result[f'{name}_p50_ms'] = stats['p50_ms']
+            result[f'{name}_p99_ms'] = stats['p99_ms']
+        result['speedup'] = round(result['legacy_p50_ms'] / result['compositor_p50_ms'], 1) if result['compositor_p50_ms'] else None
+        results.append(result)
+    return results
+
+
+def case_key(result: dict) -> str:
+    return (f"{result['model']}/{result['backend']}/{result['precision']}/"
+            f"{result['imgsz']}/{result['batch']}/{result['threads']}")
+
+
+def compare_results(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """Отметка изменения пропускной способности относительно прошлого запуска; список регрессий"""
+    previous = {case_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get(case_key(result))
+        if not base or not base['throughput_fps']:
+            continue
+        change = result['throughput_fps'] / base['throughput_fps'] - 1
+        result['baseline_fps'] = base['throughput_fps']
+        result['change'] = round(change, 3)
+        if change < -tolerance:
+            regressions.append(case_key(result))
+    return regressions
+
+
+def print_table(results: List[dict], columns: Optional[list] = None):
+    columns = columns or [
+        ('model', 12), ('backend', 8), ('precision', 9), ('imgsz', 5), ('batch', 5), ('threads', 7),
+        ('p50_ms', 8), ('p90_ms', 8), ('p99_ms', 8), ('max_ms', 8), ('frame_ms', 8),
+        ('throughput_fps', 14), ('peak_rss_mb', 11)
+    ]
+    if any('change' in result for result in results) and ('change', 7) not in columns:
+        columns.append(('change', 7))
+
+    print(' '.join(name.rjust(width) for name, width in columns))
+    for result in results:
+        print(' '.join(str(result.get(name, '')).rjust(width) for name, width in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер производительности моделей YOLO")
+    parser.add_argument('--models', nargs='+', choices=sorted(YOLO_MODELS), default=ModelManager.required_models())
+    parser.add_argument('--backends', nargs='+', choices=('torch', 'torchscript', 'onnx', 'openvino'), default=['torch'])
+    parser.add_argument('--imgsz', nargs='+', type=int, help="Размер входа (по умолчанию - YOLO_CONFIG устройства)")
+    parser.add_argument('--half', nargs='+', type=int, choices=(0, 1), help="FP16 (по умолчанию - YOLO_CONFIG устройства)")
+    parser.add_argument('--batch', nargs='+', type=int, default=[1])
+    parser.add_argument('--threads', nargs='+', type=int, default=[0], help="Потоков torch (0 - по умолчанию)")
+    parser.add_argument('--source', help="Папка изображений или URL источника (по умолчанию синтетические кадры)")
+    parser.add_argument('--frames', type=int, default=32, help="Кадров, загружаемых в память")
+    parser.add_argument('--iterations', type=int, default=50, help="Вызовов модели на комбинацию")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--json', help="Файл результатов JSON (по умолчанию - вывод в консоль)")
+    parser.add_argument('--compare', help="JSON прошлого запуска для поиска регрессий")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Допустимое падение пропускной способности")
+    parser.add_argument('--overlay', action='store_true', help="Замер наложения масок вместо моделей")
+    parser.add_argument('--people', nargs='+', type=int, default=[1, 2, 4, 8, 16, 32], help="Людей на кадре для --overlay")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, LOGGING_CONFIG['level']), format=LOGGING_CONFIG['format'])
+
+    if args.overlay:
+        results = run_overlay_benchmark(args.people, args.iterations)
+        print_table(results, [
+            ('people', 6), ('compositor_p50_ms', 17), ('compositor_p99_ms', 17),
+            ('legacy_p50_ms', 13), ('legacy_p99_ms', 13), ('speedup', 7)
+        ])
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'overlay': results}, f,
+                          ensure_ascii=False, indent=2)
+        return 0
+
+    # Значения по умолчанию - после определения устройства: на GPU другие imgsz и half
+    init_device()
+    args.imgsz = args.imgsz or [YOLO_CONFIG['imgsz']]
+    args.half = args.half or [int(YOLO_CONFIG['half'])]
+
+    frames = load_frames(args.source, args.frames)
+    if not frames:
+        logger.error(f"❌ Нет кадров в источнике {args.source}")
+        return 1
+    logger.info(f"🖼️ Кадров для замера: {len(frames)} ({frames[0].shape[1]}x{frames[0].shape[0]}), "
+                f"устройство: {DEVICE_INFO['device'].upper()}")
+
+    results = run_benchmark(args, frames)
+    if not results:
+        logger.error("❌ Нет результатов замера")
+        return 1
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f)['results'], args.tolerance)
+
+    print_table(results)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'device': DEVICE_INFO,
+        'frames': {'count': len(frames), 'shape': list(frames[0].shape), 'source': args.source or 'synthetic'},
+        'results': results
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 Результаты сохранены: {args.json}")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if regressions:
+        logger.error(f"❌ Падение пропускной способности больше {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
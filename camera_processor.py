@@ -3,42 +3,127 @@ camera_processor.py - Обработка видеопотоков камер с
 """
 
 import cv2
-import numpy as np
 import threading
 import time
 import logging
 import queue
+from collections import deque
 from typing import Optional, Callable
 
-from config import CAMERA_CONFIG, PROCESSING_CONFIG, OBJECT_CLASSES
+from config import CAMERA_CONFIG, PROCESSING_CONFIG, MOTION_GATE_CONFIG, RESULT_CACHE_CONFIG, ADAPTIVE_RATE_CONFIG, ROI_CONFIG, TILING_CONFIG, TRACKER_CONFIG, CASCADE_CONFIG, MODEL_LOADING_CONFIG
+from capture_worker import CaptureProcessHandle
+from cascade import DetectorCascade
+from frame_sources import open_frame_source
+from motion_gate import MotionGate
+from mask_compositor import MaskCompositor
+from result_cache import FrameResultCache
+from rate_controller import AdaptiveRateController
+from latency_stats import FrameLatencyTracker
+from detections import PersonDetections
+from tiling import TiledInference
+from tracker import PersonTracker
+from shared_frame_ring import (
+    FRAME_FLAG_PREVIEW, FRAME_FLAG_INFERENCE,
+    HEADER_GRABBED, HEADER_SKIPPED, HEADER_RETRIEVE_NS, HEADER_SOURCE_DONE
+)
 
 logger = logging.getLogger(__name__)
 
+
+class FramePacket:
+    """Кадр в очереди обработки; seq задан для кадров из разделяемой памяти"""
+    
+    __slots__ = ('frame', 'seq', 'captured_at', 'queued_at')
+    
+    def __init__(self, frame, seq: Optional[int] = None, captured_at: float = 0.0):
+        self.frame = frame
+        self.seq = seq
+        self.captured_at = captured_at
+        self.queued_at = time.time()  # Пакет создается непосредственно перед постановкой в очередь
+
+
 class CameraProcessor:
     """Процессор для обработки видеопотока камеры с поддержкой CUDA и подсчетом площади сегментации"""
     
-    def __init__(self, camera_id: str, camera_streams: dict, yolo_model, alarm_callback: Callable, model_manager=None, segmentation_callback=None):
+    def __init__(self, camera_id: str, camera_state, yolo_model, alarm_callback: Callable, model_manager=None, segmentation_callback=None, inference_scheduler=None):
         self.camera_id = camera_id
-        self.camera_streams = camera_streams
+        self.state = camera_state  # CameraState из реестра камер
         self.yolo_model = yolo_model
         self.alarm_callback = alarm_callback
         self.model_manager = model_manager
         self.segmentation_callback = segmentation_callback  # Новый callback для площади сегментации
+        self.inference_scheduler = inference_scheduler  # Общий планировщик пакетного inference
+        
+        # Модель берется у model_manager при запуске обработки и возвращается при отключении
+        self.model_key = MODEL_LOADING_CONFIG['mode_models'][camera_state.mode]
+        self.model_acquired = False
+        # Версия модели и кадры по версиям; новые версии {ключ модели: (модель, версия)} применяются между кадрами
+        self.model_version: Optional[str] = None
+        self.pending_models = {}
+        self.version_frames = {}
+        
+        # Каскад: детектор людей перед сегментацией (модель детектора берется вместе с основной)
+        self.cascade = (DetectorCascade()
+                        if CASCADE_CONFIG['enabled'] and CASCADE_CONFIG['detector_model'] != self.model_key else None)
+        self.detector_model = None
+        self.detector_version: Optional[str] = None
         
         self.running = False
+        self.source_finished = False  # Локальный источник без повтора закончился
+        self.paced_source = True  # False - источник с rate=max, кадры не отбрасываются
         self.capture_thread: Optional[threading.Thread] = None
         self.process_thread: Optional[threading.Thread] = None
         self.lock = threading.Lock()
+        self.last_frame_time = 0.0  # Время последнего полученного кадра (для watchdog)
         self.process_queue = queue.Queue(maxsize=PROCESSING_CONFIG['queue_maxsize'])
+        self.current_packet: Optional[FramePacket] = None  # Пакет кадра, обрабатываемого сейчас
         
         # Статистика производительности
         self.frame_stats = {
             'processed_frames': 0,
             'dropped_frames': 0,
+            'ring_overruns': 0,
             'last_fps_update': time.time(),
             'fps': 0.0
         }
         
+        # Статистика захвата (grab/retrieve)
+        self.capture_stats = {
+            'grabbed_frames': 0,
+            'retrieved_frames': 0,
+            'skipped_retrieves': 0,
+            'retrieve_time': 0.0
+        }
+        
+        # Предфильтр движения и последние результаты для повторного использования
+        self.motion_gate = MotionGate() if MOTION_GATE_CONFIG['enabled'] else None
+        self.last_results: Optional[PersonDetections] = None
+        self.last_segmentation_area = 0
+        self.inference_time_avg = 0.0
+        
+        # Результаты по отпечатку кадра: повторно присланный кадр не обрабатывается заново
+        self.result_cache = FrameResultCache() if RESULT_CACHE_CONFIG['enabled'] else None
+        
+        # Зоны интереса (ZoneLayout); None - обрабатывается весь кадр
+        self.zone_layout = None
+        
+        # Плиточный inference кадров исходного разрешения (TiledInference); None - выключен
+        self.tiler = (TiledInference(TILING_CONFIG['tile_size'], TILING_CONFIG['overlap'])
+                      if TILING_CONFIG['enabled'] else None)
+        
+        # Треки людей: inference на ключевых кадрах, идентификаторы для алармов
+        self.tracker = PersonTracker() if TRACKER_CONFIG['enabled'] else None
+        
+        # Наложение масок за один проход с буфером камеры и постоянными цветами треков
+        self.mask_compositor = MaskCompositor()
+        
+        # Задержки по этапам: захват, декодирование, очередь, inference, отрисовка, отправка
+        self.latency = FrameLatencyTracker()
+        
+        # Регулятор шага пропуска кадров по задержке и заполнению очереди
+        self.rate_controller = (AdaptiveRateController(PROCESSING_CONFIG['frame_skip'])
+                                if ADAPTIVE_RATE_CONFIG['enabled'] else None)
+        
         # Статистика сегментации
         self.segmentation_stats = {
             'last_segmentation_area': 0,
@@ -48,23 +133,25 @@ class CameraProcessor:
         }
 
     def connect_camera(self, rtsp_url: str) -> bool:
-        """Подключение к RTSP камере"""
+        """Подключение к RTSP камере или локальному источнику (file://, dir://, synthetic://)"""
         try:
-            logger.info(f"Подключение к RTSP камере: {rtsp_url}")
+            logger.info(f"Подключение к источнику: {rtsp_url}")
+            self.source_finished = False
             
-            cap = cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG)
+            if PROCESSING_CONFIG['capture_backend'] == 'process':
+                return self._connect_capture_process(rtsp_url)
             
-            # Настройка параметров для RTSP
-            self._configure_camera(cap)
+            # Открываем поток (для RTSP - с настройками из CAMERA_CONFIG)
+            cap = open_frame_source(rtsp_url)
             
             if cap.isOpened():
                 success = self._test_camera_connection(cap)
                 if success:
                     with self.lock:
-                        self.camera_streams[self.camera_id]['cap'] = cap
-                        self.camera_streams[self.camera_id]['connected'] = True
-                        self.camera_streams[self.camera_id]['config'] = {'rtsp_url': rtsp_url}
-                        self.camera_streams[self.camera_id]['frame_counter'] = 0
+                        self.state.cap = cap
+                        self.state.connected = True
+                        self.state.config = {'rtsp_url': rtsp_url}
+                        self.state.frame_counter = 0
                     
                     logger.info(f"Камера {self.camera_id} подключена успешно")
                     return True
@@ -79,15 +166,26 @@ class CameraProcessor:
             logger.error(f"Ошибка подключения к камере {self.camera_id}: {e}")
             return False
 
-    def _configure_camera(self, cap):
-        """Конфигурация параметров камеры"""
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_CONFIG['buffer_size'])
-        cap.set(cv2.CAP_PROP_FPS, CAMERA_CONFIG['fps'])
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_CONFIG['width'])
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_CONFIG['height'])
-        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('H', '2', '6', '4'))
-        cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, CAMERA_CONFIG['open_timeout'])
-        cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, CAMERA_CONFIG['read_timeout'])
+    def _connect_capture_process(self, rtsp_url: str) -> bool:
+        """Подключение через отдельный процесс захвата с кольцевым буфером в разделяемой памяти"""
+        handle = CaptureProcessHandle(self.camera_id, rtsp_url)
+        handle.start()
+        
+        # Открытие потока и проверочные попытки чтения выполняются в процессе захвата
+        timeout = CAMERA_CONFIG['open_timeout'] / 1000 + CAMERA_CONFIG['max_attempts']
+        if not handle.wait_first_frame(timeout):
+            logger.error(f"Процесс захвата {self.camera_id} не получил кадр за {timeout:.0f} с")
+            handle.release()
+            return False
+        
+        with self.lock:
+            self.state.cap = handle
+            self.state.connected = True
+            self.state.config = {'rtsp_url': rtsp_url, 'capture_backend': 'process'}
+            self.state.frame_counter = 0
+        
+        logger.info(f"Камера {self.camera_id} подключена успешно (процесс захвата)")
+        return True
 
     def _test_camera_connection(self, cap) -> bool:
         """Тестирование подключения к камере"""
@@ -106,41 +204,71 @@ class CameraProcessor:
         """Отключение камеры"""
         self.running = False
         
+        # Освобождаем ожидающий запрос в планировщике
+        if self.inference_scheduler:
+            self.inference_scheduler.unregister_camera(self.camera_id)
+        
         # Ждем завершения потоков
         if self.capture_thread and self.capture_thread.is_alive():
             self.capture_thread.join(timeout=3)
         if self.process_thread and self.process_thread.is_alive():
             self.process_thread.join(timeout=3)
+        
+        # Очередь может держать представления кадров из разделяемой памяти
+        self._clear_process_queue()
             
         with self.lock:
-            if self.camera_streams[self.camera_id]['cap']:
-                self.camera_streams[self.camera_id]['cap'].release()
-                
-            # Сброс состояния камеры
-            self.camera_streams[self.camera_id].update({
-                'cap': None,
-                'connected': False,
-                'frame': None,
-                'processed_frame': None,
-                'processing': False,
-                'frame_counter': 0,
-                'segmentation_area': 0  # Сброс площади сегментации
-            })
-            
-            if self.camera_streams[self.camera_id]['frame_queue']:
-                self.camera_streams[self.camera_id]['frame_queue'].clear()
-            
+            if self.state.cap:
+                self.state.cap.release()
+                
+            # Сброс состояния камеры (буферы освобождаются)
+            self.state.reset()
+        
+        self._release_model()
         logger.info(f"Камера {self.camera_id} отключена")
 
     def start_processing(self) -> bool:
         """Запуск обработки потока"""
-        if not self.camera_streams[self.camera_id]['connected']:
+        if not self.state.connected:
             return False
+        
+        # Первая камера режима загружает модель; без модели кадры показываются без обработки
+        self._acquire_model()
             
         self.running = True
-        self.camera_streams[self.camera_id]['processing'] = True
+        self.state.processing = True
         
-        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        # Буфер последних кадров создается только для работающей камеры
+        self.state.frame_queue = deque(maxlen=2)
+        
+        # Результаты прошлого подключения не должны повторяться
+        self.last_results = None
+        if self.motion_gate:
+            self.motion_gate.reset()
+        if self.tracker:
+            self.tracker.reset()
+        if self.result_cache:
+            self.result_cache.reset()
+        
+        # Очередь и регулятор - с настройками устройства, определенного при загрузке модели
+        self.process_queue = queue.Queue(maxsize=PROCESSING_CONFIG['queue_maxsize'])
+        if self.rate_controller:
+            self.rate_controller = AdaptiveRateController(PROCESSING_CONFIG['frame_skip'])
+        
+        self.paced_source = getattr(self.state.cap, 'realtime', True)
+        
+        # Отсчет для watchdog начинается с запуска обработки
+        self.last_frame_time = time.time()
+        
+        if self.inference_scheduler:
+            self.inference_scheduler.register_camera(self.camera_id)
+        
+        if isinstance(self.state.cap, CaptureProcessHandle):
+            capture_target = self._ring_reader_loop
+        else:
+            capture_target = self._capture_loop
+        
+        self.capture_thread = threading.Thread(target=capture_target, daemon=True)
         self.process_thread = threading.Thread(target=self._process_loop, daemon=True)
         
         self.capture_thread.start()
@@ -149,42 +277,161 @@ class CameraProcessor:
         logger.info(f"Обработка камеры {self.camera_id} запущена")
         return True
 
+    def _acquire_model(self):
+        """Получение модели режима камеры у model_manager (загрузка при первом запросе)"""
+        if not self.model_manager or self.model_acquired:
+            return
+        
+        model = self.model_manager.acquire(self.model_key, self)
+        if model is None:
+            logger.warning(f"⚠️ Модель {self.model_key} недоступна - камера {self.camera_id} работает без inference")
+            return
+        
+        self.yolo_model = model
+        self.model_version = self.model_manager.get_model_version(self.model_key, model)
+        self.model_acquired = True
+        
+        if self.cascade:
+            detector_key = CASCADE_CONFIG['detector_model']
+            detector = self.model_manager.acquire(detector_key, self)
+            if detector is None:
+                logger.warning(f"⚠️ Детектор {detector_key} недоступен - камера {self.camera_id} сегментирует каждый кадр")
+                return
+            self.detector_model = detector
+            self.detector_version = self.model_manager.get_model_version(detector_key, detector)
+
+    def _release_model(self):
+        """Возврат модели: без камер модель выгружается после простоя"""
+        if not self.model_acquired:
+            return
+        
+        self.model_acquired = False
+        self.yolo_model = None
+        self.model_version = None
+        with self.lock:
+            self.pending_models = {}
+        self.model_manager.release(self.model_key, self)
+        
+        if self.detector_model is not None:
+            self.detector_model = None
+            self.detector_version = None
+            self.model_manager.release(CASCADE_CONFIG['detector_model'], self)
+
+    def swap_model(self, model, version: str, model_key: Optional[str] = None):
+        """Новая версия модели от model_manager; поток обработки применит ее перед следующим кадром"""
+        with self.lock:
+            self.pending_models[model_key or self.model_key] = (model, version)
+
+    def _apply_pending_model(self):
+        """Переход на новые версии моделей между кадрами"""
+        with self.lock:
+            pending, self.pending_models = self.pending_models, {}
+        if not pending or not self.model_acquired:
+            return
+        
+        for model_key, (model, version) in pending.items():
+            if model_key == self.model_key:
+                self.yolo_model, self.model_version = model, version
+            elif self.detector_model is not None and model_key == CASCADE_CONFIG['detector_model']:
+                self.detector_model, self.detector_version = model, version
+            else:
+                continue
+            if self.result_cache:
+                self.result_cache.clear()
+            logger.info(f"🔁 Камера {self.camera_id}: модель {model_key} версии {version}")
+            self.model_manager.on_model_applied(model_key, version, self.camera_id)
+
     def _capture_loop(self):
         """Поток для захвата кадров"""
         logger.info(f"Запущен поток захвата для камеры {self.camera_id}")
         
+        grab_mode = PROCESSING_CONFIG['capture_mode'] == 'grab'
+        # Источник с rate=max не ограничен по частоте: кадры не отбрасываются,
+        # захват ждет освобождения очереди обработки
+        paced = self.paced_source
+        preview_interval = 1.0 / PROCESSING_CONFIG['preview_fps'] if PROCESSING_CONFIG['preview_fps'] > 0 else 0
+        last_preview_time = 0.0
+        
         while self.running:
             try:
                 with self.lock:
-                    cap = self.camera_streams[self.camera_id]['cap']
+                    cap = self.state.cap
                     if not cap or not cap.isOpened():
                         break
                 
-                ret, frame = cap.read()
+                # grab() только продвигает поток, BGR-кадр извлекается при необходимости
+                grab_start = time.time()
+                if grab_mode:
+                    ret = cap.grab()
+                else:
+                    ret, frame = cap.read()
                 if not ret:
+                    if getattr(cap, 'exhausted', False):
+                        logger.info(f"Источник камеры {self.camera_id} закончился")
+                        self.source_finished = True
+                        break
                     time.sleep(0.01)
                     continue
                 
-                # Изменяем размер кадра
-                frame = cv2.resize(frame, (CAMERA_CONFIG['width'], CAMERA_CONFIG['height']))
+                self.state.frame_counter += 1
+                self.capture_stats['grabbed_frames'] += 1
                 
-                with self.lock:
-                    # Добавляем в очередь кадров
-                    if self.camera_streams[self.camera_id]['frame_queue']:
-                        self.camera_streams[self.camera_id]['frame_queue'].append(frame.copy())
-                    
-                    self.camera_streams[self.camera_id]['frame'] = frame.copy()
-                    self.camera_streams[self.camera_id]['frame_counter'] += 1
+                # Решаем, нужен ли кадр для inference и/или превью
+                current_time = time.time()
+                self.last_frame_time = current_time
+                self.latency.record('capture', current_time - grab_start)
+                if paced:
+                    frame_skip = self._update_frame_skip(self.capture_stats['grabbed_frames'])
+                else:
+                    # Очередь всегда заполнена - регулятор не применяется
+                    frame_skip = PROCESSING_CONFIG['frame_skip']
+                need_inference = self.state.frame_counter % frame_skip == 0
+                need_preview = current_time - last_preview_time >= preview_interval
+                
+                if not (need_inference or need_preview):
+                    self.capture_stats['skipped_retrieves'] += 1
+                    if paced:
+                        time.sleep(0.01)
+                    continue
+                
+                retrieve_start = time.time()
+                if grab_mode:
+                    ret, frame = cap.retrieve()
+                    if not ret or frame is None:
+                        continue
+                    self.latency.record('decode', time.time() - retrieve_start)
+                
+                # Изменяем размер кадра (в плиточном режиме inference получает исходный кадр)
+                native_frame = frame
+                if frame.shape[1] != CAMERA_CONFIG['width'] or frame.shape[0] != CAMERA_CONFIG['height']:
+                    resize_start = time.time()
+                    frame = cv2.resize(frame, (CAMERA_CONFIG['width'], CAMERA_CONFIG['height']))
+                    self.latency.record('resize', time.time() - resize_start)
+                
+                self.capture_stats['retrieved_frames'] += 1
+                self.capture_stats['retrieve_time'] += time.time() - retrieve_start
+                
+                # Кадр после публикации не изменяется на месте, поэтому копии не нужны
+                if need_preview:
+                    last_preview_time = current_time
+                    if self.state.frame_queue is not None:
+                        self.state.frame_queue.append(frame)
+                    self.state.frame = frame
                 
                 # Добавляем кадр для обработки (каждый N-й кадр)
-                if self.camera_streams[self.camera_id]['frame_counter'] % PROCESSING_CONFIG['frame_skip'] == 0:
-                    try:
-                        self.process_queue.put_nowait(frame.copy())
-                    except queue.Full:
-                        # Считаем пропущенные кадры
-                        self.frame_stats['dropped_frames'] += 1
+                if need_inference:
+                    packet = FramePacket(native_frame if self.tiler else frame, captured_at=current_time)
+                    if paced:
+                        try:
+                            self.process_queue.put_nowait(packet)
+                        except queue.Full:
+                            # Считаем пропущенные кадры
+                            self.frame_stats['dropped_frames'] += 1
+                    else:
+                        self._put_blocking(packet)
                 
-                time.sleep(0.01)
+                if paced:
+                    time.sleep(0.01)
                 
             except Exception as e:
                 logger.error(f"Ошибка в потоке захвата {self.camera_id}: {e}")
@@ -192,6 +439,80 @@ class CameraProcessor:
         
         logger.info(f"Поток захвата для камеры {self.camera_id} завершен")
 
+    def _put_blocking(self, packet: FramePacket):
+        """Постановка кадра в очередь с ожиданием места (источники без ограничения частоты)"""
+        while self.running:
+            try:
+                self.process_queue.put(packet, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _ring_reader_loop(self):
+        """Поток чтения кадров из разделяемой памяти процесса захвата (без копирования)"""
+        logger.info(f"Запущен поток чтения разделяемой памяти для камеры {self.camera_id}")
+        
+        handle = self.state.cap
+        ring = handle.ring
+        last_seq = 0
+        last_grabbed = 0
+        
+        while self.running:
+            try:
+                if not handle.isOpened():
+                    if ring.get_counter(HEADER_SOURCE_DONE):
+                        logger.info(f"Источник камеры {self.camera_id} закончился")
+                        self.source_finished = True
+                    else:
+                        logger.error(f"Процесс захвата камеры {self.camera_id} завершился")
+                    break
+                
+                grabbed = ring.get_counter(HEADER_GRABBED)
+                if grabbed != last_grabbed:
+                    last_grabbed = grabbed
+                    self.last_frame_time = time.time()
+                
+                # Процесс захвата читает шаг пропуска из общей памяти
+                handle.frame_skip.value = self._update_frame_skip(grabbed)
+                
+                latest_seq = ring.latest_seq()
+                if latest_seq == last_seq:
+                    time.sleep(0.005)
+                    continue
+                
+                # Проходим по всем новым кадрам, которые еще не перезаписаны
+                for seq in range(max(last_seq + 1, latest_seq - ring.slots + 1), latest_seq + 1):
+                    entry = ring.read(seq)
+                    if entry is None:
+                        continue
+                    
+                    frame, flags, captured_at, decode_time = entry
+                    self.state.frame_counter = seq
+                    self.latency.record('decode', decode_time)
+                    
+                    if flags & FRAME_FLAG_PREVIEW:
+                        # Превью кодируется позже, когда слот может быть уже перезаписан - храним копию,
+                        # проверенную после копирования
+                        preview = frame.copy()
+                        if ring.is_valid(seq):
+                            if self.state.frame_queue is not None:
+                                self.state.frame_queue.append(preview)
+                            self.state.frame = preview
+                    
+                    if flags & FRAME_FLAG_INFERENCE:
+                        try:
+                            self.process_queue.put_nowait(FramePacket(frame, seq, captured_at))
+                        except queue.Full:
+                            self.frame_stats['dropped_frames'] += 1
+                
+                last_seq = latest_seq
+                
+            except Exception as e:
+                logger.error(f"Ошибка в потоке чтения разделяемой памяти {self.camera_id}: {e}")
+                break
+        
+        logger.info(f"Поток чтения разделяемой памяти для камеры {self.camera_id} завершен")
+
     def _process_loop(self):
         """Поток для обработки кадров с отслеживанием производительности"""
         logger.info(f"Запущен поток обработки для камеры {self.camera_id}")
@@ -199,12 +520,24 @@ class CameraProcessor:
         while self.running:
             try:
                 try:
-                    frame = self.process_queue.get(timeout=1.0)
+                    packet = self.process_queue.get(timeout=1.0)
                 except queue.Empty:
                     continue
                 
+                # При пакетной обработке берем только самый свежий кадр
+                if self.inference_scheduler and self.paced_source:
+                    packet = self._take_latest_frame(packet)
+                
+                # Кадр из разделяемой памяти мог быть перезаписан, пока ждал в очереди
+                if not self._is_packet_valid(packet):
+                    self.frame_stats['dropped_frames'] += 1
+                    self.process_queue.task_done()
+                    continue
+                frame = packet.frame
+                
                 # Отслеживание FPS
                 current_time = time.time()
+                self.latency.record('queue_wait', current_time - packet.queued_at)
                 self.frame_stats['processed_frames'] += 1
                 
                 # Обновляем FPS каждые 30 кадров
@@ -214,14 +547,31 @@ class CameraProcessor:
                         self.frame_stats['fps'] = 30 / time_diff
                         self.frame_stats['last_fps_update'] = current_time
                 
-                # Выбираем метод обработки в зависимости от камеры
-                if self.camera_id == 'camera1':
-                    processed_frame = self._process_frame_segmentation(frame)
+                # Замена модели применяется только между кадрами
+                self._apply_pending_model()
+                
+                # Метод отрисовки выбирается по режиму камеры
+                self.current_packet = packet
+                processed_frame = self._process_frame(frame)
+                self.current_packet = None
+                if packet.seq is not None and processed_frame is frame:
+                    # Без отрисовки возвращается сам кадр слота - поток MJPEG получает копию
+                    processed_frame = frame.copy()
+                if self.yolo_model and self.model_version:
+                    self.version_frames[self.model_version] = self.version_frames.get(self.model_version, 0) + 1
+                
+                # Слот перезаписан во время обработки - результат мог быть построен по смеси кадров
+                if self._is_packet_valid(packet):
+                    with self.lock:
+                        self.state.processed_frame_time = packet.captured_at
+                        self.state.processed_frame = processed_frame
                 else:
-                    processed_frame = self._process_frame_detection(frame)
+                    self.frame_stats['ring_overruns'] += 1
                 
-                with self.lock:
-                    self.camera_streams[self.camera_id]['processed_frame'] = processed_frame
+                processed_latency = time.time() - packet.captured_at
+                self.latency.record('processed', processed_latency)
+                if self.rate_controller:
+                    self.rate_controller.record_latency(processed_latency)
                 
                 self.process_queue.task_done()
                 
@@ -236,140 +586,476 @@ class CameraProcessor:
                 logger.error(f"Ошибка в потоке обработки {self.camera_id}: {e}")
                 break
         
-        self.camera_streams[self.camera_id]['processing'] = False
+        self.state.processing = False
         logger.info(f"Поток обработки для камеры {self.camera_id} завершен")
 
+    def _update_frame_skip(self, grabbed_frames: int) -> int:
+        """Текущий шаг пропуска кадров (пересчитывается регулятором раз в интервал)"""
+        if not self.rate_controller:
+            return PROCESSING_CONFIG['frame_skip']
+        
+        return self.rate_controller.maybe_update(
+            grabbed_frames,
+            self.process_queue.qsize(),
+            self.process_queue.maxsize,
+            self.inference_time_avg
+        )
+
+    def is_capture_alive(self) -> bool:
+        """Работает ли поток захвата камеры"""
+        return self.running and self.capture_thread is not None and self.capture_thread.is_alive()
+
+    def seconds_since_last_frame(self) -> float:
+        """Секунд с момента получения последнего кадра"""
+        return time.time() - self.last_frame_time
+
+    def _take_latest_frame(self, packet: FramePacket) -> FramePacket:
+        """Извлечение самого свежего кадра из очереди, более старые считаются пропущенными"""
+        while True:
+            try:
+                newer_packet = self.process_queue.get_nowait()
+            except queue.Empty:
+                return packet
+            
+            self.process_queue.task_done()
+            self.frame_stats['dropped_frames'] += 1
+            packet = newer_packet
+
+    def _is_packet_valid(self, packet: FramePacket) -> bool:
+        """Проверка, что кадр из разделяемой памяти еще не перезаписан процессом захвата"""
+        if packet.seq is None:
+            return True
+        
+        cap = self.state.cap
+        return isinstance(cap, CaptureProcessHandle) and cap.ring.is_valid(packet.seq)
+
+    def _clear_process_queue(self):
+        """Очистка очереди обработки"""
+        while True:
+            try:
+                self.process_queue.get_nowait()
+                self.process_queue.task_done()
+            except queue.Empty:
+                return
+
+    def set_zone_layout(self, zone_layout):
+        """Замена зон интереса камеры (None - весь кадр)"""
+        self.zone_layout = zone_layout
+        # Результаты, посчитанные для прежних зон, не повторяются
+        self.last_results = None
+        if self.tracker:
+            self.tracker.reset()
+        if self.result_cache:
+            self.result_cache.clear()
+        
+        zones_count = len(zone_layout.zones) if zone_layout else 0
+        logger.info(f"📐 Камера {self.camera_id}: зон интереса {zones_count}")
+
+    def set_tiler(self, tiler):
+        """Включение плиточного inference (None - кадр целиком в размере CAMERA_CONFIG)"""
+        self.tiler = tiler
+        self.last_results = None
+        if self.tracker:
+            self.tracker.reset()
+        if self.result_cache:
+            self.result_cache.clear()
+        
+        if tiler is None:
+            logger.info(f"🧩 Камера {self.camera_id}: плиточный inference выключен")
+            return
+        
+        logger.info(f"🧩 Камера {self.camera_id}: плиточный inference {tiler.tile_size}px, перекрытие {tiler.overlap:.0%}")
+        if isinstance(self.state.cap, CaptureProcessHandle):
+            # Процесс захвата пишет в разделяемую память кадры уже уменьшенного размера
+            logger.warning(f"⚠️ Камера {self.camera_id}: при захвате в отдельном процессе плитки строятся по кадру {CAMERA_CONFIG['width']}x{CAMERA_CONFIG['height']}")
+
+    def _run_inference(self, frame, model_name: str, model=None, imgsz: Optional[int] = None):
+        """Inference кадра через планировщик, model_manager или напрямую (по умолчанию - моделью камеры)"""
+        model = model or self.yolo_model
+        if self.inference_scheduler:
+            return self.inference_scheduler.infer(self.camera_id, model, frame, imgsz)
+        
+        # Используем model_manager для inference с отслеживанием производительности
+        if self.model_manager:
+            return self.model_manager.predict_with_stats(model, frame, model_name, imgsz, camera_id=self.camera_id)
+        
+        # Fallback на обычный inference
+        if imgsz:
+            return model(frame, verbose=False, imgsz=imgsz)
+        return model(frame, verbose=False)
+
+    def _run_crop_inference(self, crops: list, model_name: str, imgsz: int) -> Optional[list]:
+        """Inference фрагментов кадра: список Results по одному на фрагмент или None"""
+        if self.inference_scheduler:
+            return self.inference_scheduler.infer_many(self.camera_id, self.yolo_model, crops, imgsz)
+        
+        if self.model_manager:
+            if ROI_CONFIG['batch_crops']:
+                return self.model_manager.predict_batch_with_stats(self.yolo_model, crops, model_name, imgsz,
+                                                                   [self.camera_id] * len(crops))
+            
+            results = []
+            for crop in crops:
+                crop_results = self.model_manager.predict_with_stats(self.yolo_model, crop, model_name, imgsz,
+                                                                     self.camera_id)
+                if not crop_results:
+                    return None
+                results.append(crop_results[0])
+            return results
+        
+        return self.yolo_model(crops, verbose=False, imgsz=imgsz)
+
+    def _infer_regions(self, frame, model_name: str, zone_layout) -> Optional[list]:
+        """Inference всего кадра или фрагментов зон: список (Results, смещение, размер фрагмента)"""
+        if zone_layout is None or zone_layout.full_frame:
+            results = self._run_inference(frame, model_name)
+            if not results:
+                return None
+            return [(results[0], (0, 0), frame.shape[:2])]
+        
+        return self._infer_crops(frame, model_name, zone_layout.crop_rects, zone_layout.crop_imgsz)
+
+    def _infer_tiles(self, frame, model_name: str, tiler) -> Optional[list]:
+        """Inference плиток кадра исходного разрешения одним пакетом"""
+        return self._infer_crops(frame, model_name, tiler.tile_rects(frame.shape), tiler.tile_size)
+
+    def _infer_crops(self, frame, model_name: str, rects: list, imgsz: int) -> Optional[list]:
+        """Inference фрагментов rects кадра: список (Results, смещение, размер фрагмента)"""
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rects]
+        results = self._run_crop_inference(crops, model_name, imgsz)
+        if results is None or len(results) != len(crops):
+            return None
+        
+        return [
+            (result, (x1, y1), (y2 - y1, x2 - x1))
+            for result, (x1, y1, x2, y2) in zip(results, rects)
+        ]
+
+    def _detect_people(self, frame) -> Optional[PersonDetections]:
+        """Первый этап каскада: люди по детектору (None - нет результата, каскад не применяется)"""
+        detect_start = time.time()
+        try:
+            results = self._run_inference(frame, "Детектор", self.detector_model, CASCADE_CONFIG['detector_imgsz'])
+            people = PersonDetections.from_result(results[0], frame.shape[:2]) if results else None
+        except Exception as e:
+            logger.error(f"Ошибка детектора каскада {self.camera_id}: {e}")
+            people = None
+        self.cascade.record_detection(time.time() - detect_start, len(people) if people is not None else None)
+        return people
+
+    def _infer_cascade(self, frame, model_name: str, zone_layout, people: PersonDetections) -> Optional[list]:
+        """Второй этап каскада: сегментация фрагментов вокруг найденных людей или всего кадра"""
+        if zone_layout is None or zone_layout.full_frame:
+            rects, imgsz = self.cascade.plan_crops(people.boxes, frame.shape[1], frame.shape[0])
+            if rects is not None:
+                self.cascade.record_segmentation(len(rects))
+                return self._infer_crops(frame, model_name, rects, imgsz)
+        
+        # Фрагменты зон уже ограничивают inference - каскад только решает, нужен ли он
+        self.cascade.record_segmentation(0 if zone_layout is None or zone_layout.full_frame else len(zone_layout.crop_rects))
+        return self._infer_regions(frame, model_name, zone_layout)
+
     def get_performance_stats(self) -> dict:
         """Получение статистики производительности камеры"""
         return {
             'camera_id': self.camera_id,
             'processed_frames': self.frame_stats['processed_frames'],
             'dropped_frames': self.frame_stats['dropped_frames'],
+            'ring_overruns': self.frame_stats['ring_overruns'],
             'fps': round(self.frame_stats['fps'], 1),
             'queue_size': self.process_queue.qsize(),
             'is_running': self.running,
+            'capture': self._get_capture_stats(),
+            'motion_gate': self._get_motion_gate_stats(),
+            'result_cache': self._get_result_cache_stats(),
+            'rate_control': self._get_rate_control_stats(),
+            'roi': self._get_roi_stats(),
+            'tiling': self.tiler.get_stats() if self.tiler else {'enabled': False},
+            'tracking': self.tracker.get_stats() if self.tracker else {'enabled': False},
+            'cascade': self._get_cascade_stats(),
+            'model': {'key': self.model_key, 'version': self.model_version,
+                      'frames_by_version': dict(self.version_frames)},
             'segmentation_area': self.segmentation_stats['last_segmentation_area'],
             'avg_segmentation_area': round(self.segmentation_stats['average_segmentation_area'], 1),
             'frames_with_segmentation': self.segmentation_stats['frames_with_segmentation']
         }
 
-    def _calculate_segmentation_area(self, masks, boxes) -> int:
-        """Подсчет площади сегментации людей в пикселях"""
-        total_area = 0
+    def _get_capture_stats(self) -> dict:
+        """Статистика захвата: сколько кадров удалось не извлекать"""
+        cap = self.state.cap
+        if isinstance(cap, CaptureProcessHandle):
+            # Счетчики процесса захвата лежат в заголовке разделяемой памяти
+            ring = cap.ring
+            grabbed = ring.get_counter(HEADER_GRABBED)
+            skipped = ring.get_counter(HEADER_SKIPPED)
+            retrieved = ring.latest_seq()
+            retrieve_time = ring.get_counter(HEADER_RETRIEVE_NS) / 1e9
+            backend = 'process'
+        else:
+            grabbed = self.capture_stats['grabbed_frames']
+            retrieved = self.capture_stats['retrieved_frames']
+            skipped = self.capture_stats['skipped_retrieves']
+            retrieve_time = self.capture_stats['retrieve_time']
+            backend = 'thread'
+        avg_retrieve = retrieve_time / retrieved if retrieved else 0
         
-        if masks is not None and boxes is not None:
-            masks_data = masks.data.cpu().numpy()
-            
-            for i, (mask, box) in enumerate(zip(masks_data, boxes)):
-                cls = int(box.cls[0].cpu().numpy())
-                if cls == OBJECT_CLASSES['person']:
-                    # Изменяем размер маски под размер кадра
-                    mask_resized = cv2.resize(mask, (CAMERA_CONFIG['width'], CAMERA_CONFIG['height']))
-                    
-                    # Подсчитываем пиксели маски (где значение > 0.5)
-                    person_pixels = np.sum(mask_resized > 0.5)
-                    total_area += person_pixels
+        return {
+            'backend': backend,
+            'mode': PROCESSING_CONFIG['capture_mode'],
+            'grabbed_frames': grabbed,
+            'retrieved_frames': retrieved,
+            'skipped_retrieves': skipped,
+            'retrieve_ratio': round(retrieved / grabbed, 3) if grabbed else 0,
+            'avg_retrieve_ms': round(avg_retrieve * 1000, 2),
+            # Оценка сэкономленного времени: пропущенные retrieve()+resize по среднему времени
+            'estimated_saved_ms': round(skipped * avg_retrieve * 1000, 1)
+        }
+
+    def _build_detections(self, frame, regions: list, zone_layout, source_shape=None, tiler=None) -> PersonDetections:
+        """Люди в координатах кадра; при заданных зонах - только внутри зон
         
-        return int(total_area)
+        source_shape - размер кадра, по которому выполнялся inference (исходное
+        разрешение в плиточном режиме); детекции переносятся в кадр frame
+        """
+        frame_shape = frame.shape[:2]
+        source_shape = source_shape or frame_shape
+        detections = PersonDetections.concat([
+            PersonDetections.from_result(result, source_shape, offset, region_shape)
+            for result, offset, region_shape in regions
+        ])
+        
+        if tiler is not None:
+            detections = tiler.merge(detections)
+        if source_shape != frame_shape:
+            detections = detections.rescaled(frame_shape, source_shape)
+        
+        if zone_layout is not None:
+            detections = zone_layout.filter_detections(detections)
+        return detections
+
+    def _calculate_segmentation_area(self, detections: PersonDetections) -> int:
+        """Подсчет площади сегментации людей в пикселях"""
+        return detections.total_area()
 
-    def _process_frame_segmentation(self, frame):
-        """Обработка кадра для сегментации (камера 1)"""
+    def _process_frame(self, frame):
+        """Обработка кадра: inference (или повтор последних результатов) и постобработка"""
+        # В плиточном режиме кадр приходит в исходном разрешении; отрисовка и площадь - в размере CAMERA_CONFIG
+        source_frame = frame
+        if frame.shape[1] != CAMERA_CONFIG['width'] or frame.shape[0] != CAMERA_CONFIG['height']:
+            frame = cv2.resize(frame, (CAMERA_CONFIG['width'], CAMERA_CONFIG['height']))
+        
         if not self.yolo_model:
             # Если модель не загружена, просто обнуляем площадь сегментации
             self._update_segmentation_stats(0)
             return frame
             
         try:
-            # Используем model_manager для inference с отслеживанием производительности
-            if hasattr(self, 'model_manager') and self.model_manager:
-                results = self.model_manager.predict_with_stats(
-                    self.yolo_model, frame, "Сегментация"
-                )
-            else:
-                # Fallback на обычный inference
-                results = self.yolo_model(frame, verbose=False)
+            model_name = "Сегментация" if self.state.mode == 'segmentation' else "Детекция"
+            current_time = time.time()
             
-            if not results:
-                # Обнуляем площадь сегментации если нет результатов
-                self._update_segmentation_stats(0)
-                return frame
+            # Повторно присланный кадр: люди, площадь и отрисовка из кэша, аларм по нему уже был
+            fingerprint = None
+            if self.result_cache:
+                fingerprint, cached = self.result_cache.lookup(frame, current_time)
+                self._update_stream_health(current_time)
+                if cached is not None:
+                    self.last_results = cached.detections
+                    self.last_segmentation_area = cached.area
+                    self._update_segmentation_stats(cached.area)
+                    return cached.overlay
             
-            # Подсчитываем площадь сегментации
-            segmentation_area = 0
-            if results[0].masks is not None and results[0].boxes is not None:
-                segmentation_area = self._calculate_segmentation_area(results[0].masks, results[0].boxes)
+            # Статичная сцена: повторяем последние результаты и площадь без inference
+            if self.motion_gate:
+                if self.last_results is None:
+                    # Повторять нечего - только обновляем фон
+                    self.motion_gate.observe(frame)
+                elif not self.motion_gate.should_infer(frame, current_time):
+                    return self._postprocess_results(frame, self.last_results, self.last_segmentation_area)
             
-            # Обновляем статистику сегментации
-            self._update_segmentation_stats(segmentation_area)
+            # Промежуточный кадр: боксы и маски переносятся по прогнозу треков без inference
+            tracker = self.tracker
+            if tracker and self.last_results is not None and not tracker.needs_keyframe(current_time):
+                propagate_start = time.time()
+                detections = tracker.propagate(current_time, frame.shape[:2])
+                segmentation_area = self._calculate_segmentation_area(detections)
+                self.last_results = detections
+                self.last_segmentation_area = segmentation_area
+                return self._postprocess_results(frame, detections, segmentation_area, propagate_start)
             
-            # Проверяем наличие людей
-            person_detected = self._check_person_detection(results)
+            # Зоны и плитки читаются один раз: API может заменить их во время обработки кадра
+            zone_layout = self.zone_layout
+            tiler = self.tiler
             
-            # Создаем аларм если обнаружен человек
-            if person_detected:
-                self.alarm_callback(self.camera_id, frame)
-            
-            # Возвращаем обработанный кадр только с масками людей
-            return self._draw_segmentation_masks(frame, results)
-            
-        except Exception as e:
-            logger.error(f"Ошибка обработки кадра сегментации {self.camera_id}: {e}")
-            self._update_segmentation_stats(0)
-            return frame
-
-    def _process_frame_detection(self, frame):
-        """Обработка кадра для детекции (камера 2)"""
-        if not self.yolo_model:
-            # Если модель не загружена, просто обнуляем площадь сегментации
-            self._update_segmentation_stats(0)
-            return frame
-            
-        try:
-            # Используем model_manager для inference с отслеживанием производительности
-            if hasattr(self, 'model_manager') and self.model_manager:
-                results = self.model_manager.predict_with_stats(
-                    self.yolo_model, frame, "Детекция"
-                )
+            inference_start = time.time()
+            # Каскад: сначала детектор; без людей сегментация не выполняется.
+            # Плитки - без детектора: мелких людей 4K-потока он не найдет в уменьшенном кадре
+            cascade = self.cascade if self.detector_model is not None else None
+            people = self._detect_people(frame) if cascade and not tiler else None
+            no_people = people is not None and not len(people)
+            if no_people:
+                regions = []
+            elif tiler:
+                # Зоны в плиточном режиме только фильтруют людей, фрагменты зон не вырезаются
+                if cascade:
+                    cascade.record_bypass(len(tiler.tile_rects(source_frame.shape)))
+                regions = self._infer_tiles(source_frame, model_name, tiler)
+            elif people is not None:
+                regions = self._infer_cascade(frame, model_name, zone_layout, people)
             else:
-                # Fallback на обычный inference
-                results = self.yolo_model(frame, verbose=False)
+                if cascade:
+                    # Детектор не дал результата - сегментация без каскада
+                    cascade.record_segmentation(0)
+                regions = self._infer_regions(frame, model_name, zone_layout)
+            inference_end = time.time()
+            self._update_inference_time(inference_end - inference_start)
+            self.latency.record('inference', inference_end - inference_start)
+            if tiler and regions:
+                tiler.record(inference_end - inference_start, len(regions))
             
-            if not results:
+            if self.motion_gate:
+                self.motion_gate.mark_inference(current_time)
+            
+            # Детектор не нашел людей: пустой результат проходит обычный путь (треки, зоны, кэш)
+            if not regions and not no_people:
                 # Обнуляем площадь сегментации если нет результатов
+                self.last_results = None
                 self._update_segmentation_stats(0)
+                if fingerprint is not None:
+                    # Кадр может быть буфером захвата - в кэше хранится копия
+                    self.result_cache.store(fingerprint, PersonDetections.empty(), 0, frame.copy(), current_time)
                 return frame
             
-            # Подсчитываем площадь сегментации (если есть маски)
-            segmentation_area = 0
-            if results[0].masks is not None and results[0].boxes is not None:
-                segmentation_area = self._calculate_segmentation_area(results[0].masks, results[0].boxes)
-            
-            # Обновляем статистику сегментации
-            self._update_segmentation_stats(segmentation_area)
+            # Люди в координатах кадра и площадь сегментации (если есть маски)
+            detections = self._build_detections(frame, regions, zone_layout, source_frame.shape[:2], tiler)
+            if tracker:
+                detections = tracker.update(detections, current_time)
+            segmentation_area = self._calculate_segmentation_area(detections)
             
-            # Проверяем наличие людей
-            person_detected = self._check_person_detection(results)
-            
-            # Создаем аларм если обнаружен человек
-            if person_detected:
-                self.alarm_callback(self.camera_id, frame)
-            
-            # Возвращаем результат с масками и боксами для людей
-            annotated_frame = self._draw_segmentation_masks(frame, results)
-            return self._draw_detection_boxes(annotated_frame, results)
+            self.last_results = detections
+            self.last_segmentation_area = segmentation_area
+            annotated_frame = self._postprocess_results(frame, detections, segmentation_area, inference_end)
+            if fingerprint is not None:
+                if annotated_frame is frame:
+                    annotated_frame = frame.copy()
+                self.result_cache.store(fingerprint, detections, segmentation_area, annotated_frame, current_time)
+            return annotated_frame
             
         except Exception as e:
-            logger.error(f"Ошибка обработки кадра детекции {self.camera_id}: {e}")
+            logger.error(f"Ошибка обработки кадра {self.camera_id}: {e}")
             self._update_segmentation_stats(0)
             return frame
 
+    def _postprocess_results(self, frame, detections: PersonDetections, segmentation_area: int,
+                             started_at: float = None):
+        """Статистика площади, аларм и отрисовка результатов на кадре"""
+        # Этап постобработки включает подсчет площади, если он был выполнен до вызова
+        started_at = started_at or time.time()
+        
+        # Обновляем статистику сегментации
+        self._update_segmentation_stats(segmentation_area)
+        
+        # Проверяем наличие людей (при заданных зонах - только в зонах)
+        person_detected = self._check_person_detection(detections)
+        
+        # Создаем аларм если обнаружен человек (при сопровождении - один раз на трек)
+        if person_detected:
+            self._raise_alarm(frame, detections)
+        
+        draw_start = time.time()
+        self.latency.record('postprocess', draw_start - started_at)
+        
+        # Обработанный кадр с масками людей (в режиме детекции - и с боксами)
+        annotated_frame = self._draw_segmentation_masks(frame, detections)
+        zone_layout = self.zone_layout
+        if annotated_frame is frame and (self.state.mode != 'segmentation' or zone_layout):
+            # Исходный кадр разделяется с превью - рисуем на копии
+            annotated_frame = frame.copy()
+        if self.state.mode != 'segmentation':
+            annotated_frame = self._draw_detection_boxes(annotated_frame, detections)
+        if zone_layout:
+            zone_layout.draw(annotated_frame)
+        
+        self.latency.record('draw', time.time() - draw_start)
+        return annotated_frame
+
+    def _update_inference_time(self, inference_time: float):
+        """Скользящее среднее времени inference камеры"""
+        if self.inference_time_avg == 0:
+            self.inference_time_avg = inference_time
+        else:
+            self.inference_time_avg = 0.9 * self.inference_time_avg + 0.1 * inference_time
+
+    def _get_motion_gate_stats(self) -> dict:
+        """Статистика предфильтра движения с оценкой сэкономленного времени inference"""
+        if not self.motion_gate:
+            return {'enabled': False}
+        
+        stats = self.motion_gate.get_stats()
+        stats['enabled'] = True
+        stats['saved_inference_ms'] = round(stats['skips'] * self.inference_time_avg * 1000, 1)
+        return stats
+
+    def _get_result_cache_stats(self) -> dict:
+        """Статистика кэша результатов с оценкой сэкономленного времени inference"""
+        if not self.result_cache:
+            return {'enabled': False}
+        
+        stats = self.result_cache.get_stats()
+        stats['enabled'] = True
+        stats['saved_inference_ms'] = round(stats['hits'] * self.inference_time_avg * 1000, 1)
+        return stats
+
+    def _update_stream_health(self, now: float):
+        """Состояние потока камеры: 'frozen', пока кадр не меняется"""
+        health = 'frozen' if self.result_cache.frozen else 'ok'
+        if health == self.state.stream_health:
+            return
+        
+        self.state.stream_health = health
+        if health == 'frozen':
+            logger.warning(f"🧊 Камера {self.camera_id}: поток завис - кадр не меняется "
+                           f"{self.result_cache.frozen_for(now):.0f} с")
+        else:
+            logger.info(f"✅ Камера {self.camera_id}: кадры потока снова меняются")
+
+    def _get_cascade_stats(self) -> dict:
+        """Вызовы детектора и сегментации, доля кадров без сегментации"""
+        if not self.cascade:
+            return {'enabled': False}
+        
+        stats = self.cascade.get_stats()
+        stats['enabled'] = True
+        stats['active'] = self.detector_model is not None
+        stats['detector'] = {'key': CASCADE_CONFIG['detector_model'], 'version': self.detector_version}
+        return stats
+
+    def _get_roi_stats(self) -> dict:
+        """Зоны интереса и размер фрагментов для inference"""
+        zone_layout = self.zone_layout
+        if not zone_layout:
+            return {'enabled': False}
+        
+        return {
+            'enabled': True,
+            'zones': len(zone_layout.zones),
+            'crops': 0 if zone_layout.full_frame else len(zone_layout.crop_rects),
+            'full_frame_inference': zone_layout.full_frame,
+            'crop_imgsz': zone_layout.crop_imgsz
+        }
+
+    def _get_rate_control_stats(self) -> dict:
+        """Состояние регулятора частоты inference"""
+        if not self.rate_controller:
+            return {'enabled': False, 'frame_skip': PROCESSING_CONFIG['frame_skip']}
+        
+        return self.rate_controller.get_stats()
+
     def _update_segmentation_stats(self, area: int):
         """Обновление статистики сегментации"""
         self.segmentation_stats['last_segmentation_area'] = area
         
-        # Обновляем статистику в camera_streams для доступа извне
-        with self.lock:
-            self.camera_streams[self.camera_id]['segmentation_area'] = area
+        # Обновляем состояние камеры для доступа извне
+        self.state.segmentation_area = area
         
         if area > 0:
             self.segmentation_stats['frames_with_segmentation'] += 1
@@ -388,73 +1074,68 @@ class CameraProcessor:
             except Exception as e:
                 logger.error(f"Ошибка в segmentation_callback: {e}")
 
-    def _check_person_detection(self, results) -> bool:
+    def _raise_alarm(self, frame, detections: PersonDetections):
+        """Аларм по кадру; люди, по которым аларм уже был, его не повторяют"""
+        if not self.tracker or detections.track_ids is None:
+            frame = self._alarm_frame(frame)
+            if frame is not None:
+                self.alarm_callback(self.camera_id, frame)
+            return
+        
+        new_tracks = self.tracker.take_unalarmed(detections.track_ids)
+        if not new_tracks:
+            return
+        
+        # Отклоненный аларм (cooldown) будет повторен для тех же треков
+        frame = self._alarm_frame(frame)
+        if frame is not None and self.alarm_callback(self.camera_id, frame) is not False:
+            self.tracker.mark_alarmed(new_tracks)
+
+    def _alarm_frame(self, frame):
+        """Кадр для сохранения аларма; кадр слота разделяемой памяти копируется (None - слот перезаписан)"""
+        packet = self.current_packet
+        if packet is None or packet.seq is None:
+            return frame
+        
+        # Копия проверяется после копирования: процесс захвата мог начать запись в слот
+        snapshot = frame.copy()
+        if not self._is_packet_valid(packet):
+            self.frame_stats['ring_overruns'] += 1
+            return None
+        return snapshot
+
+    def _check_person_detection(self, detections: PersonDetections) -> bool:
         """Проверка наличия людей в результатах детекции"""
-        try:
-            if results and len(results) > 0 and results[0].boxes is not None:
-                for box in results[0].boxes:
-                    cls = int(box.cls[0].cpu().numpy())
-                    if cls == OBJECT_CLASSES['person']:
-                        return True
-            return False
-        except Exception as e:
-            logger.error(f"Ошибка проверки детекции людей: {e}")
-            return False
+        return detections is not None and len(detections) > 0
 
-    def _draw_segmentation_masks(self, frame, results):
+    def _draw_segmentation_masks(self, frame, detections: PersonDetections):
         """Рисование масок сегментации для людей"""
         try:
-            annotated_frame = frame.copy()
-            
-            if (results and len(results) > 0 and 
-                results[0].masks is not None and results[0].boxes is not None):
-                
-                masks = results[0].masks.data.cpu().numpy()
-                boxes = results[0].boxes
-                
-                for i, (mask, box) in enumerate(zip(masks, boxes)):
-                    cls = int(box.cls[0].cpu().numpy())
-                    if cls == OBJECT_CLASSES['person']:
-                        # Изменяем размер маски под размер кадра
-                        mask_resized = cv2.resize(mask, (frame.shape[1], frame.shape[0]))
-                        
-                        # Создаем цветную маску для человека
-                        color = np.random.randint(50, 255, 3)
-                        colored_mask = np.zeros_like(frame)
-                        colored_mask[mask_resized > 0.5] = color
-                        
-                        # Накладываем маску с прозрачностью
-                        alpha = 0.7 if self.camera_id == 'camera1' else 0.8
-                        beta = 0.3 if self.camera_id == 'camera1' else 0.2
-                        annotated_frame = cv2.addWeighted(annotated_frame, alpha, colored_mask, beta, 0)
-            
-            return annotated_frame
+            # Непрозрачность маски; пиксели вне масок не затемняются
+            opacity = 0.3 if self.state.mode == 'segmentation' else 0.2
+            return self.mask_compositor.draw(frame, detections, opacity)
         except Exception as e:
             logger.error(f"Ошибка рисования масок сегментации: {e}")
             return frame
 
-    def _draw_detection_boxes(self, frame, results):
+    def _draw_detection_boxes(self, frame, detections: PersonDetections):
         """Рисование боксов детекции для людей"""
         try:
-            if results and len(results) > 0 and results[0].boxes is not None:
-                boxes = results[0].boxes
-                for box in boxes:
-                    cls = int(box.cls[0].cpu().numpy())
-                    if cls == OBJECT_CLASSES['person']:
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-                        conf = box.conf[0].cpu().numpy()
-                        
-                        # Рисуем бокс для человека
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
-                        
-                        # Добавляем label с confidence
-                        label = f"Person: {conf:.2f}"
-                        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-                        
-                        # Фон для текста
-                        cv2.rectangle(frame, (x1, y1-30), (x1 + label_size[0], y1), (0, 255, 0), -1)
-                        cv2.putText(frame, label, (x1, y1-10), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+            track_ids = detections.track_ids or [None] * len(detections)
+            for box, conf, track_id in zip(detections.boxes, detections.scores, track_ids):
+                x1, y1, x2, y2 = box.astype(int)
+                
+                # Рисуем бокс для человека
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
+                
+                # Добавляем label с confidence (и номером трека)
+                label = f"Person: {conf:.2f}" if track_id is None else f"Person #{track_id}: {conf:.2f}"
+                label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
+                
+                # Фон для текста
+                cv2.rectangle(frame, (x1, y1-30), (x1 + label_size[0], y1), (0, 255, 0), -1)
+                cv2.putText(frame, label, (x1, y1-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
             
             return frame
         except Exception as e:
@@ -465,27 +1146,46 @@ class CameraProcessor:
 class VideoStreamGenerator:
     """Генератор видеопотока для Flask"""
     
-    def __init__(self, camera_streams: dict):
-        self.camera_streams = camera_streams
+    def __init__(self, camera_registry):
+        self.camera_registry = camera_registry
 
     def generate_frames(self, camera_id: str, processed: bool = True):
         """Генератор кадров для стрима"""
+        last_frame = None
+        
         while True:
             try:
+                state = self.camera_registry.get_state(camera_id)
+                if state is None:
+                    # Камера удалена из реестра - завершаем поток
+                    break
+                
                 if processed:
-                    frame = self.camera_streams[camera_id]['processed_frame']
+                    frame = state.processed_frame
+                    captured_at = state.processed_frame_time
                 else:
-                    frame = self.camera_streams[camera_id]['frame']
+                    frame = state.frame
+                    captured_at = 0.0
                     
-                if frame is not None:
+                if frame is last_frame:
+                    # Новый кадр еще не опубликован - не кодируем повторно
+                    time.sleep(0.01)
+                elif frame is not None:
+                    last_frame = frame
+                    encode_start = time.time()
                     ret, buffer = cv2.imencode('.jpg', frame, [
                         cv2.IMWRITE_JPEG_QUALITY, PROCESSING_CONFIG['jpeg_quality'],
                         cv2.IMWRITE_JPEG_OPTIMIZE, 1
                     ])
                     if ret:
                         frame_bytes = buffer.tobytes()
+                        send_start = time.time()
                         yield (b'--frame\r\n'
                                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                        
+                        # Генератор продолжается после записи кадра клиенту
+                        if processed:
+                            self._record_stream_latency(camera_id, captured_at, encode_start, send_start)
                 else:
                     time.sleep(0.05)
                     
@@ -493,18 +1193,32 @@ class VideoStreamGenerator:
                 logger.error(f"Ошибка генерации кадров для {camera_id}: {e}")
                 time.sleep(0.1)
 
+    def _record_stream_latency(self, camera_id: str, captured_at: float, encode_start: float, send_start: float):
+        """Учет кодирования, отправки и полной задержки обработанного кадра"""
+        processor = self.camera_registry.get_processor(camera_id)
+        if processor is None:
+            return
+        
+        sent_at = time.time()
+        processor.latency.record('encode', send_start - encode_start)
+        processor.latency.record('send', sent_at - send_start)
+        if captured_at:
+            processor.latency.record('end_to_end', sent_at - captured_at)
+
 
 class SegmentationAreaManager:
-    """Менеджер для подсчета произведения площадей сегментации двух камер"""
+    """Менеджер для подсчета произведения площадей сегментации всех камер"""
     
     def __init__(self):
-        self.camera_areas = {
-            'camera1': 0,
-            'camera2': 0
-        }
+        self.camera_areas = {}
         self.area_product = 0
         self.lock = threading.Lock()
         
+        # Произведение ненулевых площадей и число нулевых ведутся инкрементально,
+        # чтобы обновление не зависело от количества камер
+        self._nonzero_product = 1
+        self._zero_count = 0
+        
         # Статистика
         self.stats = {
             'max_product': 0,
@@ -513,16 +1227,59 @@ class SegmentationAreaManager:
             'non_zero_products': 0
         }
     
+    def add_camera(self, camera_id: str):
+        """Регистрация камеры в расчете произведения"""
+        with self.lock:
+            if camera_id not in self.camera_areas:
+                self.camera_areas[camera_id] = 0
+                self._zero_count += 1
+                self._update_product()
+    
+    def remove_camera(self, camera_id: str):
+        """Исключение камеры из расчета произведения"""
+        with self.lock:
+            if camera_id in self.camera_areas:
+                self._set_area(camera_id, 0)
+                del self.camera_areas[camera_id]
+                self._zero_count -= 1
+                self._update_product()
+    
     def update_camera_area(self, camera_id: str, area: int):
         """Обновление площади сегментации для камеры"""
         with self.lock:
-            self.camera_areas[camera_id] = area
+            if camera_id not in self.camera_areas:
+                self.camera_areas[camera_id] = 0
+                self._zero_count += 1
+            self._set_area(camera_id, area)
             self._calculate_product()
     
+    def _set_area(self, camera_id: str, area: int):
+        """Замена площади камеры с пересчетом инкрементальных значений"""
+        old_area = self.camera_areas[camera_id]
+        
+        if old_area > 0:
+            self._nonzero_product //= old_area
+        else:
+            self._zero_count -= 1
+        
+        if area > 0:
+            self._nonzero_product *= area
+        else:
+            self._zero_count += 1
+        
+        self.camera_areas[camera_id] = area
+    
+    def _update_product(self):
+        """Произведение площадей всех зарегистрированных камер"""
+        if self.camera_areas and self._zero_count == 0:
+            self.area_product = self._nonzero_product
+        else:
+            self.area_product = 0
+    
     def _calculate_product(self):
         """Подсчет произведения площадей"""
-        new_product = self.camera_areas['camera1'] * self.camera_areas['camera2']
-        self.area_product = new_product
+        self._update_product()
+        new_product = self.area_product
         
         # Обновляем статистику
         self.stats['total_calculations'] += 1
@@ -540,8 +1297,7 @@ class SegmentationAreaManager:
     
     def get_current_product(self) -> int:
         """Получение текущего произведения площадей"""
-        with self.lock:
-            return self.area_product
+        return self.area_product
     
     def get_camera_areas(self) -> dict:
         """Получение площадей по камерам"""
@@ -553,8 +1309,9 @@ class SegmentationAreaManager:
         with self.lock:
             return {
                 'current_product': self.area_product,
-                'camera1_area': self.camera_areas['camera1'],
-                'camera2_area': self.camera_areas['camera2'],
+                'camera1_area': self.camera_areas.get('camera1', 0),
+                'camera2_area': self.camera_areas.get('camera2', 0),
+                'camera_areas': self.camera_areas.copy(),
                 'max_product': self.stats['max_product'],
                 'average_product': round(self.stats['average_product'], 1),
                 'total_calculations': self.stats['total_calculations'],
@@ -0,0 +1,151 @@
+"""
+camera_registry.py - Реестр камер с динамическим добавлением и удалением
+"""
+
+import logging
+import threading
+from typing import Optional, Callable, Dict, List
+
+from config import CAMERA_REGISTRY_CONFIG, PROCESSING_MODES
+
+logger = logging.getLogger(__name__)
+
+
+class CameraState:
+    """Компактное состояние одной камеры (вместо словаря словарей)"""
+
+    __slots__ = (
+        'camera_id', 'mode', 'cap', 'connected', 'processing', 'frame',
+        'processed_frame', 'processed_frame_time', 'config', 'frame_queue', 'frame_counter',
+        'last_alarm_time', 'segmentation_area', 'connection_status', 'stream_health'
+    )
+
+    def __init__(self, camera_id: str, mode: str):
+        self.camera_id = camera_id
+        self.mode = mode
+        self.cap = None
+        self.connected = False
+        self.processing = False
+        self.frame = None
+        self.processed_frame = None
+        self.processed_frame_time = 0.0  # Время захвата кадра, по которому построен processed_frame
+        self.config = {}
+        self.frame_queue = None  # Создается при запуске обработки
+        self.frame_counter = 0
+        self.last_alarm_time = 0
+        self.segmentation_area = 0
+        self.connection_status = 'disconnected'  # Управляется CameraSupervisor
+        self.stream_health = 'ok'  # 'frozen' - кадр потока не меняется
+
+    def reset(self):
+        """Сброс состояния при отключении камеры"""
+        self.cap = None
+        self.connected = False
+        self.processing = False
+        self.frame = None
+        self.processed_frame = None
+        self.processed_frame_time = 0.0
+        self.frame_queue = None
+        self.frame_counter = 0
+        self.segmentation_area = 0
+        self.stream_health = 'ok'
+
+    def get_status(self) -> dict:
+        """Краткий статус камеры (читается без блокировок)"""
+        return {
+            'connected': self.connected,
+            'processing': self.processing,
+            'mode': self.mode,
+            'connection_status': self.connection_status,
+            'stream_health': self.stream_health,
+            'segmentation_area': self.segmentation_area
+        }
+
+
+class CameraEntry:
+    """Запись реестра: состояние камеры и ее процессор"""
+
+    __slots__ = ('state', 'processor')
+
+    def __init__(self, state: CameraState, processor):
+        self.state = state
+        self.processor = processor
+
+
+class CameraRegistry:
+    """Реестр камер; процессоры и буферы создаются по требованию"""
+
+    def __init__(self, processor_factory: Callable):
+        self.processor_factory = processor_factory
+        self.max_cameras = CAMERA_REGISTRY_CONFIG['max_cameras']
+
+        # Словарь заменяется целиком при изменении состава (copy-on-write),
+        # поэтому читатели обходятся без блокировки
+        self._cameras: Dict[str, CameraEntry] = {}
+        self._lock = threading.Lock()
+
+    def add_camera(self, camera_id: str, mode: str = 'segmentation') -> bool:
+        """Регистрация камеры и создание ее процессора"""
+        if mode not in PROCESSING_MODES:
+            logger.error(f"Неизвестный режим обработки {mode} для камеры {camera_id}")
+            return False
+
+        with self._lock:
+            if camera_id in self._cameras:
+                return True
+
+            if len(self._cameras) >= self.max_cameras:
+                logger.error(f"Достигнут лимит камер ({self.max_cameras}), {camera_id} не добавлена")
+                return False
+
+            state = CameraState(camera_id, mode)
+            processor = self.processor_factory(camera_id, state)
+
+            cameras = dict(self._cameras)
+            cameras[camera_id] = CameraEntry(state, processor)
+            self._cameras = cameras
+
+        logger.info(f"📹 Камера {camera_id} зарегистрирована (режим: {mode})")
+        return True
+
+    def remove_camera(self, camera_id: str) -> bool:
+        """Удаление камеры из реестра (камера должна быть отключена)"""
+        with self._lock:
+            if camera_id not in self._cameras:
+                return False
+
+            cameras = dict(self._cameras)
+            del cameras[camera_id]
+            self._cameras = cameras
+
+        logger.info(f"📹 Камера {camera_id} удалена из реестра")
+        return True
+
+    def has_camera(self, camera_id: str) -> bool:
+        """Проверка регистрации камеры"""
+        return camera_id in self._cameras
+
+    def get_state(self, camera_id: str) -> Optional[CameraState]:
+        """Состояние камеры или None"""
+        entry = self._cameras.get(camera_id)
+        return entry.state if entry else None
+
+    def get_processor(self, camera_id: str):
+        """Процессор камеры или None"""
+        entry = self._cameras.get(camera_id)
+        return entry.processor if entry else None
+
+    def camera_ids(self) -> List[str]:
+        """Список идентификаторов камер"""
+        return list(self._cameras)
+
+    def processors(self) -> Dict[str, object]:
+        """Снимок процессоров всех камер"""
+        return {camera_id: entry.processor for camera_id, entry in self._cameras.items()}
+
+    def states(self) -> Dict[str, CameraState]:
+        """Снимок состояний всех камер"""
+        return {camera_id: entry.state for camera_id, entry in self._cameras.items()}
+
+    def __len__(self) -> int:
+        return len(self._cameras)
@@ -0,0 +1,319 @@
+"""
+camera_supervisor.py - Фоновое подключение камер с переподключением и контролем зависания потока
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from config import CONNECTION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionTarget:
+    """Желаемое подключение камеры и его статистика"""
+
+    __slots__ = (
+        'camera_id', 'source_url', 'lock', 'status', 'connecting', 'cancelled',
+        'failures', 'next_attempt', 'down_since', 'last_error', 'stats'
+    )
+
+    def __init__(self, camera_id: str, source_url: str):
+        self.camera_id = camera_id
+        self.source_url = source_url
+        self.lock = threading.Lock()
+        self.status = 'pending'
+        self.connecting = False  # Идет попытка подключения
+        self.cancelled = False  # Камера отключена пользователем
+        self.failures = 0  # Неудачных попыток подряд (для задержки)
+        self.next_attempt = 0.0
+        self.down_since = time.time()
+        self.last_error = None
+
+        self.stats = {
+            'attempts': 0,
+            'failed_attempts': 0,
+            'reconnects': 0,
+            'stalls': 0,
+            'total_downtime': 0.0,
+            'last_time_to_first_frame': 0.0,
+            'total_time_to_first_frame': 0.0,
+            'successful_connects': 0
+        }
+
+
+class CameraSupervisor:
+    """Фоновый поток: подключение камер, повторные попытки с экспоненциальной задержкой и watchdog"""
+
+    def __init__(self, camera_registry):
+        self.camera_registry = camera_registry
+        self.check_interval = CONNECTION_CONFIG['check_interval']
+        self.backoff_initial = CONNECTION_CONFIG['backoff_initial']
+        self.backoff_max = CONNECTION_CONFIG['backoff_max']
+        self.backoff_multiplier = CONNECTION_CONFIG['backoff_multiplier']
+        self.backoff_jitter = CONNECTION_CONFIG['backoff_jitter']
+        self.stall_timeout = CONNECTION_CONFIG['stall_timeout']
+
+        self._targets: Dict[str, ConnectionTarget] = {}
+        self._camera_locks: Dict[str, threading.Lock] = {}  # Подключение/отключение камеры по очереди
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запуск потока контроля подключений"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._supervise_loop, name="camera-supervisor", daemon=True)
+        self._thread.start()
+        logger.info("🛰️ Контроль подключений камер запущен")
+
+    def stop(self):
+        """Остановка потока контроля (камеры не отключаются)"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=3)
+        self._thread = None
+
+    def request_connect(self, camera_id: str, source_url: str) -> bool:
+        """Запрос подключения; возвращается сразу, подключение выполняется в фоне"""
+        if self.camera_registry.get_processor(camera_id) is None:
+            return False
+
+        # Предыдущее подключение камеры заменяется новым
+        self.request_disconnect(camera_id)
+
+        target = ConnectionTarget(camera_id, source_url)
+        with self._lock:
+            self._targets[camera_id] = target
+            self._camera_locks.setdefault(camera_id, threading.Lock())
+
+        self._set_connection_status(camera_id, 'pending')
+        self._launch_attempt(target)
+        return True
+
+    def request_disconnect(self, camera_id: str) -> bool:
+        """Отмена подключения и отключение камеры"""
+        with self._lock:
+            target = self._targets.pop(camera_id, None)
+            camera_lock = self._camera_locks.get(camera_id)
+
+        if target:
+            with target.lock:
+                target.cancelled = True
+                connecting = target.connecting
+            if connecting:
+                # Камеру отключит поток подключения по завершении попытки
+                self._set_connection_status(camera_id, 'disconnected')
+                return True
+
+        processor = self.camera_registry.get_processor(camera_id)
+        if processor is None:
+            return target is not None
+
+        if camera_lock:
+            with camera_lock:
+                processor.disconnect_camera()
+        else:
+            processor.disconnect_camera()
+
+        self._set_connection_status(camera_id, 'disconnected')
+        return True
+
+    def forget_camera(self, camera_id: str):
+        """Удаление данных камеры после удаления из реестра"""
+        with self._lock:
+            self._targets.pop(camera_id, None)
+            self._camera_locks.pop(camera_id, None)
+
+    def _set_connection_status(self, camera_id: str, status: str):
+        state = self.camera_registry.get_state(camera_id)
+        if state is not None:
+            state.connection_status = status
+
+    def _launch_attempt(self, target: ConnectionTarget):
+        """Запуск попытки подключения в отдельном потоке"""
+        with target.lock:
+            if target.connecting or target.cancelled:
+                return
+            target.connecting = True
+
+        threading.Thread(
+            target=self._connect_attempt, args=(target,),
+            name=f"connect-{target.camera_id}", daemon=True
+        ).start()
+
+    def _connect_attempt(self, target: ConnectionTarget):
+        """Попытка подключения: открытие потока, первый кадр, запуск обработки"""
+        camera_id = target.camera_id
+        processor = self.camera_registry.get_processor(camera_id)
+        camera_lock = self._camera_locks.get(camera_id)
+        if processor is None or camera_lock is None:
+            with target.lock:
+                target.connecting = False
+            return
+
+        attempt_start = time.time()
+        connected = False
+        with camera_lock:
+            with target.lock:
+                cancelled = target.cancelled
+            if not cancelled:
+                target.stats['attempts'] += 1
+                try:
+                    if processor.connect_camera(target.source_url):
+                        connected = processor.start_processing()
+                        if not connected:
+                            processor.disconnect_camera()
+                except Exception as e:
+                    target.last_error = str(e)
+                    logger.error(f"Ошибка подключения камеры {camera_id}: {e}")
+
+            now = time.time()
+            with target.lock:
+                target.connecting = False
+                cancelled = target.cancelled
+                if not cancelled:
+                    if connected:
+                        self._on_connected(target, now - attempt_start, now)
+                    else:
+                        self._on_failure(target, now, target.last_error or 'не удалось открыть поток')
+
+            if cancelled and connected:
+                # Камеру отключили во время подключения - отключаем до освобождения блокировки,
+                # чтобы не задеть следующее подключение этой камеры
+                processor.disconnect_camera()
+
+    def _on_connected(self, target: ConnectionTarget, time_to_first_frame: float, now: float):
+        """Учет успешного подключения (вызывается под target.lock)"""
+        stats = target.stats
+        stats['successful_connects'] += 1
+        stats['last_time_to_first_frame'] = time_to_first_frame
+        stats['total_time_to_first_frame'] += time_to_first_frame
+        stats['total_downtime'] += now - target.down_since
+
+        target.status = 'connected'
+        target.failures = 0
+        target.down_since = None
+        target.last_error = None
+        self._set_connection_status(target.camera_id, 'connected')
+
+        logger.info(f"📹 Камера {target.camera_id} подключена, первый кадр через {time_to_first_frame:.2f} с")
+
+    def _on_failure(self, target: ConnectionTarget, now: float, reason: str):
+        """Планирование следующей попытки с экспоненциальной задержкой (вызывается под target.lock)"""
+        target.stats['failed_attempts'] += 1
+        target.failures += 1
+        target.last_error = reason
+        target.status = 'reconnecting'
+
+        delay = min(self.backoff_max, self.backoff_initial * self.backoff_multiplier ** (target.failures - 1))
+        # Случайный разброс, чтобы камеры с общей причиной сбоя не переподключались одновременно
+        delay *= random.uniform(1 - self.backoff_jitter, 1 + self.backoff_jitter)
+        target.next_attempt = now + delay
+        self._set_connection_status(target.camera_id, 'reconnecting')
+
+        logger.warning(f"⚠️ Камера {target.camera_id}: {reason}, повтор через {delay:.1f} с")
+
+    def _supervise_loop(self):
+        """Повторные попытки подключения и контроль зависших потоков"""
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                with self._lock:
+                    targets = list(self._targets.values())
+
+                now = time.time()
+                for target in targets:
+                    with target.lock:
+                        if target.connecting or target.cancelled:
+                            continue
+                        status = target.status
+                        due = now >= target.next_attempt
+
+                    if status == 'connected':
+                        self._check_stream(target, now)
+                    elif status != 'finished' and due:
+                        self._launch_attempt(target)
+
+            except Exception as e:
+                logger.error(f"Ошибка в потоке контроля подключений: {e}")
+
+    def _check_stream(self, target: ConnectionTarget, now: float):
+        """Watchdog: перезапуск захвата при остановке потока или отсутствии новых кадров"""
+        processor = self.camera_registry.get_processor(target.camera_id)
+        camera_lock = self._camera_locks.get(target.camera_id)
+        if processor is None or camera_lock is None:
+            return
+
+        if not processor.is_capture_alive() and processor.source_finished:
+            # Файл или папка без повтора воспроизведены до конца - переподключение не нужно
+            with target.lock:
+                target.status = 'finished'
+            self._set_connection_status(target.camera_id, 'finished')
+            logger.info(f"📹 Камера {target.camera_id}: источник воспроизведен до конца")
+            return
+
+        if not processor.is_capture_alive():
+            reason = 'поток захвата остановлен'
+        elif processor.seconds_since_last_frame() > self.stall_timeout:
+            reason = f'нет новых кадров {self.stall_timeout:.0f} с'
+        else:
+            return
+
+        # Занятая блокировка означает, что камеру сейчас отключают
+        if not camera_lock.acquire(blocking=False):
+            return
+        try:
+            with target.lock:
+                if target.cancelled:
+                    return
+            logger.warning(f"⚠️ Камера {target.camera_id}: {reason}, перезапуск захвата")
+            processor.disconnect_camera()
+        finally:
+            camera_lock.release()
+
+        with target.lock:
+            if target.cancelled:
+                return
+            target.stats['reconnects'] += 1
+            target.stats['stalls'] += 1
+            target.down_since = now
+            # Первая попытка после зависания выполняется без задержки
+            target.failures = 0
+            target.next_attempt = now
+            target.status = 'reconnecting'
+            target.last_error = reason
+        self._set_connection_status(target.camera_id, 'reconnecting')
+
+    def get_stats(self) -> dict:
+        """Статистика подключений по камерам"""
+        with self._lock:
+            targets = list(self._targets.values())
+
+        now = time.time()
+        result = {}
+        for target in targets:
+            with target.lock:
+                stats = target.stats
+                downtime = stats['total_downtime']
+                if target.down_since is not None:
+                    downtime += now - target.down_since
+                connects = stats['successful_connects']
+                result[target.camera_id] = {
+                    'status': 'pending' if target.connecting else target.status,
+                    'attempts': stats['attempts'],
+                    'failed_attempts': stats['failed_attempts'],
+                    'reconnects': stats['reconnects'],
+                    'stalls': stats['stalls'],
+                    'downtime_sec': round(downtime, 1),
+                    'last_time_to_first_frame_sec': round(stats['last_time_to_first_frame'], 2),
+                    'avg_time_to_first_frame_sec': round(stats['total_time_to_first_frame'] / connects, 2) if connects else 0,
+                    'next_attempt_in_sec': round(max(0.0, target.next_attempt - now), 1) if target.status == 'reconnecting' else 0,
+                    'last_error': target.last_error
+                }
+        return result
@@ -0,0 +1,140 @@
+"""
+capture_worker.py - Захват кадров камеры в отдельном процессе с записью в разделяемую память
+"""
+
+import logging
+import multiprocessing
+import time
+
+import cv2
+
+from config import CAMERA_CONFIG, PROCESSING_CONFIG, LOGGING_CONFIG
+from frame_sources import open_frame_source
+from shared_frame_ring import (
+    SharedFrameRing, FRAME_FLAG_PREVIEW, FRAME_FLAG_INFERENCE,
+    HEADER_GRABBED, HEADER_SKIPPED, HEADER_RETRIEVE_NS, HEADER_SOURCE_DONE
+)
+
+logger = logging.getLogger(__name__)
+
+
+def capture_worker_main(camera_id: str, source_url: str, ring_name: str, shape: tuple, slots: int,
+                        stop_event, frame_skip, preview_fps: float):
+    """Точка входа процесса захвата: grab() каждого кадра, retrieve() только нужных
+
+    Источник с rate=max не ждет читателя: при медленной обработке кадры
+    перезаписываются в кольце, поэтому замеры пропускной способности
+    выполняются с PROCESSING_CONFIG['capture_backend'] = 'thread'
+    """
+    logging.basicConfig(
+        level=getattr(logging, LOGGING_CONFIG['level']),
+        format=LOGGING_CONFIG['format']
+    )
+
+    ring = SharedFrameRing.attach(ring_name, shape, slots)
+    cap = open_frame_source(source_url)
+
+    try:
+        if not cap.isOpened():
+            logger.error(f"Процесс захвата {camera_id}: не удалось открыть поток")
+            return
+
+        logger.info(f"Запущен процесс захвата для камеры {camera_id}")
+        preview_interval = 1.0 / preview_fps if preview_fps > 0 else 0
+        last_preview_time = 0.0
+        frame_counter = 0
+
+        while not stop_event.is_set():
+            if not cap.grab():
+                if getattr(cap, 'exhausted', False):
+                    logger.info(f"Процесс захвата {camera_id}: источник закончился")
+                    ring.add_counter(HEADER_SOURCE_DONE)
+                    break
+                time.sleep(0.01)
+                continue
+
+            frame_counter += 1
+            ring.add_counter(HEADER_GRABBED)
+
+            # Шаг пропуска читается из общей памяти и может меняться во время работы
+            current_time = time.time()
+            flags = 0
+            if frame_counter % max(1, frame_skip.value) == 0:
+                flags |= FRAME_FLAG_INFERENCE
+            if current_time - last_preview_time >= preview_interval:
+                flags |= FRAME_FLAG_PREVIEW
+                last_preview_time = current_time
+
+            if not flags:
+                ring.add_counter(HEADER_SKIPPED)
+                continue
+
+            retrieve_start = time.perf_counter_ns()
+            ret, frame = cap.retrieve()
+            if not ret or frame is None:
+                continue
+
+            if frame.shape[:2] != shape[:2]:
+                frame = cv2.resize(frame, (shape[1], shape[0]))
+
+            # Время декодирования передается вместе с кадром (включает изменение размера)
+            decode_ns = time.perf_counter_ns() - retrieve_start
+            ring.write(frame, flags, current_time, decode_ns / 1e9)
+            ring.add_counter(HEADER_RETRIEVE_NS, decode_ns)
+
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"Ошибка в процессе захвата {camera_id}: {e}")
+    finally:
+        cap.release()
+        ring.close()
+        logger.info(f"Процесс захвата для камеры {camera_id} завершен")
+
+
+class CaptureProcessHandle:
+    """Процесс захвата камеры; повторяет интерфейс VideoCapture (isOpened/release)"""
+
+    def __init__(self, camera_id: str, source_url: str):
+        self.camera_id = camera_id
+        self.shape = (CAMERA_CONFIG['height'], CAMERA_CONFIG['width'], 3)
+        self.ring = SharedFrameRing.create(self.shape, PROCESSING_CONFIG['ring_slots'])
+
+        # spawn: fork процесса с потоками и CUDA-контекстом небезопасен
+        context = multiprocessing.get_context('spawn')
+        self.stop_event = context.Event()
+        self.frame_skip = context.Value('i', PROCESSING_CONFIG['frame_skip'], lock=False)
+        self.process = context.Process(
+            target=capture_worker_main,
+            args=(camera_id, source_url, self.ring.name, self.shape, self.ring.slots,
+                  self.stop_event, self.frame_skip, PROCESSING_CONFIG['preview_fps']),
+            name=f"capture-{camera_id}",
+            daemon=True
+        )
+
+    def start(self):
+        """Запуск процесса захвата"""
+        self.process.start()
+
+    def wait_first_frame(self, timeout: float) -> bool:
+        """Ожидание первого кадра в разделяемой памяти"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.ring.latest_seq() > 0:
+                return True
+            if not self.process.is_alive():
+                return False
+            time.sleep(0.05)
+        return False
+
+    def isOpened(self) -> bool:
+        return self.process.is_alive()
+
+    def release(self):
+        """Остановка процесса и освобождение разделяемой памяти"""
+        self.stop_event.set()
+        self.process.join(timeout=3)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.ring.close()
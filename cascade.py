@@ -0,0 +1,86 @@
+"""
+cascade.py - Каскад детектор -> сегментация: сегментация только кадров и фрагментов с людьми
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import CASCADE_CONFIG
+from roi_zones import crop_imgsz, fit_rect, merge_rects
+
+
+class DetectorCascade:
+    """Решение, что сегментировать после детектора, и счетчики этапов
+
+    Детектор (дешевая модель с меньшим imgsz) выполняется на каждом кадре,
+    который иначе ушел бы в сегментацию. Без людей сегментация пропускается;
+    с людьми - сегментируются фрагменты вокруг их боксов или, если фрагменты
+    занимают большую часть кадра, кадр целиком. Кадры плиточного режима
+    сегментируются без детектора (учитываются как bypassed_frames)
+    """
+
+    def __init__(self):
+        self.segment_crops = CASCADE_CONFIG['segment'] == 'crops'
+        self.crop_padding = CASCADE_CONFIG['crop_padding']
+        self.min_crop_size = CASCADE_CONFIG['min_crop_size']
+        self.max_crop_fraction = CASCADE_CONFIG['max_crop_fraction']
+
+        self.stats = {
+            'frames': 0,
+            'detector_calls': 0,
+            'detector_failures': 0,  # Нет результата детектора - сегментация без каскада
+            'bypassed_frames': 0,  # Сегментация плиток без детектора
+            'frames_with_people': 0,
+            'segmentation_calls': 0,
+            'segmentation_crops': 0,
+            'detector_time': 0.0
+        }
+
+    def plan_crops(self, boxes: np.ndarray, width: int, height: int) -> Tuple[Optional[List[tuple]], int]:
+        """Фрагменты вокруг людей и размер входа для них; None - сегментировать весь кадр"""
+        if not self.segment_crops:
+            return None, 0
+
+        rects = []
+        for x1, y1, x2, y2 in boxes:
+            padding = self.crop_padding * max(x2 - x1, y2 - y1)
+            rects.append(fit_rect(int(x1 - padding), int(y1 - padding), int(np.ceil(x2 + padding)),
+                                  int(np.ceil(y2 + padding)), self.min_crop_size, width, height))
+        rects = merge_rects(rects)
+
+        crop_area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in rects)
+        if crop_area >= self.max_crop_fraction * width * height:
+            return None, 0
+        return rects, crop_imgsz(rects)
+
+    def record_detection(self, elapsed: float, people: Optional[int]):
+        """Результат детектора: число людей или None при ошибке"""
+        self.stats['frames'] += 1
+        self.stats['detector_calls'] += 1
+        self.stats['detector_time'] += elapsed
+        if people is None:
+            self.stats['detector_failures'] += 1
+        elif people:
+            self.stats['frames_with_people'] += 1
+
+    def record_segmentation(self, crops: int = 0):
+        """Вызов сегментации: по crops фрагментам или (0) по всему кадру"""
+        self.stats['segmentation_calls'] += 1
+        self.stats['segmentation_crops'] += crops
+
+    def record_bypass(self, crops: int):
+        """Кадр, сегментированный без детектора (по crops плиткам)"""
+        self.stats['frames'] += 1
+        self.stats['bypassed_frames'] += 1
+        self.record_segmentation(crops)
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        frames = stats['frames']
+        detector_time = stats.pop('detector_time')
+        stats['avg_detector_ms'] = round(detector_time / stats['detector_calls'] * 1000, 2) if stats['detector_calls'] else 0
+        # Доля кадров, на которых сегментация не понадобилась
+        stats['segmentation_avoided'] = round(1 - stats['segmentation_calls'] / frames, 3) if frames else 0
+        stats['segment'] = 'crops' if self.segment_crops else 'frame'
+        return stats
@@ -1,8 +1,8 @@
 """
 config.py - Конфигурация и константы системы
 """
+import threading
 from pathlib import Path
-import torch
 
 # Основные пути проекта
 BASE_DIR = Path("D:/yolo_train")
@@ -35,11 +35,186 @@ CAMERA_CONFIG = {
     'max_attempts': 5
 }
 
+# Локальные источники кадров (file://, dir://, synthetic://)
+FRAME_SOURCE_CONFIG = {
+    'image_extensions': ('.jpg', '.jpeg', '.png', '.bmp'),
+    'synthetic_objects': 3  # Движущихся объектов в синтетическом потоке
+}
+
+# Камеры, регистрируемые при запуске (id -> режим обработки)
+DEFAULT_CAMERAS = {
+    'camera1': 'segmentation',
+    'camera2': 'detection'
+}
+
+# Режимы обработки камер
+PROCESSING_MODES = ('segmentation', 'detection')
+
+# Реестр камер
+CAMERA_REGISTRY_CONFIG = {
+    'max_cameras': 64,
+    'auto_register': True,  # Регистрировать неизвестную камеру при подключении
+    'camera_id_pattern': r'^camera[A-Za-z0-9-]{1,32}$'  # Без '_': он разделяет поля в именах файлов алармов
+}
+
 # Настройки обработки
 PROCESSING_CONFIG = {
     'frame_skip': 2,  # Обрабатывать каждый 2-й кадр
     'queue_maxsize': 5,
-    'jpeg_quality': 70
+    'jpeg_quality': 70,
+    'capture_mode': 'grab',  # 'grab' - извлекать только нужные кадры, 'read' - каждый кадр
+    'preview_fps': 10,  # Частота обновления превью, не зависит от частоты inference
+    'capture_backend': 'thread',  # 'process' - захват в отдельном процессе через разделяемую память
+    'ring_slots': 32  # Слотов кольцевого буфера кадров на камеру (режим 'process')
+}
+
+# Предфильтр движения: пропуск inference на статичных сценах
+MOTION_GATE_CONFIG = {
+    'enabled': True,
+    'width': 160,  # Размер уменьшенного кадра для сравнения
+    'height': 120,
+    'blur_kernel': 5,
+    'pixel_threshold': 25,  # Порог изменения яркости пикселя
+    'area_threshold': 0.003,  # Доля измененных пикселей, считающаяся движением
+    'background_alpha': 0.05,  # Скорость обновления фона
+    'refresh_interval': 2.0  # Секунд до принудительного inference
+}
+
+# Кэш результатов по отпечатку кадра: повторно присланные кадры не обрабатываются заново
+RESULT_CACHE_CONFIG = {
+    'enabled': True,
+    'width': 32,  # Размер уменьшенного кадра для отпечатка
+    'height': 24,
+    'tolerance': 6,  # Наибольшая разница яркости ячеек отпечатков одинаковых кадров (шум кодека)
+    'max_entries': 8,  # Результатов на камеру (LRU)
+    'ttl_sec': 30.0,  # Время жизни результата
+    'frozen_after_sec': 10.0  # Секунд неизменного кадра до признания потока зависшим
+}
+
+# Зоны интереса: inference только по фрагментам кадра, содержащим зоны
+ROI_CONFIG = {
+    'max_zones': 16,  # Зон на камеру
+    'crop_padding': 16,  # Отступ вокруг зоны при вырезке, пикселей
+    'min_crop_size': 64,  # Минимальная сторона фрагмента
+    'max_crop_fraction': 0.7,  # При большей суммарной площади фрагментов обрабатывается весь кадр
+    'batch_crops': True  # Фрагменты одной камеры - одним пакетом
+}
+
+# Плиточный inference кадров исходного разрешения (включается для камеры через API)
+TILING_CONFIG = {
+    'enabled': False,  # Значение по умолчанию для новых камер
+    'tile_size': 640,  # Сторона плитки, пикселей (кратно 32)
+    'overlap': 0.2,  # Доля перекрытия соседних плиток
+    'min_tile_size': 256,
+    'max_tile_size': 1280,
+    'max_overlap': 0.5,
+    'nms_iou': 0.5,  # Порог IoU для дублей на стыках плиток
+    'nms_ios': 0.8,  # Порог пересечения к меньшему боксу (обрезанный краем плитки человек)
+    'merge_masks': True  # Объединять маски дублей вместо отбрасывания
+}
+
+# Загрузка моделей по требованию камер
+MODEL_LOADING_CONFIG = {
+    'lazy': True,  # Модель загружается при запуске первой использующей ее камеры
+    'idle_unload_sec': 300,  # Выгрузка модели без камер через N секунд (0 - не выгружать)
+    'check_interval': 10,  # Период проверки простаивающих моделей, секунд
+    # Модель YOLO_MODELS для режима камеры; площадь сегментации нужна в обоих режимах
+    'mode_models': {
+        'segmentation': 'segmentation',
+        'detection': 'segmentation'
+    }
+}
+
+# Замена весов моделей без перезапуска (API /models/swap, /models/rollback)
+MODEL_REGISTRY_CONFIG = {
+    'keep_previous': True,  # Держать предыдущую версию в памяти для мгновенного отката
+    'history_size': 20  # Записей в истории замен
+}
+
+# Пул копий модели для параллельного inference нескольких камер
+INFERENCE_POOL_CONFIG = {
+    'replicas': 1,  # Копий каждой модели (1 - одна общая модель без пула); память растет в replicas раз
+    'threads_per_replica': 0,  # Потоков torch / ONNX Runtime / OpenVINO на копию (0 - ядра CPU поровну между копиями)
+    'utilization_window_sec': 10.0  # Окно расчета загрузки копий, секунд
+}
+
+# Сопровождение людей: inference на ключевых кадрах, между ними - прогноз треков
+TRACKER_CONFIG = {
+    'enabled': True,
+    'keyframe_interval': 3,  # Inference на каждом N-м обработанном кадре
+    'max_keyframe_gap': 1.0,  # Но не реже, секунд
+    'iou_threshold': 0.3,  # Минимальный IoU прогноза и детекции для сопоставления
+    'max_missed': 2,  # Ключевых кадров без детекции до удаления трека
+    'min_hits': 1,  # Попаданий до подтверждения трека (показ, аларм, площадь)
+    'measurement_std': 4.0,  # Шум измерения бокса, пикселей
+    'initial_velocity_std': 100.0,  # Начальная неопределенность скорости, пикселей/с
+    'acceleration_std': 200.0  # Шум процесса (ускорение), пикселей/с^2
+}
+
+# Каскад: сначала детектор людей, сегментация - только кадров или фрагментов с людьми
+CASCADE_CONFIG = {
+    'enabled': True,
+    'detector_model': 'detection',  # Модель YOLO_MODELS первого этапа
+    'detector_imgsz': 320,  # Размер входа детектора
+    'segment': 'crops',  # crops - сегментация фрагментов вокруг людей, frame - всего кадра
+    'crop_padding': 0.2,  # Расширение бокса человека для фрагмента, доля большей стороны
+    'min_crop_size': 96,  # Минимальная сторона фрагмента
+    'max_crop_fraction': 0.5  # При большей суммарной площади фрагментов сегментируется весь кадр
+}
+
+# INT8-квантование ONNX-модели (калибровка по изображениям алармов)
+QUANTIZATION_CONFIG = {
+    'enabled': False,  # Использовать построенную INT8-модель при backend onnx
+    'calibration_images': 100,  # Изображений для калибровки
+    'eval_images': 100,  # Изображений для сравнения с FP32 (не пересекаются с калибровочными)
+    'per_channel': False,  # Поканальные масштабы весов (точнее, дольше калибровка)
+    'match_iou': 0.5,  # IoU совпадения боксов FP32 и INT8
+    'seed': 0
+}
+
+# Адаптивный шаг пропуска кадров (обратная связь по задержке и очереди)
+ADAPTIVE_RATE_CONFIG = {
+    'enabled': True,
+    'target_fps': 5.0,  # Желаемая частота inference на камеру
+    'latency_budget_ms': 500,  # Допустимая задержка от захвата кадра до результата
+    'min_skip': 1,
+    'max_skip': 30,
+    'update_interval': 1.0,  # Секунд между пересчетами шага
+    'high_watermark': 0.75,  # Заполнение очереди, при котором частота снижается
+    'low_watermark': 0.25,  # Заполнение очереди, при котором частоту можно повышать
+    'utilization': 0.8  # Доля пропускной способности модели, отдаваемая камере
+}
+
+# Фоновое подключение камер
+CONNECTION_CONFIG = {
+    'check_interval': 0.5,  # Секунд между проверками подключений
+    'backoff_initial': 1.0,  # Задержка перед первой повторной попыткой
+    'backoff_max': 60.0,
+    'backoff_multiplier': 2.0,
+    'backoff_jitter': 0.2,  # Случайный разброс задержки (±20%)
+    'stall_timeout': 10.0  # Секунд без новых кадров до перезапуска захвата
+}
+
+# Замеры задержек по этапам обработки кадра
+LATENCY_CONFIG = {
+    'enabled': True,
+    'window_size': 1024  # Последних замеров на этап для расчета перцентилей
+}
+
+# Гистограммы задержек inference по моделям и камерам (фиксированная память, всегда включены)
+INFERENCE_STATS_CONFIG = {
+    'min_ms': 0.05,  # Нижняя граница корзин
+    'max_ms': 60000,  # Верхняя граница корзин (большие значения - в последней корзине)
+    'precision': 0.02,  # Относительная ширина корзины - погрешность перцентилей
+    'slot_sec': 5,  # Интервал одной гистограммы в кольце скользящих окон
+    'windows_sec': (10, 60)  # Окна перцентилей и пропускной способности
+}
+
+# Пакетный inference (общий планировщик для всех камер)
+SCHEDULER_CONFIG = {
+    'enabled': True,
+    'max_wait_ms': 15,  # Максимальное ожидание добора пакета
+    'result_timeout': 5.0  # Секунд ожидания результата потоком камеры
 }
 
 # Веб-сервер
@@ -71,6 +246,7 @@ OBJECT_CLASSES = {
 # CUDA и GPU настройки
 def detect_device():
     """Автоматическое определение лучшего доступного устройства"""
+    import torch
 
     if torch.cuda.is_available():
         device = 'cuda'
@@ -92,8 +268,18 @@ def detect_device():
             'gpu_count': 0
         }
 
-# Получаем информацию о устройстве при импорте
-DEVICE_INFO = detect_device()
+# Устройство определяется при первой загрузке модели (init_device): импорт torch
+# занимает секунды, а веб-интерфейс и утилиты без моделей в нем не нуждаются.
+# До определения действуют настройки для CPU
+DEVICE_INFO = {
+    'device': 'cpu',
+    'available': False,
+    'gpu_name': None,
+    'gpu_memory_gb': 0,
+    'gpu_count': 0,
+    'detected': False
+}
+_device_lock = threading.Lock()
 
 # Настройки CUDA
 CUDA_CONFIG = {
@@ -122,6 +308,15 @@ YOLO_CONFIG = {
     'visualize': False,
 }
 
+# Backend inference: PyTorch или экспортированная модель (ONNX Runtime / OpenVINO)
+MODEL_BACKEND_CONFIG = {
+    'backend': 'auto',  # auto - экспорт на CPU при наличии onnxruntime/openvino; torch, torchscript, onnx, openvino
+    'auto_order': ('openvino', 'onnx'),  # Порядок выбора backend в режиме auto
+    'export_dir': MODELS_DIR / "exported",  # Кэш экспортированных моделей и manifest.json
+    'dynamic': True,  # Динамический размер входа и batch (фрагменты зон, пакеты планировщика)
+    'opset': 12  # Версия opset для ONNX
+}
+
 def create_directories():
     """Создание необходимых директорий"""
     directories = [
@@ -135,35 +330,6 @@ def create_directories():
     for directory in directories:
         directory.mkdir(exist_ok=True)
 
-def get_camera_streams_config():
-    """Конфигурация для глобальной переменной camera_streams"""
-
-    return {
-        'camera1': {
-            'cap': None,
-            'connected': False,
-            'frame': None,
-            'processed_frame': None,
-            'config': {},
-            'processing': False,
-            'frame_queue': None,  # Будет создана deque в main
-            'frame_counter': 0,
-            'last_alarm_time': 0
-        },
-
-        'camera2': {
-            'cap': None,
-            'connected': False,
-            'frame': None,
-            'processed_frame': None,
-            'config': {},
-            'processing': False,
-            'frame_queue': None,  # Будет создана deque в main
-            'frame_counter': 0,
-            'last_alarm_time': 0
-        }
-    }
-
 def get_performance_recommendations():
     """Получение рекомендаций по производительности"""
 
@@ -206,14 +372,19 @@ def optimize_for_device():
             'queue_maxsize': 8,  # Больше очередь для GPU
         })      
 
+        CUDA_CONFIG['batch_size'] = 4  # Кадры нескольких камер за один проход
+        ADAPTIVE_RATE_CONFIG['target_fps'] = 15.0
+
         # Настройка памяти GPU
         if DEVICE_INFO['gpu_memory_gb'] >= 8:
             PROCESSING_CONFIG['queue_maxsize'] = 10
             YOLO_CONFIG['max_det'] = 500
+            CUDA_CONFIG['batch_size'] = 8
         elif DEVICE_INFO['gpu_memory_gb'] < 4:
             PROCESSING_CONFIG['queue_maxsize'] = 5
             YOLO_CONFIG['max_det'] = 200
             YOLO_CONFIG['imgsz'] = 416  # Меньший размер для экономии памяти
+            CUDA_CONFIG['batch_size'] = 2
     else:
         # Оптимизация для CPU
         YOLO_CONFIG.update({
@@ -227,5 +398,21 @@ def optimize_for_device():
             'queue_maxsize': 3,  # Меньшая очередь для CPU
         })
 
-# Применяем оптимизации при импорте
+        CUDA_CONFIG['batch_size'] = 2  # На CPU выигрыш в основном от меньших накладных расходов
+        ADAPTIVE_RATE_CONFIG['target_fps'] = 5.0
+
+def init_device() -> dict:
+    """Определение устройства (импорт torch) и настройка конфигурации под него; выполняется один раз"""
+    with _device_lock:
+        if not DEVICE_INFO['detected']:
+            DEVICE_INFO.update(detect_device())
+            DEVICE_INFO['detected'] = True
+            CUDA_CONFIG['device'] = DEVICE_INFO['device']
+            CUDA_CONFIG['use_half_precision'] = DEVICE_INFO['available']
+            YOLO_CONFIG['device'] = CUDA_CONFIG['device']
+            YOLO_CONFIG['half'] = CUDA_CONFIG['use_half_precision']
+            optimize_for_device()
+    return DEVICE_INFO
+
+# Применяем оптимизации при импорте (для CPU; после init_device - для найденного устройства)
 optimize_for_device()
\ No newline at end of file
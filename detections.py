@@ -0,0 +1,158 @@
+"""
+detections.py - Обнаруженные люди в координатах кадра (независимо от формата результатов YOLO)
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import OBJECT_CLASSES
+
+
+class PersonDetections:
+    """Люди на кадре: боксы xyxy, уверенность и маски в пределах целочисленных боксов
+
+    Маска i-го человека хранится только для прямоугольника rects[i] (bool, форма
+    y2-y1 x x2-x1), поэтому результаты разных фрагментов кадра объединяются
+    простым сдвигом координат
+    """
+
+    __slots__ = ('boxes', 'scores', 'rects', 'masks', 'track_ids')
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, rects: np.ndarray,
+                 masks: List[Optional[np.ndarray]], track_ids: Optional[List[int]] = None):
+        self.boxes = boxes
+        self.scores = scores
+        self.rects = rects
+        self.masks = masks
+        self.track_ids = track_ids
+
+    @classmethod
+    def empty(cls) -> 'PersonDetections':
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros((0, 4), np.int32), [])
+
+    @classmethod
+    def from_result(cls, result, frame_shape: Tuple[int, int], offset: Tuple[int, int] = (0, 0),
+                    region_shape: Optional[Tuple[int, int]] = None) -> 'PersonDetections':
+        """Люди из Results ultralytics для фрагмента кадра region_shape со смещением offset"""
+        if result is None or result.boxes is None or len(result.boxes) == 0:
+            return cls.empty()
+
+        # Люди отбираются одной операцией на устройстве модели; на CPU переносятся только они
+        persons = result.boxes.cls == OBJECT_CLASSES['person']
+        if not bool(persons.any()):
+            return cls.empty()
+
+        offset_x, offset_y = offset
+        boxes = result.boxes.xyxy[persons].cpu().numpy().astype(np.float32)
+        boxes[:, [0, 2]] += offset_x
+        boxes[:, [1, 3]] += offset_y
+        scores = result.boxes.conf[persons].cpu().numpy().astype(np.float32)
+        rects = cls._box_rects(boxes, frame_shape)
+
+        masks: List[Optional[np.ndarray]] = [None] * len(boxes)
+        if result.masks is not None:
+            masks_data = result.masks.data[persons].cpu().numpy()
+            masks = cls._crop_masks(masks_data, rects - np.array([offset_x, offset_y] * 2, np.int32),
+                                    region_shape or frame_shape)
+
+        return cls(boxes, scores, rects, masks)
+
+    @staticmethod
+    def _crop_masks(masks_data: np.ndarray, rects: np.ndarray, region_shape: Tuple[int, int]) -> List[np.ndarray]:
+        """Маски в пределах прямоугольников rects фрагмента region_shape
+
+        Маски ultralytics заданы на входе модели (кадр после letterbox): каждому
+        пикселю прямоугольника берется ближайший пиксель маски с учетом масштаба
+        и отступов letterbox. Работа пропорциональна площади боксов, а не кадра
+        """
+        region_h, region_w = region_shape
+        mask_h, mask_w = masks_data.shape[1:]
+        # Масштаб и отступы - как в ultralytics.utils.ops.scale_boxes
+        gain = min(mask_h / region_h, mask_w / region_w)
+        pad_x = round((mask_w - region_w * gain) / 2 - 0.1)
+        pad_y = round((mask_h - region_h * gain) / 2 - 0.1)
+
+        masks = []
+        for mask, (x1, y1, x2, y2) in zip(masks_data, rects):
+            source_x = np.clip(np.floor((np.arange(x1, x2) + 0.5) * gain + pad_x).astype(np.int64), 0, mask_w - 1)
+            source_y = np.clip(np.floor((np.arange(y1, y2) + 0.5) * gain + pad_y).astype(np.int64), 0, mask_h - 1)
+            masks.append(mask[np.ix_(source_y, source_x)] > 0.5)
+        return masks
+
+    @staticmethod
+    def _box_rects(boxes: np.ndarray, frame_shape: Tuple[int, int]) -> np.ndarray:
+        """Целочисленные прямоугольники боксов, ограниченные кадром"""
+        frame_h, frame_w = frame_shape
+        rects = np.empty((len(boxes), 4), np.int32)
+        rects[:, 0] = np.clip(np.floor(boxes[:, 0]), 0, frame_w)
+        rects[:, 1] = np.clip(np.floor(boxes[:, 1]), 0, frame_h)
+        rects[:, 2] = np.clip(np.ceil(boxes[:, 2]), rects[:, 0], frame_w)
+        rects[:, 3] = np.clip(np.ceil(boxes[:, 3]), rects[:, 1], frame_h)
+        return rects
+
+    def rescaled(self, frame_shape: Tuple[int, int], source_shape: Tuple[int, int]) -> 'PersonDetections':
+        """Перенос детекций из кадра source_shape в кадр frame_shape (маски - по ближайшему пикселю)"""
+        scale_y = frame_shape[0] / source_shape[0]
+        scale_x = frame_shape[1] / source_shape[1]
+        boxes = self.boxes * np.array([scale_x, scale_y, scale_x, scale_y], np.float32)
+        rects = self._box_rects(boxes, frame_shape)
+
+        masks: List[Optional[np.ndarray]] = []
+        for rect, source_rect, mask in zip(rects, self.rects, self.masks):
+            if mask is None:
+                masks.append(None)
+                continue
+            # Центры пикселей нового прямоугольника в координатах исходной маски
+            x1, y1, x2, y2 = rect
+            source_x = np.floor((np.arange(x1, x2) + 0.5) / scale_x).astype(np.int64) - source_rect[0]
+            source_y = np.floor((np.arange(y1, y2) + 0.5) / scale_y).astype(np.int64) - source_rect[1]
+            valid_x = (source_x >= 0) & (source_x < mask.shape[1])
+            valid_y = (source_y >= 0) & (source_y < mask.shape[0])
+
+            resized = np.zeros((y2 - y1, x2 - x1), bool)
+            resized[np.ix_(valid_y, valid_x)] = mask[np.ix_(source_y[valid_y], source_x[valid_x])]
+            masks.append(resized)
+
+        return PersonDetections(boxes, self.scores, rects, masks, self.track_ids)
+
+    @classmethod
+    def concat(cls, parts: List['PersonDetections']) -> 'PersonDetections':
+        """Объединение детекций нескольких фрагментов кадра"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+
+        masks = []
+        for part in parts:
+            masks.extend(part.masks)
+        return cls(
+            np.concatenate([part.boxes for part in parts]),
+            np.concatenate([part.scores for part in parts]),
+            np.concatenate([part.rects for part in parts]),
+            masks
+        )
+
+    def select(self, indices) -> 'PersonDetections':
+        """Подмножество детекций по индексам"""
+        indices = list(indices)
+        return PersonDetections(
+            self.boxes[indices],
+            self.scores[indices],
+            self.rects[indices],
+            [self.masks[i] for i in indices],
+            [self.track_ids[i] for i in indices] if self.track_ids is not None else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def areas(self) -> np.ndarray:
+        """Площадь маски каждого человека в пикселях (0 без маски)"""
+        return np.array([int(np.count_nonzero(mask)) if mask is not None else 0 for mask in self.masks], np.int64)
+
+    def total_area(self) -> int:
+        """Суммарная площадь сегментации людей"""
+        return int(self.areas().sum()) if len(self) else 0
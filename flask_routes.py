@@ -3,19 +3,25 @@ flask_routes.py - Flask маршруты приложения с поддерж
 """
 
 import logging
+import re
 from flask import render_template, request, Response, jsonify, send_file
 from typing import Dict, Any
 
+from config import CAMERA_REGISTRY_CONFIG, PROCESSING_MODES, CAMERA_CONFIG
+from roi_zones import ZoneLayout
+from tiling import TiledInference
+
 logger = logging.getLogger(__name__)
 
 class FlaskRoutes:
     """Класс для организации Flask маршрутов"""
     
-    def __init__(self, app, camera_manager, alarm_manager, video_generator):
+    def __init__(self, app, camera_manager, alarm_manager, video_generator, startup_status=None):
         self.app = app
         self.camera_manager = camera_manager
         self.alarm_manager = alarm_manager
         self.video_generator = video_generator
+        self.startup_status = startup_status  # Готовность и фазы запуска приложения
         
         self._register_routes()
 
@@ -29,6 +35,11 @@ class FlaskRoutes:
         self.app.route('/connect_camera', methods=['POST'])(self.connect_camera)
         self.app.route('/disconnect_camera', methods=['POST'])(self.disconnect_camera)
         self.app.route('/camera_status')(self.camera_status)
+        self.app.route('/cameras')(self.list_cameras)
+        self.app.route('/add_camera', methods=['POST'])(self.add_camera)
+        self.app.route('/remove_camera', methods=['POST'])(self.remove_camera)
+        self.app.route('/camera_zones', methods=['GET', 'POST'])(self.camera_zones)
+        self.app.route('/camera_tiling', methods=['GET', 'POST'])(self.camera_tiling)
         
         # API алармов
         self.app.route('/get_alarms')(self.get_alarms)
@@ -41,6 +52,17 @@ class FlaskRoutes:
         # API площади сегментации
         self.app.route('/get_segmentation_stats')(self.get_segmentation_stats)
         
+        # API задержек по этапам обработки кадра
+        self.app.route('/latency_stats')(self.latency_stats)
+        
+        # API состояния запуска: модели загружаются в фоне
+        self.app.route('/startup_status')(self.get_startup_status)
+        
+        # API версий моделей: замена весов и откат без перезапуска
+        self.app.route('/models')(self.list_models)
+        self.app.route('/models/swap', methods=['POST'])(self.swap_model)
+        self.app.route('/models/rollback', methods=['POST'])(self.rollback_model)
+        
         # Видеопотоки
         self.app.route('/video_feed/<camera_id>')(self.video_feed)
         self.app.route('/video_feed_original/<camera_id>')(self.video_feed_original)
@@ -58,22 +80,31 @@ class FlaskRoutes:
         try:
             data = request.json
             camera_id = data.get('camera_id')
-            rtsp_url = data.get('rtsp_url', '').strip()
+            # Кроме RTSP поддерживаются file://, dir:// и synthetic:// (см. frame_sources.py)
+            rtsp_url = (data.get('source_url') or data.get('rtsp_url') or '').strip()
             
             if not rtsp_url:
                 return jsonify({'status': 'error', 'message': 'RTSP URL не может быть пустым'})
             
-            if camera_id not in ['camera1', 'camera2']:
-                return jsonify({'status': 'error', 'message': 'Неверный ID камеры'})
-            
-            # Отключаем камеру если уже подключена
-            if self.camera_manager.is_camera_connected(camera_id):
-                self.camera_manager.disconnect_camera(camera_id)
+            if not self.camera_manager.has_camera(camera_id):
+                # Неизвестная камера регистрируется по требованию
+                if not (CAMERA_REGISTRY_CONFIG['auto_register'] and self._is_valid_camera_id(camera_id)):
+                    return jsonify({'status': 'error', 'message': 'Неверный ID камеры'})
+                
+                if not self.camera_manager.add_camera(camera_id, data.get('mode', 'segmentation')):
+                    return jsonify({'status': 'error', 'message': f'Не удалось зарегистрировать камеру {camera_id}'})
             
-            # Подключаем камеру
+            # Подключаем камеру (предыдущее подключение заменяется)
             success = self.camera_manager.connect_camera(camera_id, rtsp_url)
             
-            if success:
+            if success and self.camera_manager.camera_supervisor:
+                # Подключение выполняется в фоне, состояние доступно в /camera_status
+                return jsonify({
+                    'status': 'success',
+                    'connection_status': 'pending',
+                    'message': f'Подключение камеры {camera_id} запущено'
+                })
+            elif success:
                 return jsonify({'status': 'success', 'message': f'Камера {camera_id} подключена'})
             else:
                 return jsonify({'status': 'error', 'message': f'Не удалось подключить камеру {camera_id}'})
@@ -88,7 +119,7 @@ class FlaskRoutes:
             data = request.json
             camera_id = data.get('camera_id')
             
-            if camera_id not in ['camera1', 'camera2']:
+            if not self.camera_manager.has_camera(camera_id):
                 return jsonify({'status': 'error', 'message': 'Неверный ID камеры'})
             
             success = self.camera_manager.disconnect_camera(camera_id)
@@ -117,18 +148,91 @@ class FlaskRoutes:
             if hasattr(self.camera_manager, 'segmentation_area_manager'):
                 segmentation_stats = self.camera_manager.segmentation_area_manager.get_stats()
             
+            # Добавляем статистику пакетного inference
+            scheduler_stats = {}
+            if self.camera_manager.inference_scheduler:
+                scheduler_stats = self.camera_manager.inference_scheduler.get_stats()
+            
+            # Добавляем статистику подключений (переподключения, простой, время до первого кадра)
+            connection_stats = {}
+            if self.camera_manager.camera_supervisor:
+                connection_stats = self.camera_manager.camera_supervisor.get_stats()
+            
             return jsonify({
                 **camera_status_data,
                 **alarm_stats,
                 'model_info': model_info,
                 'performance': performance_stats,
-                'segmentation': segmentation_stats
+                'segmentation': segmentation_stats,
+                'scheduler': scheduler_stats,
+                'connections': connection_stats
             })
             
         except Exception as e:
             logger.error(f"Ошибка получения статуса камер: {e}")
             return jsonify({'error': str(e)}), 500
 
+    def list_cameras(self):
+        """Список зарегистрированных камер"""
+        try:
+            cameras = self.camera_manager.get_cameras_list()
+            return jsonify({
+                'cameras': cameras,
+                'total': len(cameras),
+                'max_cameras': CAMERA_REGISTRY_CONFIG['max_cameras']
+            })
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения списка камер: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def add_camera(self):
+        """Регистрация новой камеры"""
+        try:
+            data = request.json
+            camera_id = data.get('camera_id')
+            mode = data.get('mode', 'segmentation')
+            
+            if not self._is_valid_camera_id(camera_id):
+                return jsonify({'status': 'error', 'message': 'Неверный ID камеры'})
+            
+            if mode not in PROCESSING_MODES:
+                return jsonify({'status': 'error', 'message': f'Неизвестный режим обработки: {mode}'})
+            
+            if self.camera_manager.has_camera(camera_id):
+                return jsonify({'status': 'error', 'message': f'Камера {camera_id} уже зарегистрирована'})
+            
+            if self.camera_manager.add_camera(camera_id, mode):
+                return jsonify({'status': 'success', 'message': f'Камера {camera_id} добавлена'})
+            else:
+                return jsonify({'status': 'error', 'message': f'Не удалось добавить камеру {camera_id}'})
+                
+        except Exception as e:
+            logger.error(f"Ошибка добавления камеры: {e}")
+            return jsonify({'status': 'error', 'message': str(e)})
+
+    def remove_camera(self):
+        """Удаление камеры из реестра (с отключением)"""
+        try:
+            data = request.json
+            camera_id = data.get('camera_id')
+            
+            if not self.camera_manager.has_camera(camera_id):
+                return jsonify({'status': 'error', 'message': 'Неверный ID камеры'})
+            
+            if self.camera_manager.remove_camera(camera_id):
+                return jsonify({'status': 'success', 'message': f'Камера {camera_id} удалена'})
+            else:
+                return jsonify({'status': 'error', 'message': f'Ошибка удаления камеры {camera_id}'})
+                
+        except Exception as e:
+            logger.error(f"Ошибка удаления камеры: {e}")
+            return jsonify({'status': 'error', 'message': str(e)})
+
+    def _is_valid_camera_id(self, camera_id) -> bool:
+        """Проверка формата ID камеры"""
+        return isinstance(camera_id, str) and re.match(CAMERA_REGISTRY_CONFIG['camera_id_pattern'], camera_id) is not None
+
     def get_alarms(self):
         """Получение списка неоцененных алармов"""
         try:
@@ -212,10 +316,8 @@ class FlaskRoutes:
                 
                 # Добавляем информацию о производительности камер
                 camera_stats = {}
-                for camera_id in ['camera1', 'camera2']:
-                    if camera_id in self.camera_manager.processors:
-                        processor = self.camera_manager.processors[camera_id]
-                        camera_stats[camera_id] = processor.get_performance_stats()
+                for camera_id, processor in self.camera_manager.camera_registry.processors().items():
+                    camera_stats[camera_id] = processor.get_performance_stats()
                 
                 stats['camera_performance'] = camera_stats
                 
@@ -225,6 +327,7 @@ class FlaskRoutes:
                     'current_product': 0,
                     'camera1_area': 0,
                     'camera2_area': 0,
+                    'camera_areas': {},
                     'max_product': 0,
                     'average_product': 0,
                     'total_calculations': 0,
@@ -236,10 +339,123 @@ class FlaskRoutes:
             logger.error(f"Ошибка получения статистики сегментации: {e}")
             return jsonify({'error': str(e)}), 500
 
+    def camera_zones(self):
+        """Зоны интереса камеры: GET ?camera_id=..., POST {camera_id, zones: [...]} (пустой список - весь кадр)"""
+        try:
+            if request.method == 'GET':
+                camera_id = request.args.get('camera_id')
+            else:
+                data = request.json or {}
+                camera_id = data.get('camera_id')
+            
+            if not self.camera_manager.has_camera(camera_id):
+                return jsonify({'status': 'error', 'message': 'Неверный ID камеры'})
+            
+            if request.method == 'POST':
+                try:
+                    self.camera_manager.set_camera_zones(camera_id, data.get('zones') or [])
+                except ValueError as e:
+                    return jsonify({'status': 'error', 'message': str(e)})
+            
+            return jsonify({'status': 'success', 'camera_id': camera_id,
+                            **self.camera_manager.get_camera_zones(camera_id)})
+            
+        except Exception as e:
+            logger.error(f"Ошибка настройки зон камеры: {e}")
+            return jsonify({'status': 'error', 'message': str(e)})
+
+    def camera_tiling(self):
+        """Плиточный inference камеры: GET ?camera_id=..., POST {camera_id, enabled, tile_size, overlap}"""
+        try:
+            if request.method == 'GET':
+                camera_id = request.args.get('camera_id')
+            else:
+                data = request.json or {}
+                camera_id = data.get('camera_id')
+            
+            if not self.camera_manager.has_camera(camera_id):
+                return jsonify({'status': 'error', 'message': 'Неверный ID камеры'})
+            
+            if request.method == 'POST':
+                try:
+                    self.camera_manager.set_camera_tiling(camera_id, data)
+                except ValueError as e:
+                    return jsonify({'status': 'error', 'message': str(e)})
+            
+            return jsonify({'status': 'success', 'camera_id': camera_id,
+                            **self.camera_manager.get_camera_tiling(camera_id)})
+            
+        except Exception as e:
+            logger.error(f"Ошибка настройки плиточного inference камеры: {e}")
+            return jsonify({'status': 'error', 'message': str(e)})
+
+    def latency_stats(self):
+        """Перцентили задержек по этапам для всех камер или одной (?camera_id=...)"""
+        try:
+            camera_id = request.args.get('camera_id')
+            if camera_id is not None and not self.camera_manager.has_camera(camera_id):
+                return jsonify({'status': 'error', 'message': 'Неверный ID камеры'}), 404
+            
+            return jsonify(self.camera_manager.get_latency_stats(camera_id))
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения статистики задержек: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def get_startup_status(self):
+        """Готовность моделей и длительность фаз запуска"""
+        try:
+            if self.startup_status is None:
+                return jsonify({'ready': True})
+            return jsonify(self.startup_status())
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения состояния запуска: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def list_models(self):
+        """Активные и предыдущие версии моделей, кадры по версиям, история замен"""
+        try:
+            return jsonify(self.camera_manager.model_manager.get_registry_info())
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения версий моделей: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def swap_model(self):
+        """Замена весов модели: POST {model_key, weights}; загрузка идет в фоне, статус - GET /models"""
+        try:
+            data = request.json or {}
+            try:
+                swap = self.camera_manager.model_manager.swap_model(data.get('model_key'), data.get('weights'))
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)})
+            
+            return jsonify({'status': 'success', 'swap': swap})
+            
+        except Exception as e:
+            logger.error(f"Ошибка замены модели: {e}")
+            return jsonify({'status': 'error', 'message': str(e)})
+
+    def rollback_model(self):
+        """Откат модели к предыдущей версии: POST {model_key}"""
+        try:
+            data = request.json or {}
+            try:
+                swap = self.camera_manager.model_manager.rollback_model(data.get('model_key'))
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)})
+            
+            return jsonify({'status': 'success', 'swap': swap})
+            
+        except Exception as e:
+            logger.error(f"Ошибка отката модели: {e}")
+            return jsonify({'status': 'error', 'message': str(e)})
+
     def video_feed(self, camera_id: str):
         """Обработанный видео поток"""
         try:
-            if camera_id not in ['camera1', 'camera2']:
+            if not self.camera_manager.has_camera(camera_id):
                 return "Неверный ID камеры", 400
             
             return Response(
@@ -254,7 +470,7 @@ class FlaskRoutes:
     def video_feed_original(self, camera_id: str):
         """Оригинальный видео поток"""
         try:
-            if camera_id not in ['camera1', 'camera2']:
+            if not self.camera_manager.has_camera(camera_id):
                 return "Неверный ID камеры", 400
             
             return Response(
@@ -270,20 +486,62 @@ class FlaskRoutes:
 class CameraManager:
     """Менеджер камер для интеграции с Flask маршрутами"""
     
-    def __init__(self, camera_streams: dict, processors: dict, model_manager, segmentation_area_manager=None):
-        self.camera_streams = camera_streams
-        self.processors = processors
+    def __init__(self, camera_registry, model_manager, segmentation_area_manager=None, inference_scheduler=None,
+                 camera_supervisor=None):
+        self.camera_registry = camera_registry
         self.model_manager = model_manager
         self.segmentation_area_manager = segmentation_area_manager
+        self.inference_scheduler = inference_scheduler
+        self.camera_supervisor = camera_supervisor  # Фоновое подключение и переподключение камер
+
+    def has_camera(self, camera_id: str) -> bool:
+        """Проверка регистрации камеры"""
+        return self.camera_registry.has_camera(camera_id)
+
+    def add_camera(self, camera_id: str, mode: str = 'segmentation') -> bool:
+        """Регистрация камеры с созданием процессора"""
+        if not self.camera_registry.add_camera(camera_id, mode):
+            return False
+        
+        if self.segmentation_area_manager:
+            self.segmentation_area_manager.add_camera(camera_id)
+        return True
+
+    def remove_camera(self, camera_id: str) -> bool:
+        """Отключение и удаление камеры из реестра"""
+        try:
+            if self.camera_supervisor or self.is_camera_connected(camera_id):
+                self.disconnect_camera(camera_id)
+            
+            if not self.camera_registry.remove_camera(camera_id):
+                return False
+            
+            if self.camera_supervisor:
+                self.camera_supervisor.forget_camera(camera_id)
+            if self.segmentation_area_manager:
+                self.segmentation_area_manager.remove_camera(camera_id)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка удаления камеры {camera_id}: {e}")
+            return False
 
     def is_camera_connected(self, camera_id: str) -> bool:
         """Проверка подключения камеры"""
-        return self.camera_streams[camera_id]['connected']
+        state = self.camera_registry.get_state(camera_id)
+        return state is not None and state.connected
 
     def connect_camera(self, camera_id: str, rtsp_url: str) -> bool:
-        """Подключение камеры"""
+        """Подключение камеры (в фоне, если есть CameraSupervisor)"""
         try:
-            processor = self.processors[camera_id]
+            if self.camera_supervisor:
+                return self.camera_supervisor.request_connect(camera_id, rtsp_url)
+            
+            # Отключаем камеру если уже подключена
+            if self.is_camera_connected(camera_id):
+                self.disconnect_camera(camera_id)
+            
+            processor = self.camera_registry.get_processor(camera_id)
             
             # Подключаем камеру
             if processor.connect_camera(rtsp_url):
@@ -303,8 +561,12 @@ class CameraManager:
     def disconnect_camera(self, camera_id: str) -> bool:
         """Отключение камеры"""
         try:
-            processor = self.processors[camera_id]
-            processor.disconnect_camera()
+            if self.camera_supervisor:
+                # Отменяет и фоновые попытки переподключения
+                self.camera_supervisor.request_disconnect(camera_id)
+            else:
+                processor = self.camera_registry.get_processor(camera_id)
+                processor.disconnect_camera()
             
             # Сбрасываем площадь сегментации при отключении
             if self.segmentation_area_manager:
@@ -316,21 +578,60 @@ class CameraManager:
             logger.error(f"Ошибка отключения камеры {camera_id}: {e}")
             return False
 
+    def get_cameras_list(self) -> list:
+        """Список камер с кратким статусом"""
+        return [
+            {'camera_id': camera_id, **state.get_status()}
+            for camera_id, state in self.camera_registry.states().items()
+        ]
+
+    def set_camera_zones(self, camera_id: str, zone_definitions: list):
+        """Установка зон интереса в координатах кадра CAMERA_CONFIG; ValueError при неверных зонах"""
+        zone_layout = None
+        if zone_definitions:
+            zone_layout = ZoneLayout.from_definitions(
+                zone_definitions, CAMERA_CONFIG['width'], CAMERA_CONFIG['height']
+            )
+        self.camera_registry.get_processor(camera_id).set_zone_layout(zone_layout)
+
+    def get_camera_zones(self, camera_id: str) -> dict:
+        """Зоны интереса камеры и фрагменты кадра для inference"""
+        zone_layout = self.camera_registry.get_processor(camera_id).zone_layout
+        if zone_layout is None:
+            return {'zones': [], 'crop_rects': [], 'full_frame_inference': True}
+        return zone_layout.to_dict()
+
+    def set_camera_tiling(self, camera_id: str, settings: dict):
+        """Включение/выключение плиточного inference камеры; ValueError при неверных настройках"""
+        tiler = TiledInference.from_settings(settings) if settings.get('enabled', True) else None
+        self.camera_registry.get_processor(camera_id).set_tiler(tiler)
+
+    def get_camera_tiling(self, camera_id: str) -> dict:
+        """Настройки и стоимость плиточного inference камеры"""
+        tiler = self.camera_registry.get_processor(camera_id).tiler
+        if tiler is None:
+            return {'enabled': False}
+        return tiler.get_stats()
+
+    def get_latency_stats(self, camera_id: str = None) -> dict:
+        """Задержки по этапам (мс) для камеры или всех камер"""
+        processors = self.camera_registry.processors()
+        if camera_id is not None:
+            processors = {camera_id: processors[camera_id]}
+        
+        return {
+            camera_id: processor.latency.get_stats()
+            for camera_id, processor in processors.items()
+        }
+
     def get_cameras_status(self) -> dict:
-        """Получение статуса всех камер"""
+        """Получение статуса всех камер (без блокировок по камерам)"""
         status = {
-            'camera1': {
-                'connected': self.camera_streams['camera1']['connected'],
-                'processing': self.camera_streams['camera1']['processing'],
-                'segmentation_area': self.camera_streams['camera1'].get('segmentation_area', 0)
-            },
-            'camera2': {
-                'connected': self.camera_streams['camera2']['connected'],
-                'processing': self.camera_streams['camera2']['processing'],
-                'segmentation_area': self.camera_streams['camera2'].get('segmentation_area', 0)
-            },
-            'models_loaded': self.model_manager.are_models_loaded()
+            camera_id: state.get_status()
+            for camera_id, state in self.camera_registry.states().items()
         }
+        status['registered_cameras'] = list(status)
+        status['models_loaded'] = self.model_manager.are_models_loaded()
         
         # Добавляем произведение площадей
         if self.segmentation_area_manager:
@@ -0,0 +1,240 @@
+"""
+frame_sources.py - Источники кадров: RTSP, видеофайл, папка изображений, синтетический поток
+"""
+
+import logging
+import os
+import time
+from typing import List
+from urllib.parse import urlsplit, parse_qs
+
+import cv2
+import numpy as np
+
+from config import CAMERA_CONFIG, FRAME_SOURCE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def open_video_capture(source_url: str):
+    """Открытие RTSP потока с настройками из CAMERA_CONFIG"""
+    cap = cv2.VideoCapture(source_url, cv2.CAP_FFMPEG)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_CONFIG['buffer_size'])
+    cap.set(cv2.CAP_PROP_FPS, CAMERA_CONFIG['fps'])
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_CONFIG['width'])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_CONFIG['height'])
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('H', '2', '6', '4'))
+    cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, CAMERA_CONFIG['open_timeout'])
+    cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, CAMERA_CONFIG['read_timeout'])
+    return cap
+
+
+def open_frame_source(source_url: str):
+    """Источник кадров по схеме URL; интерфейс как у cv2.VideoCapture (grab/retrieve/read/release)
+
+    file://путь?loop=1&rate=realtime|max   - видеофайл
+    dir://путь?fps=10&loop=1&rate=...      - папка изображений
+    synthetic://?width=640&height=480&fps=15&objects=3&frames=0&rate=...
+    Остальные URL (rtsp://, http://) открываются через FFMPEG
+    """
+    parts = urlsplit(source_url)
+    params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    realtime = params.get('rate', 'realtime') != 'max'
+    loop = params.get('loop', '1') != '0'
+
+    if parts.scheme == 'file':
+        return VideoFileSource(_url_path(parts), loop=loop, realtime=realtime)
+
+    if parts.scheme == 'dir':
+        fps = float(params.get('fps', CAMERA_CONFIG['fps']))
+        return ImageDirectorySource(_url_path(parts), fps=fps, loop=loop, realtime=realtime)
+
+    if parts.scheme == 'synthetic':
+        return SyntheticSource(
+            width=int(params.get('width', CAMERA_CONFIG['width'])),
+            height=int(params.get('height', CAMERA_CONFIG['height'])),
+            fps=float(params.get('fps', CAMERA_CONFIG['fps'])),
+            objects=int(params.get('objects', FRAME_SOURCE_CONFIG['synthetic_objects'])),
+            frames=int(params.get('frames', 0)),
+            realtime=realtime
+        )
+
+    return open_video_capture(source_url)
+
+
+def _url_path(parts) -> str:
+    """Путь из file:// и dir:// URL (file:///abs/path и file://relative/path)"""
+    return parts.netloc + parts.path
+
+
+class PacedSource:
+    """Базовый класс локальных источников: выдача кадров с частотой источника или без ожидания"""
+
+    def __init__(self, fps: float, realtime: bool):
+        self.realtime = realtime  # False - максимальная скорость (замер пропускной способности)
+        self.frame_interval = 1.0 / fps if fps > 0 else 1.0 / CAMERA_CONFIG['fps']
+        self.next_frame_time = 0.0
+        self.exhausted = False  # Источник без повтора закончился
+        self.loops = 0
+
+    def _wait_frame_time(self):
+        """Ожидание времени следующего кадра в режиме реального времени"""
+        if not self.realtime:
+            return
+
+        now = time.time()
+        if self.next_frame_time > now:
+            time.sleep(self.next_frame_time - now)
+        elif now - self.next_frame_time > self.frame_interval:
+            # Потребитель отстал - не пытаемся наверстать пачкой кадров
+            self.next_frame_time = now
+        self.next_frame_time += self.frame_interval
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def set(self, prop_id, value) -> bool:
+        """Настройки VideoCapture для локальных источников не применяются"""
+        return False
+
+
+class VideoFileSource(PacedSource):
+    """Видеофайл с повтором; в реальном времени воспроизводится с частотой файла"""
+
+    def __init__(self, path: str, loop: bool = True, realtime: bool = True):
+        self.path = path
+        self.loop = loop
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        super().__init__(fps, realtime)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def grab(self) -> bool:
+        self._wait_frame_time()
+        if self.cap.grab():
+            return True
+
+        if not self.loop:
+            self.exhausted = True
+            return False
+
+        # Конец файла - начинаем сначала
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.loops += 1
+        return self.cap.grab()
+
+    def retrieve(self):
+        return self.cap.retrieve()
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(PacedSource):
+    """Папка изображений в порядке имен; изображение декодируется в retrieve()"""
+
+    def __init__(self, path: str, fps: float, loop: bool = True, realtime: bool = True):
+        super().__init__(fps, realtime)
+        self.path = path
+        self.loop = loop
+        self.files = self._list_images(path)
+        self.index = -1
+
+    @staticmethod
+    def _list_images(path: str) -> List[str]:
+        if not os.path.isdir(path):
+            logger.error(f"Папка изображений не найдена: {path}")
+            return []
+
+        extensions = FRAME_SOURCE_CONFIG['image_extensions']
+        return [
+            os.path.join(path, name) for name in sorted(os.listdir(path))
+            if name.lower().endswith(extensions)
+        ]
+
+    def isOpened(self) -> bool:
+        return bool(self.files)
+
+    def grab(self) -> bool:
+        if not self.files:
+            return False
+
+        self._wait_frame_time()
+        if self.index + 1 >= len(self.files):
+            if not self.loop:
+                self.exhausted = True
+                return False
+            self.index = -1
+            self.loops += 1
+
+        self.index += 1
+        return True
+
+    def retrieve(self):
+        if self.index < 0:
+            return False, None
+
+        frame = cv2.imread(self.files[self.index])
+        return frame is not None, frame
+
+    def release(self):
+        self.files = []
+
+
+class SyntheticSource(PacedSource):
+    """Синтетический поток: градиентный фон с движущимися прямоугольниками"""
+
+    def __init__(self, width: int, height: int, fps: float, objects: int, frames: int = 0, realtime: bool = True):
+        super().__init__(fps, realtime)
+        self.width = width
+        self.height = height
+        self.objects = objects
+        self.frames = frames  # 0 - бесконечный поток
+        self.frame_index = 0
+        self.opened = True
+
+        # Фон строится один раз, кадр - копия фона с объектами
+        gradient = np.linspace(40, 200, width, dtype=np.uint8)
+        self.background = np.repeat(np.tile(gradient, (height, 1))[:, :, None], 3, axis=2)
+
+        rng = np.random.default_rng(0)
+        self.positions = rng.uniform(0, 1, (objects, 2))
+        self.velocities = rng.uniform(-0.01, 0.01, (objects, 2))
+        self.colors = rng.integers(50, 255, (objects, 3))
+
+    def isOpened(self) -> bool:
+        return self.opened
+
+    def grab(self) -> bool:
+        if not self.opened:
+            return False
+
+        if self.frames and self.frame_index >= self.frames:
+            self.exhausted = True
+            return False
+
+        self._wait_frame_time()
+        self.frame_index += 1
+        return True
+
+    def retrieve(self):
+        frame = self.background.copy()
+        box_w, box_h = self.width // 8, self.height // 4
+
+        for i in range(self.objects):
+            # Движение с отражением от краев кадра
+            position = (self.positions[i] + self.velocities[i] * self.frame_index) % 2.0
+            position = np.where(position > 1.0, 2.0 - position, position)
+            x = int(position[0] * (self.width - box_w))
+            y = int(position[1] * (self.height - box_h))
+            cv2.rectangle(frame, (x, y), (x + box_w, y + box_h), self.colors[i].tolist(), -1)
+
+        cv2.putText(frame, f"#{self.frame_index}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        return True, frame
+
+    def release(self):
+        self.opened = False
@@ -0,0 +1,258 @@
+"""
+inference_scheduler.py - Централизованный планировщик пакетного inference для всех камер
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, List
+
+from config import CUDA_CONFIG, SCHEDULER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceRequest:
+    """Запрос на inference одного кадра (или фрагмента кадра) от камеры"""
+
+    __slots__ = ('key', 'camera_id', 'model', 'image', 'imgsz', 'future', 'submitted_at')
+
+    def __init__(self, key: str, camera_id: str, model, image, imgsz: Optional[int] = None):
+        self.key = key  # Камера или камера#фрагмент - более новый запрос с тем же ключом замещает старый
+        self.camera_id = camera_id
+        self.model = model
+        self.image = image
+        self.imgsz = imgsz
+        self.future: Future = Future()
+        self.submitted_at = time.time()
+
+
+class InferenceScheduler:
+    """Планировщик, собирающий кадры всех камер в один пакетный вызов YOLO"""
+
+    def __init__(self, model_manager):
+        self.model_manager = model_manager
+        # Размер пакета зависит от устройства и уточняется при запуске
+        self.max_batch_size = max(1, int(CUDA_CONFIG['batch_size']))
+        self.max_wait = SCHEDULER_CONFIG['max_wait_ms'] / 1000.0
+
+        # Последний ожидающий кадр (фрагмент) от каждой камеры
+        self.pending: Dict[str, InferenceRequest] = {}
+        self.active_cameras = set()
+        self.condition = threading.Condition()
+
+        self.running = False
+        # По потоку на копию модели: пакеты разных потоков выполняются параллельно
+        self.workers = model_manager.replica_count()
+        self.threads: List[threading.Thread] = []
+
+        # Статистика пакетов
+        self.stats = {
+            'total_batches': 0,
+            'total_frames': 0,
+            'superseded_frames': 0,
+            'failed_batches': 0,
+            'batch_sizes': {},
+            'batch_latencies': deque(maxlen=100),
+            'queue_waits': deque(maxlen=100)
+        }
+
+    def start(self):
+        """Запуск потока планировщика"""
+        if self.running:
+            return
+
+        self.max_batch_size = max(1, int(CUDA_CONFIG['batch_size']))
+        self.running = True
+        self.threads = [threading.Thread(target=self._scheduler_loop, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+        logger.info(f"📦 Планировщик inference запущен (batch: {self.max_batch_size}, "
+                    f"ожидание: {self.max_wait * 1000:.0f}ms, потоков: {self.workers})")
+
+    def stop(self):
+        """Остановка планировщика с отменой ожидающих запросов"""
+        with self.condition:
+            self.running = False
+            pending = list(self.pending.values())
+            self.pending.clear()
+            self.condition.notify_all()
+
+        for request in pending:
+            request.future.set_result(None)
+
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join(timeout=3)
+
+        logger.info("📦 Планировщик inference остановлен")
+
+    def register_camera(self, camera_id: str):
+        """Регистрация камеры, участвующей в пакетной обработке"""
+        with self.condition:
+            self.active_cameras.add(camera_id)
+
+    def unregister_camera(self, camera_id: str):
+        """Исключение камеры из пакетной обработки"""
+        with self.condition:
+            self.active_cameras.discard(camera_id)
+            requests = [request for request in self.pending.values() if request.camera_id == camera_id]
+            for request in requests:
+                del self.pending[request.key]
+            self.condition.notify_all()
+
+        for request in requests:
+            request.future.set_result(None)
+
+    def submit(self, camera_id: str, model, image, imgsz: Optional[int] = None, key: Optional[str] = None) -> Future:
+        """Постановка кадра в очередь; более старый кадр той же камеры замещается"""
+        request = InferenceRequest(key or camera_id, camera_id, model, image, imgsz)
+
+        with self.condition:
+            if not self.running:
+                request.future.set_result(None)
+                return request.future
+
+            superseded = self.pending.pop(request.key, None)
+            self.pending[request.key] = request
+            if superseded:
+                self.stats['superseded_frames'] += 1
+            self.condition.notify_all()
+
+        if superseded:
+            superseded.future.set_result(None)
+
+        return request.future
+
+    def infer(self, camera_id: str, model, image, imgsz: Optional[int] = None):
+        """Синхронный inference через планировщик (вызывается из потока обработки камеры)"""
+        future = self.submit(camera_id, model, image, imgsz)
+        try:
+            return future.result(timeout=SCHEDULER_CONFIG['result_timeout'])
+        except Exception as e:
+            logger.warning(f"⚠️ Нет результата inference для {camera_id}: {e}")
+            return None
+
+    def infer_many(self, camera_id: str, model, images: list, imgsz: Optional[int] = None) -> Optional[list]:
+        """Inference нескольких фрагментов кадра камеры; фрагменты попадают в общие пакеты"""
+        futures = [
+            self.submit(camera_id, model, image, imgsz, key=f"{camera_id}#{index}")
+            for index, image in enumerate(images)
+        ]
+        deadline = time.time() + SCHEDULER_CONFIG['result_timeout']
+
+        results = []
+        try:
+            for future in futures:
+                result = future.result(timeout=max(0.0, deadline - time.time()))
+                if result is None:
+                    return None
+                results.append(result[0])
+        except Exception as e:
+            logger.warning(f"⚠️ Нет результата inference фрагментов для {camera_id}: {e}")
+            return None
+
+        return results
+
+    def _scheduler_loop(self):
+        """Основной цикл: сбор пакета и запуск inference"""
+        logger.info("Запущен поток планировщика inference")
+
+        while self.running:
+            try:
+                batch = self._collect_batch()
+                if batch:
+                    self._run_batch(batch)
+            except Exception as e:
+                logger.error(f"Ошибка в потоке планировщика inference: {e}")
+                time.sleep(0.1)
+
+        logger.info("Поток планировщика inference завершен")
+
+    def _collect_batch(self) -> List[InferenceRequest]:
+        """Ожидание кадров до заполнения пакета или истечения дедлайна"""
+        with self.condition:
+            while self.running and not self.pending:
+                self.condition.wait(timeout=0.5)
+
+            if not self.running:
+                return []
+
+            # Дедлайн отсчитывается от самого старого ожидающего кадра
+            oldest = min(self.pending.values(), key=lambda r: r.submitted_at)
+            deadline = oldest.submitted_at + self.max_wait
+            target_size = min(self.max_batch_size, max(1, len(self.active_cameras)))
+
+            while self.running and len(self.pending) < target_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(timeout=remaining)
+
+            if not self.pending:
+                return []
+
+            # В один пакет попадают только кадры для той же модели и размера входа
+            oldest = min(self.pending.values(), key=lambda r: r.submitted_at)
+            candidates = sorted(
+                (r for r in self.pending.values() if r.model is oldest.model and r.imgsz == oldest.imgsz),
+                key=lambda r: r.submitted_at
+            )[:self.max_batch_size]
+
+            for request in candidates:
+                del self.pending[request.key]
+
+            return candidates
+
+    def _run_batch(self, batch: List[InferenceRequest]):
+        """Пакетный inference и раздача результатов камерам"""
+        start_time = time.time()
+        for request in batch:
+            self.stats['queue_waits'].append(start_time - request.submitted_at)
+
+        images = [request.image for request in batch]
+        results = self.model_manager.predict_batch_with_stats(batch[0].model, images, "Пакет", batch[0].imgsz,
+                                                              [request.camera_id for request in batch])
+
+        batch_latency = time.time() - start_time
+        batch_size = len(batch)
+        self.stats['total_batches'] += 1
+        self.stats['total_frames'] += batch_size
+        self.stats['batch_sizes'][batch_size] = self.stats['batch_sizes'].get(batch_size, 0) + 1
+        self.stats['batch_latencies'].append(batch_latency)
+
+        if results is None or len(results) != batch_size:
+            self.stats['failed_batches'] += 1
+            for request in batch:
+                request.future.set_result(None)
+            return
+
+        # Каждая камера получает список из одного Results, как при одиночном вызове
+        for request, result in zip(batch, results):
+            request.future.set_result([result])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика размеров пакетов и задержек"""
+        total_batches = self.stats['total_batches']
+        latencies = list(self.stats['batch_latencies'])
+        batch_sizes = dict(self.stats['batch_sizes'])
+        waits = list(self.stats['queue_waits'])
+
+        return {
+            'enabled': self.running,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': round(self.max_wait * 1000, 1),
+            'workers': self.workers,
+            'active_cameras': len(self.active_cameras),
+            'total_batches': total_batches,
+            'total_frames': self.stats['total_frames'],
+            'superseded_frames': self.stats['superseded_frames'],
+            'failed_batches': self.stats['failed_batches'],
+            'average_batch_size': round(self.stats['total_frames'] / total_batches, 2) if total_batches else 0,
+            'batch_size_histogram': dict(sorted(batch_sizes.items())),
+            'average_batch_latency_ms': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0,
+            'max_batch_latency_ms': round(max(latencies) * 1000, 1) if latencies else 0,
+            'average_queue_wait_ms': round(sum(waits) / len(waits) * 1000, 1) if waits else 0
+        }
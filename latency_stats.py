@@ -0,0 +1,251 @@
+"""
+latency_stats.py - Замеры задержек по этапам обработки кадра (от захвата до отправки в браузер)
+и гистограммы задержек inference по моделям и камерам
+"""
+
+import math
+import threading
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+from config import LATENCY_CONFIG, INFERENCE_STATS_CONFIG
+
+# Этапы пути кадра в порядке прохождения
+FRAME_STAGES = (
+    'capture',      # grab()/read() кадра из потока
+    'decode',       # retrieve(): декодирование в BGR
+    'resize',       # приведение к размеру CAMERA_CONFIG
+    'queue_wait',   # ожидание в очереди обработки
+    'inference',    # inference модели (включая ожидание пакета планировщика)
+    'postprocess',  # площадь сегментации, статистика, аларм
+    'draw',         # отрисовка масок и боксов
+    'processed',    # от захвата до готового обработанного кадра
+    'encode',       # JPEG-кодирование для стрима
+    'send',         # передача кадра клиенту
+    'end_to_end'    # от захвата до отправки клиенту
+)
+
+
+class LatencyWindow:
+    """Последние N замеров в кольцевом буфере numpy; перцентили считаются при запросе"""
+
+    def __init__(self, size: int):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.size = size
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.values[self.count % self.size] = seconds
+            self.count += 1
+
+    def get_stats(self) -> dict:
+        """Перцентили задержки в миллисекундах"""
+        with self.lock:
+            samples = self.values[:min(self.count, self.size)].copy()
+            count = self.count
+
+        if samples.size == 0:
+            return {'count': 0}
+
+        p50, p95, p99 = np.percentile(samples, (50, 95, 99)) * 1000
+        return {
+            'count': count,
+            'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2),
+            'max_ms': round(float(samples.max()) * 1000, 2),
+            'avg_ms': round(float(samples.mean()) * 1000, 2)
+        }
+
+
+class FrameLatencyTracker:
+    """Распределения задержек по этапам для одной камеры"""
+
+    def __init__(self):
+        self.enabled = LATENCY_CONFIG['enabled']
+        self.windows = {stage: LatencyWindow(LATENCY_CONFIG['window_size']) for stage in FRAME_STAGES}
+
+    def record(self, stage: str, seconds: float):
+        """Учет длительности этапа"""
+        if self.enabled:
+            self.windows[stage].record(seconds)
+
+    def get_stats(self) -> dict:
+        """Перцентили по всем этапам, по которым есть замеры"""
+        stats = {}
+        for stage in FRAME_STAGES:
+            stage_stats = self.windows[stage].get_stats()
+            if stage_stats['count']:
+                stats[stage] = stage_stats
+        return stats
+
+
+class LatencyHistogram:
+    """Счетчики задержек в логарифмических корзинах фиксированного размера (как HDR Histogram)
+
+    Запись - номер корзины и инкремент счетчика без выделения памяти;
+    перцентили определяются с относительной погрешностью precision
+    """
+
+    def __init__(self, min_ms: float, max_ms: float, precision: float):
+        self.min_sec = min_ms / 1000
+        self.log_base = math.log1p(precision)
+        # Корзина 0 - значения до min_ms, последняя - от max_ms
+        self.size = int(math.ceil(math.log(max_ms / min_ms) / self.log_base)) + 2
+        self.counts = np.zeros(self.size, dtype=np.int64)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def index(self, seconds: float) -> int:
+        if seconds <= self.min_sec:
+            return 0
+        return min(int(math.log(seconds / self.min_sec) / self.log_base) + 1, self.size - 1)
+
+    def value(self, index: int) -> float:
+        """Середина корзины (геометрическая), секунд"""
+        if index == 0:
+            return self.min_sec
+        return self.min_sec * math.exp((index - 0.5) * self.log_base)
+
+    def record(self, seconds: float, count: int = 1):
+        self.counts[self.index(seconds)] += count
+        self.total += count
+        self.sum += seconds * count
+        if seconds > self.max:
+            self.max = seconds
+
+    def clear(self):
+        self.counts[:] = 0
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def merge_from(self, histograms: Iterable['LatencyHistogram']):
+        """Сумма гистограмм (в этот же буфер)"""
+        self.clear()
+        for histogram in histograms:
+            self.counts += histogram.counts
+            self.total += histogram.total
+            self.sum += histogram.sum
+            self.max = max(self.max, histogram.max)
+
+    def get_stats(self) -> dict:
+        """Среднее, p50/p90/p99 и максимум в миллисекундах"""
+        if not self.total:
+            return {'count': 0}
+
+        cumulative = np.cumsum(self.counts)
+        percentiles = {}
+        for percentile in (50, 90, 99):
+            index = int(np.searchsorted(cumulative, self.total * percentile / 100))
+            # Значение корзины не больше наблюдаемого максимума
+            percentiles[f'p{percentile}_ms'] = round(min(self.value(index), self.max) * 1000, 2)
+
+        return {
+            'count': self.total,
+            'avg_ms': round(self.sum / self.total * 1000, 2),
+            **percentiles,
+            'max_ms': round(self.max * 1000, 2)
+        }
+
+
+class SlidingLatencyStats:
+    """Кольцо гистограмм по интервалам slot_sec: перцентили и пропускная способность за скользящие окна"""
+
+    def __init__(self):
+        settings = INFERENCE_STATS_CONFIG
+        self.slot_sec = settings['slot_sec']
+        self.windows_sec = tuple(settings['windows_sec'])
+        slots = int(math.ceil(max(self.windows_sec) / self.slot_sec))
+
+        def make_histogram():
+            return LatencyHistogram(settings['min_ms'], settings['max_ms'], settings['precision'])
+
+        self.slots = [make_histogram() for _ in range(slots)]
+        self.slot_ids = [-1] * slots  # Номер интервала, накопленного в слоте
+        self.total = make_histogram()  # С момента запуска
+        self.window = make_histogram()  # Буфер для суммы слотов окна
+        self.started_at: Optional[float] = None  # Время первого замера
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float, count: int = 1, now: Optional[float] = None):
+        now = now or time.time()
+        slot_id = int(now // self.slot_sec)
+        index = slot_id % len(self.slots)
+        with self.lock:
+            if self.started_at is None:
+                self.started_at = now
+            if self.slot_ids[index] != slot_id:
+                self.slots[index].clear()
+                self.slot_ids[index] = slot_id
+            self.slots[index].record(seconds, count)
+            self.total.record(seconds, count)
+
+    def get_stats(self, now: Optional[float] = None) -> dict:
+        """Статистика с запуска и по окнам: перцентили и кадров в секунду"""
+        now = now or time.time()
+        current_slot = int(now // self.slot_sec)
+
+        with self.lock:
+            stats = self.total.get_stats()
+            if not stats['count']:
+                return stats
+
+            windows = {}
+            for window_sec in self.windows_sec:
+                first_slot = current_slot - int(math.ceil(window_sec / self.slot_sec)) + 1
+                self.window.merge_from(
+                    slot for slot, slot_id in zip(self.slots, self.slot_ids) if first_slot <= slot_id <= current_slot
+                )
+                window_stats = self.window.get_stats()
+                # Окно - от начала первого слота до текущего момента, но не раньше первого замера
+                elapsed = max(now - max(first_slot * self.slot_sec, self.started_at), 1e-6)
+                window_stats['throughput_fps'] = round(self.window.total / elapsed, 2)
+                windows[f'{window_sec}s'] = window_stats
+
+        stats['windows'] = windows
+        return stats
+
+
+class InferenceLatencyStats:
+    """Задержки inference (на кадр) в целом, по моделям и по камерам"""
+
+    def __init__(self):
+        self.overall = SlidingLatencyStats()
+        self.by_model = {}
+        self.by_camera = {}
+        self.lock = threading.Lock()
+
+    def _get(self, recorders: dict, key: str) -> SlidingLatencyStats:
+        recorder = recorders.get(key)
+        if recorder is None:
+            with self.lock:
+                recorder = recorders.setdefault(key, SlidingLatencyStats())
+        return recorder
+
+    def record(self, elapsed: float, frames: int, model_key: Optional[str] = None,
+               camera_ids: Optional[list] = None):
+        """Вызов модели на frames кадрах; время делится поровну между кадрами"""
+        per_frame = elapsed / frames
+        now = time.time()
+        self.overall.record(per_frame, frames, now)
+        if model_key is not None:
+            self._get(self.by_model, model_key).record(per_frame, frames, now)
+        for camera_id in camera_ids or ():
+            if camera_id is not None:
+                self._get(self.by_camera, camera_id).record(per_frame, 1, now)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            by_model = dict(self.by_model)
+            by_camera = dict(self.by_camera)
+        return {
+            'overall': self.overall.get_stats(),
+            'models': {key: recorder.get_stats() for key, recorder in by_model.items()},
+            'cameras': {key: recorder.get_stats() for key, recorder in by_camera.items()}
+        }
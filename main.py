@@ -2,21 +2,31 @@
 main.py - Главный файл Flask приложения системы видеоаналитики с подсчетом площади сегментации
 """
 
+import time
+
+# Время импорта модулей приложения входит в фазы запуска
+_import_start = time.time()
+
+import argparse
 import logging
+import threading
 import webbrowser
-from collections import deque
+from contextlib import contextmanager
 from threading import Timer
 from flask import Flask
 
-# Импорты модулей приложения
+# Импорты модулей приложения (torch и ultralytics загружаются в фоне)
 from config import (
-    create_directories, get_camera_streams_config, 
-    SERVER_CONFIG, LOGGING_CONFIG
+    create_directories, init_device, DEFAULT_CAMERAS, DEVICE_INFO,
+    SERVER_CONFIG, LOGGING_CONFIG, SCHEDULER_CONFIG, MODEL_LOADING_CONFIG
 )
 
 from model_manager import ModelManager
+from inference_scheduler import InferenceScheduler
 from alarm_manager import AlarmManager
 from camera_processor import CameraProcessor, VideoStreamGenerator, SegmentationAreaManager
+from camera_registry import CameraRegistry
+from camera_supervisor import CameraSupervisor
 from flask_routes import FlaskRoutes, CameraManager
 
 # Настройка логирования
@@ -26,113 +36,183 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_import_sec = time.time() - _import_start
+
 class VideoAnalyticsApp:
     """Главный класс приложения системы видеоаналитики"""
     
     def __init__(self):
         self.app = Flask(__name__)
+        
+        # Фазы запуска (секунды); модели загружаются в фоне после старта веб-сервера
+        self.startup = {'ready': False, 'phases': {'imports': round(_import_sec, 2)}, 'error': None}
+        self.startup_start = _import_start
+        self.startup_lock = threading.Lock()
+        self.model_loader: threading.Thread = None
+        
         self.model_manager = ModelManager()
         self.alarm_manager = AlarmManager()
         
+        # Общий планировщик пакетного inference для всех камер
+        self.inference_scheduler = InferenceScheduler(self.model_manager) if SCHEDULER_CONFIG['enabled'] else None
+        
         # Создаем менеджер площади сегментации
         self.segmentation_area_manager = SegmentationAreaManager()
         
-        # Создаем структуру камер
-        self.camera_streams = get_camera_streams_config()
-        self._initialize_camera_queues()
+        # Создаем реестр камер (процессоры создаются по требованию)
+        self.camera_registry = CameraRegistry(self._create_camera_processor)
         
-        # Создаем процессоры камер
-        self.processors = self._create_camera_processors()
+        # Фоновое подключение камер с переподключением и watchdog
+        self.camera_supervisor = CameraSupervisor(self.camera_registry)
         
         # Создаем менеджер камер
         self.camera_manager = CameraManager(
-            self.camera_streams, 
-            self.processors, 
+            self.camera_registry,
             self.model_manager,
-            self.segmentation_area_manager  # Передаем менеджер площади
+            self.segmentation_area_manager,  # Передаем менеджер площади
+            self.inference_scheduler,
+            self.camera_supervisor
         )
         
+        # Регистрируем камеры по умолчанию
+        for camera_id, mode in DEFAULT_CAMERAS.items():
+            self.camera_manager.add_camera(camera_id, mode)
+        
         # Создаем генератор видеопотоков
-        self.video_generator = VideoStreamGenerator(self.camera_streams)
+        self.video_generator = VideoStreamGenerator(self.camera_registry)
         
         # Регистрируем маршруты
         self.routes = FlaskRoutes(
             self.app,
             self.camera_manager,
             self.alarm_manager,
-            self.video_generator
+            self.video_generator,
+            startup_status=self.get_startup_status
         )
 
-    def _initialize_camera_queues(self):
-        """Инициализация очередей кадров для камер"""
-        for camera_id in self.camera_streams:
-            self.camera_streams[camera_id]['frame_queue'] = deque(maxlen=2)
-            # Добавляем поле для площади сегментации
-            self.camera_streams[camera_id]['segmentation_area'] = 0
-
-    def _create_camera_processors(self) -> dict:
-        """Создание процессоров для камер"""
-        processors = {}
+    def _create_camera_processor(self, camera_id: str, camera_state) -> CameraProcessor:
+        """Создание процессора для камеры (вызывается реестром при добавлении камеры)"""
         
         # Функция callback для создания алармов
         def alarm_callback(camera_id: str, frame):
-            self.alarm_manager.create_alarm(camera_id, frame)
+            return self.alarm_manager.create_alarm(camera_id, frame)
         
         # Функция callback для обновления площади сегментации
         def segmentation_callback(camera_id: str, area: int):
             self.segmentation_area_manager.update_camera_area(camera_id, area)
         
-        # Создаем процессоры для каждой камеры
-        for camera_id in ['camera1', 'camera2']:
-            processors[camera_id] = CameraProcessor(
-                camera_id=camera_id,
-                camera_streams=self.camera_streams,
-                yolo_model=None,  # Будет установлена позже в _update_processors_models
-                alarm_callback=alarm_callback,
-                model_manager=self.model_manager,
-                segmentation_callback=segmentation_callback  # Новый callback
-            )
-        
-        return processors
+        return CameraProcessor(
+            camera_id=camera_id,
+            camera_state=camera_state,
+            yolo_model=None,  # Модель выдается model_manager при запуске обработки
+            alarm_callback=alarm_callback,
+            model_manager=self.model_manager,
+            segmentation_callback=segmentation_callback,  # Новый callback
+            inference_scheduler=self.inference_scheduler
+        )
+
+    @contextmanager
+    def _phase(self, name: str):
+        """Замер фазы запуска"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            with self.startup_lock:
+                self.startup['phases'][name] = round(time.time() - start, 2)
+
+    def get_startup_status(self) -> dict:
+        """Готовность и длительность фаз запуска"""
+        with self.startup_lock:
+            status = {
+                'ready': self.startup['ready'],
+                'phases': dict(self.startup['phases']),
+                'error': self.startup['error']
+            }
+        status['device'] = DEVICE_INFO['device'] if DEVICE_INFO['detected'] else None
+        status['models'] = {
+            model_key: model['loaded'] for model_key, model in self.model_manager.get_model_info()['models'].items()
+        }
+        status['uptime_sec'] = round(time.time() - self.startup_start, 2)
+        return status
 
     def initialize(self):
-        """Инициализация приложения"""
+        """Инициализация приложения; загрузка моделей продолжается в фоне"""
         logger.info("🚀 Инициализация приложения...")
         
         # Создаем необходимые директории
-        create_directories()
+        with self._phase('directories'):
+            create_directories()
         logger.info("📁 Директории созданы")
         
-        # Загружаем модели YOLO
-        models_loaded = self.model_manager.load_models()
-        if models_loaded:
-            logger.info("🤖 YOLO модели загружены успешно")
-            # Обновляем процессоры с загруженными моделями
-            self._update_processors_models()
-        else:
-            logger.warning("⚠️ Не удалось загрузить YOLO модели")
+        # Запускаем контроль подключений камер
+        self.camera_supervisor.start()
         
-        # Загружаем статистику и алармы
-        self.alarm_manager.load_statistics()
-        self.alarm_manager.load_alarms_from_folders()
+        # Загружаем статистику и алармы - доступны в веб-интерфейсе до загрузки моделей
+        with self._phase('alarms'):
+            self.alarm_manager.load_statistics()
+            self.alarm_manager.load_alarms_from_folders()
         logger.info("📊 Статистика и алармы загружены")
         
-        logger.info("✅ Инициализация завершена")
+        self.model_loader = threading.Thread(target=self._load_models_background, name="model-loader", daemon=True)
+        self.model_loader.start()
+        
+        logger.info("✅ Инициализация завершена, модели загружаются в фоне")
 
-    def _update_processors_models(self):
-        """Обновление моделей в процессорах"""
-        segmentation_model = self.model_manager.get_segmentation_model()
+    def _load_models_background(self):
+        """Импорт torch, определение устройства, загрузка и прогрев моделей"""
+        try:
+            with self._phase('torch_import'):
+                import torch  # noqa: F401
+                import ultralytics  # noqa: F401
+            
+            with self._phase('device'):
+                init_device()
+            
+            # Размер пакета зависит от устройства
+            if self.inference_scheduler:
+                self.inference_scheduler.start()
+            
+            # Модели загружаются при запуске первой использующей их камеры
+            if MODEL_LOADING_CONFIG['lazy']:
+                logger.info("🤖 YOLO модели будут загружены по требованию камер")
+                self.model_manager.start()
+            else:
+                with self._phase('model_load'):
+                    loaded = self.model_manager.load_models()
+                if loaded:
+                    logger.info("🤖 YOLO модели загружены успешно")
+                else:
+                    logger.warning("⚠️ Не удалось загрузить YOLO модели")
+                
+                # Прогрев выполняется при загрузке - его длительность выделяется отдельно
+                backend_info = self.model_manager.get_model_info()['backend_info']
+                warmup = sum(info.get('warmup_sec', 0) for info in backend_info.values())
+                with self.startup_lock:
+                    self.startup['phases']['warmup'] = round(warmup, 2)
+                    self.startup['phases']['model_load'] = round(max(self.startup['phases']['model_load'] - warmup, 0), 2)
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка фоновой загрузки моделей: {e}")
+            with self.startup_lock:
+                self.startup['error'] = str(e)
+        
+        with self.startup_lock:
+            self.startup['ready'] = True
+            self.startup['phases']['total'] = round(time.time() - self.startup_start, 2)
+            phases = dict(self.startup['phases'])
         
-        for processor in self.processors.values():
-            processor.yolo_model = segmentation_model
+        logger.info("⏱️ Фазы запуска: " + ", ".join(f"{name} {sec}s" for name, sec in phases.items()))
+        logger.info(f"💻 Устройство: {DEVICE_INFO['device'].upper()}")
 
-    def run(self):
+    def run(self, open_browser: bool = True):
         """Запуск приложения"""
         try:
             logger.info("🌐 Запуск веб-сервера...")
             
             # Открываем браузер с задержкой
-            Timer(SERVER_CONFIG['browser_delay'], self._open_browser).start()
+            if open_browser:
+                Timer(SERVER_CONFIG['browser_delay'], self._open_browser).start()
             
             # Выводим информацию о запуске
             self._print_startup_info()
@@ -170,10 +250,21 @@ class VideoAnalyticsApp:
         device_info = model_info['device_info']
         
         logger.info("🤖 Информация о моделях:")
-        logger.info(f"   📊 Статус: {'✅ Загружены' if model_info['models_loaded'] else '❌ Не загружены'}")
-        logger.info(f"   💻 Устройство: {device_info['device'].upper()}")
+        if model_info['models_loaded']:
+            logger.info("   📊 Статус: ✅ Загружены")
+        elif model_info['lazy_loading']:
+            logger.info("   📊 Статус: ⏳ Загрузка по требованию камер")
+        elif not self.startup['ready']:
+            logger.info("   📊 Статус: ⏳ Загружаются в фоне (GET /startup_status)")
+        else:
+            logger.info("   📊 Статус: ❌ Не загружены")
+        if not device_info['detected']:
+            logger.info("   💻 Устройство: ⏳ определяется")
+        else:
+            logger.info(f"   💻 Устройство: {device_info['device'].upper()}")
+        logger.info(f"   ⚙️ Backend inference: {model_info['backend'] or 'выбирается при загрузке модели'}")
         
-        if device_info['available']:
+        if device_info['detected'] and device_info['available']:
             logger.info(f"   🔥 GPU: {device_info['gpu_name']}")
             logger.info(f"   💾 GPU память: {device_info['gpu_memory_gb']} GB")
             
@@ -183,7 +274,7 @@ class VideoAnalyticsApp:
             logger.info("💡 Рекомендации по производительности:")
             for rec in recommendations:
                 logger.info(f"   {rec}")
-        else:
+        elif device_info['detected']:
             logger.info("   ⚠️ CUDA не доступна - используется CPU")
             logger.info("   💡 Для ускорения установите CUDA и PyTorch с GPU поддержкой")
         
@@ -204,17 +295,32 @@ class VideoAnalyticsApp:
         logger.info(f"   🎯 Точность: {stats['accuracy_percentage']}%")
         
         # Настройки производительности
-        from config import YOLO_CONFIG, PROCESSING_CONFIG
+        from config import YOLO_CONFIG, PROCESSING_CONFIG, ADAPTIVE_RATE_CONFIG
         logger.info("⚙️ Настройки производительности:")
         logger.info(f"   🖼️ Размер изображения: {YOLO_CONFIG['imgsz']}")
         logger.info(f"   🔧 Precision: {'FP16' if YOLO_CONFIG['half'] else 'FP32'}")
-        logger.info(f"   📊 Пропуск кадров: каждый {PROCESSING_CONFIG['frame_skip']}-й")
+        if ADAPTIVE_RATE_CONFIG['enabled']:
+            logger.info(f"   📊 Пропуск кадров: адаптивный, начиная с каждого {PROCESSING_CONFIG['frame_skip']}-го "
+                        f"(цель {ADAPTIVE_RATE_CONFIG['target_fps']} FPS, "
+                        f"задержка до {ADAPTIVE_RATE_CONFIG['latency_budget_ms']}ms)")
+        else:
+            logger.info(f"   📊 Пропуск кадров: каждый {PROCESSING_CONFIG['frame_skip']}-й")
         logger.info(f"   🔄 Размер очереди: {PROCESSING_CONFIG['queue_maxsize']}")
+        if self.inference_scheduler and not device_info['detected']:
+            logger.info("   📦 Пакетный inference: размер пакета - после определения устройства")
+        elif self.inference_scheduler:
+            logger.info(f"   📦 Пакетный inference: до {self.inference_scheduler.max_batch_size} кадров, "
+                        f"ожидание {SCHEDULER_CONFIG['max_wait_ms']}ms")
+        else:
+            logger.info("   📦 Пакетный inference: отключен")
         
         # Информация о площади сегментации
         logger.info("🔍 Подсчет площади сегментации:")
-        logger.info("   📐 Камера 1: Сегментация людей с подсчетом площади")
-        logger.info("   📐 Камера 2: Детекция + сегментация с подсчетом площади")
+        for camera_id, state in self.camera_registry.states().items():
+            if state.mode == 'segmentation':
+                logger.info(f"   📐 {camera_id}: Сегментация людей с подсчетом площади")
+            else:
+                logger.info(f"   📐 {camera_id}: Детекция + сегментация с подсчетом площади")
         logger.info("   ✖️ Произведение площадей: автоматический расчет")
         
         logger.info("=" * 70)
@@ -224,12 +330,18 @@ class VideoAnalyticsApp:
         logger.info("🧹 Очистка ресурсов...")
         
         try:
-            # Отключаем все камеры
-            for camera_id in ['camera1', 'camera2']:
-                if self.camera_manager.is_camera_connected(camera_id):
+            # Останавливаем переподключение, затем отключаем все камеры
+            self.camera_supervisor.stop()
+            for camera_id in self.camera_registry.camera_ids():
+                state = self.camera_registry.get_state(camera_id)
+                if state.connected or state.connection_status != 'disconnected':
                     self.camera_manager.disconnect_camera(camera_id)
                     logger.info(f"📹 Камера {camera_id} отключена")
             
+            # Останавливаем планировщик inference
+            if self.inference_scheduler:
+                self.inference_scheduler.stop()
+            
             # Выгружаем модели из памяти
             self.model_manager.unload_models()
             logger.info("🤖 YOLO модели выгружены")
@@ -254,13 +366,21 @@ class VideoAnalyticsApp:
 
 def main():
     """Главная функция запуска приложения"""
+    parser = argparse.ArgumentParser(description="Система видеоаналитики")
+    parser.add_argument('--host', default=SERVER_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['port'])
+    parser.add_argument('--no-browser', action='store_true', help="Не открывать браузер")
+    args = parser.parse_args()
+    SERVER_CONFIG['host'] = args.host
+    SERVER_CONFIG['port'] = args.port
+    
     try:
         # Создаем и инициализируем приложение
         app = VideoAnalyticsApp()
         app.initialize()
         
         # Запускаем приложение
-        app.run()
+        app.run(open_browser=not args.no_browser)
         
     except Exception as e:
         logger.error(f"💥 Критическая ошибка запуска: {e}")
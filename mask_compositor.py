@@ -0,0 +1,71 @@
+"""
+mask_compositor.py - Наложение масок людей на кадр за один проход
+"""
+
+import colorsys
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from detections import PersonDetections
+
+# Шаг оттенка между соседними номерами (золотое сечение): цвета соседних треков различаются
+HUE_STEP = 0.618033988749895
+
+# Номеров людей в карте (uint8, 0 - фон); при большем числе людей цвета повторяются
+MAX_LABELS = 255
+
+
+def track_color(key: int) -> tuple:
+    """Постоянный цвет (BGR) трека или номера человека"""
+    hue = (key * HUE_STEP) % 1.0
+    r, g, b = colorsys.hsv_to_rgb(hue, 0.75, 1.0)
+    return int(b * 255), int(g * 255), int(r * 255)
+
+
+class MaskCompositor:
+    """Цветные маски всех людей кадра: карта номеров и одно смешивание
+
+    Маски записываются в карту номеров людей (буфер камеры размером с кадр),
+    карта переводится в цвета таблицей cv2.LUT, общий прямоугольник боксов
+    смешивается с цветами одним cv2.addWeighted и копируется на кадр только
+    под масками: пиксели вне масок не меняются, каждый пиксель смешивается
+    один раз. После наложения прямоугольник очищается в карте
+    """
+
+    def __init__(self):
+        self.labels: Optional[np.ndarray] = None  # Номер человека для пикселей кадра, 0 - фон
+        self.lut = np.zeros((256, 1, 3), np.uint8)  # Номер -> цвет BGR
+
+    def draw(self, frame: np.ndarray, detections: PersonDetections, opacity: float) -> np.ndarray:
+        """Кадр с масками; без масок возвращается сам frame"""
+        drawn = [index for index, mask in enumerate(detections.masks) if mask is not None and mask.size]
+        if not drawn:
+            return frame
+
+        if self.labels is None or self.labels.shape != frame.shape[:2]:
+            self.labels = np.zeros(frame.shape[:2], np.uint8)
+
+        rects = detections.rects[drawn]
+        left, top = rects[:, 0].min(), rects[:, 1].min()
+        right, bottom = rects[:, 2].max(), rects[:, 3].max()
+        labels = self.labels[top:bottom, left:right]
+
+        # Перекрывающиеся маски: пиксель получает больший номер
+        keys = detections.track_ids if detections.track_ids is not None else list(range(len(detections)))
+        for position, index in enumerate(drawn):
+            label = position % MAX_LABELS + 1
+            self.lut[label, 0] = track_color(keys[index])
+            x1, y1, x2, y2 = detections.rects[index]
+            box_labels = labels[y1 - top:y2 - top, x1 - left:x2 - left]
+            np.maximum(box_labels, detections.masks[index].view(np.uint8) * np.uint8(label), out=box_labels)
+
+        colors = cv2.LUT(cv2.merge((labels, labels, labels)), self.lut)
+        annotated_frame = frame.copy()
+        region = annotated_frame[top:bottom, left:right]
+        blended = cv2.addWeighted(region, 1.0 - opacity, colors, opacity, 0)
+        cv2.copyTo(blended, labels, region)
+
+        labels.fill(0)
+        return annotated_frame
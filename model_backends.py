@@ -0,0 +1,359 @@
+"""
+model_backends.py - Backend inference моделей YOLO: PyTorch или экспортированные TorchScript / ONNX Runtime / OpenVINO
+"""
+from __future__ import annotations
+
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
+import logging
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Tuple, TYPE_CHECKING
+
+from config import MODEL_BACKEND_CONFIG, QUANTIZATION_CONFIG, YOLO_CONFIG, DEVICE_INFO
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+logger = logging.getLogger(__name__)
+
+# Формат экспорта ultralytics и модуль, без которого backend недоступен
+EXPORT_BACKENDS = {
+    'torchscript': {'format': 'torchscript', 'module': 'torch'},
+    'onnx': {'format': 'onnx', 'module': 'onnxruntime'},
+    'openvino': {'format': 'openvino', 'module': 'openvino'}
+}
+
+# Библиотеки, от версий которых зависит собранный артефакт
+ARTIFACT_LIBRARIES = ('torch', 'ultralytics')
+
+
+def is_backend_available(backend: str) -> bool:
+    """Установлен ли runtime для экспортированного backend"""
+    if backend == 'torch':
+        return True
+    spec = EXPORT_BACKENDS.get(backend)
+    return spec is not None and importlib.util.find_spec(spec['module']) is not None
+
+
+def resolve_backend(requested: str) -> str:
+    """Backend с учетом устройства и установленных пакетов; недоступный заменяется на torch"""
+    if requested == 'auto':
+        # На GPU быстрее PyTorch (FP16), экспорт нужен только для CPU
+        if DEVICE_INFO['available']:
+            return 'torch'
+        for backend in MODEL_BACKEND_CONFIG['auto_order']:
+            if is_backend_available(backend):
+                return backend
+        return 'torch'
+
+    if requested not in EXPORT_BACKENDS and requested != 'torch':
+        logger.warning(f"⚠️ Неизвестный backend {requested} - используется torch")
+        return 'torch'
+
+    if not is_backend_available(requested):
+        logger.warning(f"⚠️ Для backend {requested} не установлен {EXPORT_BACKENDS[requested]['module']} - используется torch")
+        return 'torch'
+
+    return requested
+
+
+def runtime_versions() -> dict:
+    """Версии библиотек для ключа кэша: артефакт пересобирается после их обновления"""
+    versions = {}
+    for library in ARTIFACT_LIBRARIES:
+        try:
+            versions[library] = importlib.metadata.version(library)
+        except importlib.metadata.PackageNotFoundError:
+            versions[library] = None
+    return versions
+
+
+# Ограничение потоков сессий runtime, создаваемых в текущем потоке (см. runtime_threads)
+_thread_limit = threading.local()
+_thread_limit_lock = threading.Lock()
+_thread_limited_backends = set()
+
+
+def _install_thread_limit(backend: str) -> bool:
+    """Подмена конструктора сессии runtime: ultralytics создает ее без настроек потоков"""
+    with _thread_limit_lock:
+        if backend in _thread_limited_backends:
+            return True
+
+        if backend == 'onnx':
+            import onnxruntime
+
+            class ThreadLimitedSession(onnxruntime.InferenceSession):
+                def __init__(self, path_or_bytes, sess_options=None, *args, **kwargs):
+                    threads = getattr(_thread_limit, 'threads', None)
+                    if threads:
+                        sess_options = sess_options or onnxruntime.SessionOptions()
+                        sess_options.intra_op_num_threads = threads
+                        _thread_limit.sessions += 1
+                    super().__init__(path_or_bytes, sess_options, *args, **kwargs)
+
+            onnxruntime.InferenceSession = ThreadLimitedSession
+
+        elif backend == 'openvino':
+            import openvino
+
+            class ThreadLimitedCore(openvino.Core):
+                def __init__(self, *args, **kwargs):
+                    super().__init__(*args, **kwargs)
+                    threads = getattr(_thread_limit, 'threads', None)
+                    if threads:
+                        self.set_property('CPU', {'INFERENCE_NUM_THREADS': threads})
+                        _thread_limit.sessions += 1
+
+            openvino.Core = ThreadLimitedCore
+
+        else:
+            return False
+
+        _thread_limited_backends.add(backend)
+        return True
+
+
+@contextmanager
+def runtime_threads(backend: str, threads: int):
+    """Число потоков сессий ONNX Runtime / OpenVINO, созданных в текущем потоке внутри блока
+
+    Возвращает словарь с числом ограниченных сессий ('sessions') после выхода
+    из блока; RuntimeError - backend не поддерживает ограничение потоков
+    """
+    if not _install_thread_limit(backend):
+        raise RuntimeError(f"ограничение потоков не поддерживается для backend {backend}")
+
+    report = {'sessions': 0}
+    _thread_limit.threads, _thread_limit.sessions = threads, 0
+    try:
+        yield report
+    finally:
+        report['sessions'] = _thread_limit.sessions
+        _thread_limit.threads, _thread_limit.sessions = None, 0
+
+
+def file_sha256(path: Path) -> str:
+    """Хэш файла весов (ключ кэша экспорта)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """Кэш экспортированных моделей: артефакты в export_dir, описание в manifest.json
+
+    Ключ записи - хэш весов, backend и imgsz, поэтому замена .pt файла
+    или размера входа приводит к повторному экспорту. TorchScript собирается
+    под устройство и точность, поэтому его ключ дополнен ими и версиями
+    библиотек. Для каждой записи хранится время холодного (со сборкой) и
+    последнего теплого (из кэша) запуска модели
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, export_dir: Path):
+        self.export_dir = Path(export_dir)
+        self.manifest_path = self.export_dir / self.MANIFEST_NAME
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(weights_hash: str, backend: str, imgsz: int, variant: Optional[str] = None) -> str:
+        key = f"{weights_hash[:16]}-{backend}-{imgsz}"
+        return f"{key}-{variant}" if variant else key
+
+    @classmethod
+    def int8_key(cls, entry: dict) -> str:
+        """Ключ INT8-модели, построенной из экспортированной FP32-модели entry"""
+        return cls.make_key(entry['sha256'], f"{entry['backend']}-int8", entry['imgsz'])
+
+    def _load_manifest(self) -> dict:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прочитать {self.manifest_path}: {e}")
+            return {}
+
+    def _save_manifest(self, manifest: dict):
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        temp_path.replace(self.manifest_path)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Запись кэша, если артефакт на месте"""
+        with self.lock:
+            entry = self._load_manifest().get(key)
+        if entry and Path(entry['path']).exists():
+            return entry
+        return None
+
+    def put(self, key: str, entry: dict):
+        with self.lock:
+            manifest = self._load_manifest()
+            manifest[key] = entry
+            self._save_manifest(manifest)
+
+    def entries(self) -> dict:
+        with self.lock:
+            return self._load_manifest()
+
+    def record_startup(self, key: str, cold: bool, startup_sec: float, warmup_sec: float) -> Optional[dict]:
+        """Время запуска модели из артефакта: холодный - со сборкой, теплый - из кэша
+
+        Возвращает сравнение холодного и теплого запуска (None - записи нет)
+        """
+        with self.lock:
+            manifest = self._load_manifest()
+            entry = manifest.get(key)
+            if entry is None:
+                return None
+            startup = entry.setdefault('startup', {})
+            startup['cold' if cold else 'warm'] = {
+                'startup_sec': startup_sec,
+                'warmup_sec': warmup_sec,
+                'at': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            self._save_manifest(manifest)
+
+        report = {
+            'cold_sec': startup.get('cold', {}).get('startup_sec'),
+            'warm_sec': startup.get('warm', {}).get('startup_sec')
+        }
+        if report['cold_sec'] is not None and report['warm_sec'] is not None:
+            report['saved_sec'] = round(report['cold_sec'] - report['warm_sec'], 2)
+        return report
+
+
+def load_model(weights: str, backend: str, cache: ExportCache) -> Tuple[YOLO, dict]:
+    """Загрузка модели для backend: экспорт при первом запуске, далее - из кэша
+
+    Возвращает модель с интерфейсом YOLO (вызов model(image, **YOLO_CONFIG)
+    одинаков для всех backend) и описание backend для get_model_info
+    """
+    from ultralytics import YOLO
+
+    torch_model = YOLO(weights)
+    info = {'backend': 'torch', 'weights': str(weights), 'task': torch_model.task, 'precision': 'fp32'}
+    if backend == 'torch':
+        return torch_model, info
+
+    try:
+        entry, cached = get_export_entry(torch_model, weights, backend, cache)
+        key = entry.get('key') or cache.make_key(entry['sha256'], backend, entry['imgsz'])
+
+        # INT8-модель строится отдельно (python quantization.py) и используется, если включена
+        precision = 'fp32'
+        if QUANTIZATION_CONFIG['enabled'] and backend == 'onnx':
+            int8_entry = cache.get(cache.int8_key(entry))
+            if int8_entry:
+                entry, key, precision = int8_entry, cache.int8_key(entry), 'int8'
+                logger.info(f"   🔢 INT8 модель: {entry['path']}")
+            else:
+                logger.warning(f"   ⚠️ INT8 модель для {weights} не построена (python quantization.py) - используется FP32")
+
+        load_start = time.time()
+        model = YOLO(entry['path'], task=torch_model.task)
+        info.update({
+            'backend': backend,
+            'precision': 'fp16' if entry.get('half') else precision,
+            'half': entry.get('half', False),
+            'artifact': entry['path'],
+            'cache_key': key,
+            'from_cache': cached,
+            'imgsz': entry['imgsz'],
+            'dynamic': entry.get('dynamic'),
+            'export_time_sec': entry.get('export_time_sec'),
+            'load_time_sec': round(time.time() - load_start, 2)
+        })
+        if precision == 'int8':
+            info['quantization_report'] = entry.get('report')
+        return model, info
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка подготовки backend {backend} для {weights}: {e} - используется torch")
+        info['fallback_reason'] = str(e)
+        return torch_model, info
+
+
+def get_export_entry(torch_model: YOLO, weights: str, backend: str, cache: ExportCache) -> Tuple[dict, bool]:
+    """Запись кэша экспортированной модели (экспорт при отсутствии) и признак попадания в кэш"""
+    weights_path = Path(getattr(torch_model, 'ckpt_path', None) or weights)
+    weights_hash = file_sha256(weights_path)
+    imgsz = YOLO_CONFIG['imgsz']
+    versions = runtime_versions()
+
+    # TorchScript трассируется на устройстве inference с фиксированным входом imgsz
+    if backend == 'torchscript':
+        device = DEVICE_INFO['device']
+        half = bool(YOLO_CONFIG['half'] and DEVICE_INFO['available'])
+        dynamic = False
+        versions_hash = hashlib.sha256(json.dumps(versions, sort_keys=True).encode()).hexdigest()[:8]
+        variant = f"{device}-{'fp16' if half else 'fp32'}-{versions_hash}"
+    else:
+        device, half, dynamic, variant = 'cpu', False, MODEL_BACKEND_CONFIG['dynamic'], None
+    key = cache.make_key(weights_hash, backend, imgsz, variant)
+
+    entry = cache.get(key)
+    if entry is not None:
+        logger.info(f"   📦 Экспортированная модель {backend} из кэша: {entry['path']}")
+        return entry, True
+    return _export_model(torch_model, weights_path, weights_hash, backend, imgsz, cache, key,
+                         device, half, dynamic, versions), False
+
+
+def _export_model(torch_model: YOLO, weights_path: Path, weights_hash: str, backend: str,
+                  imgsz: int, cache: ExportCache, key: str, device: str, half: bool, dynamic: bool,
+                  versions: dict) -> dict:
+    """Экспорт весов и перенос артефакта в каталог кэша"""
+    logger.info(f"   🔄 Экспорт {weights_path.name} в {backend} (imgsz={imgsz}), выполняется один раз...")
+    export_start = time.time()
+    exported = Path(torch_model.export(
+        format=EXPORT_BACKENDS[backend]['format'],
+        imgsz=imgsz,
+        dynamic=dynamic,
+        opset=MODEL_BACKEND_CONFIG['opset'] if backend == 'onnx' else None,
+        half=half,
+        device=device
+    ))
+    export_time = time.time() - export_start
+
+    # Артефакт (файл .onnx или каталог *_openvino_model) переносится в кэш с ключом в имени;
+    # окончание имени сохраняется - по нему ultralytics определяет формат
+    cache.export_dir.mkdir(parents=True, exist_ok=True)
+    target = cache.export_dir / exported.name.replace(weights_path.stem, f"{weights_path.stem}-{key}", 1)
+    if target.is_dir():
+        shutil.rmtree(target)
+    elif target.exists():
+        target.unlink()
+    shutil.move(str(exported), str(target))
+
+    entry = {
+        'key': key,
+        'path': str(target),
+        'weights': str(weights_path),
+        'sha256': weights_hash,
+        'backend': backend,
+        'imgsz': imgsz,
+        'dynamic': dynamic,
+        'device': device,
+        'half': half,
+        'versions': versions,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'export_time_sec': round(export_time, 1)
+    }
+    cache.put(key, entry)
+    logger.info(f"   ✅ Экспорт {backend} завершен за {export_time:.1f} с: {target}")
+    return entry
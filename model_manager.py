@@ -1,58 +1,542 @@
 """
 model_manager.py - Управление YOLO моделями с поддержкой CUDA
+
+torch и ultralytics импортируются при первой загрузке модели, а не при импорте модуля
 """
+from __future__ import annotations
+
+import gc
 import logging
-import torch
-from typing import Optional, Dict, Any
-from ultralytics import YOLO
-from config import YOLO_MODELS, YOLO_CONFIG, DEVICE_INFO
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING
+from config import (
+    YOLO_MODELS, YOLO_CONFIG, DEVICE_INFO, MODEL_BACKEND_CONFIG, MODEL_LOADING_CONFIG,
+    MODEL_REGISTRY_CONFIG, INFERENCE_POOL_CONFIG, CASCADE_CONFIG, init_device
+)
+from model_backends import EXPORT_BACKENDS, ExportCache, resolve_backend, load_model, runtime_threads
+from latency_stats import InferenceLatencyStats
+from replica_pool import ReplicaPool
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
 
 logger = logging.getLogger(__name__)
 
+# Названия моделей для логов
+MODEL_TITLES = {
+    'segmentation': "сегментации",
+    'detection': "детекции"
+}
+
 class ModelManager:
-    """Менеджер для управления YOLO моделями с поддержкой CUDA"""
+    """Менеджер для управления YOLO моделями с поддержкой CUDA
+
+    Модели загружаются при первом запросе камеры (acquire) и разделяются
+    по счетчику ссылок; модель без камер выгружается после простоя.
+    Веса можно заменить на ходу (swap_model): новая версия загружается
+    и прогревается в фоне, затем передается камерам, которые применяют
+    ее между кадрами; предыдущая версия остается для отката
+    """
 
     def __init__(self):
-        self.yolo_seg_model: Optional[YOLO] = None
-        self.yolo_det_model: Optional[YOLO] = None
-        self.models_loaded = False
+        self.models: Dict[str, Optional[YOLO]] = {model_key: None for model_key in YOLO_MODELS}
+        self.model_refs = {model_key: 0 for model_key in YOLO_MODELS}
+        self.model_idle_since: Dict[str, Optional[float]] = {model_key: None for model_key in YOLO_MODELS}
+        # Загрузка/выгрузка модели под своей блокировкой, счетчики - под общей
+        self.model_locks = {model_key: threading.Lock() for model_key in YOLO_MODELS}
+        self.refs_lock = threading.Lock()
+        self.models_loaded = False  # Загружена хотя бы одна модель
         self.device_info = DEVICE_INFO
+        self.backend: Optional[str] = None  # Фактический backend inference (torch, onnx, openvino)
+        self.backend_info: Dict[str, Any] = {}
+        self.export_cache = ExportCache(MODEL_BACKEND_CONFIG['export_dir'])
+        
+        # Версии весов: активная, предыдущая (для отката) и камеры, получающие замену
+        self.model_weights = dict(YOLO_MODELS)
+        self.model_versions = {model_key: 'v1' for model_key in YOLO_MODELS}
+        self.version_counters = {model_key: 1 for model_key in YOLO_MODELS}
+        self.previous_models: Dict[str, Optional[dict]] = {model_key: None for model_key in YOLO_MODELS}
+        self.model_consumers = {model_key: set() for model_key in YOLO_MODELS}
+        self.version_frames = {model_key: {} for model_key in YOLO_MODELS}
+        self.active_swaps: Dict[str, Optional[dict]] = {model_key: None for model_key in YOLO_MODELS}
+        self.swap_history = deque(maxlen=MODEL_REGISTRY_CONFIG['history_size'])
+        
+        # Пулы копий моделей (None - inference на самой модели)
+        self.replica_pools: Dict[str, Optional[ReplicaPool]] = {model_key: None for model_key in YOLO_MODELS}
+        
+        self.idle_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
         self.performance_stats = {
-            'inference_times': [],
-            'memory_usage': [],
             'total_inferences': 0
         }
+        # Гистограммы задержек на кадр: в целом, по моделям и камерам
+        self.inference_latency = InferenceLatencyStats()
+
+    @property
+    def yolo_seg_model(self) -> Optional[YOLO]:
+        return self.models['segmentation']
+
+    @property
+    def yolo_det_model(self) -> Optional[YOLO]:
+        return self.models['detection']
+
+    @staticmethod
+    def replica_count() -> int:
+        """Копий каждой модели для параллельного inference"""
+        return max(1, int(INFERENCE_POOL_CONFIG['replicas']))
+
+    @staticmethod
+    def required_models() -> list:
+        """Модели, используемые режимами камер и каскадом (остальные не загружаются)"""
+        models = set(MODEL_LOADING_CONFIG['mode_models'].values())
+        if CASCADE_CONFIG['enabled']:
+            models.add(CASCADE_CONFIG['detector_model'])
+        return sorted(models)
 
     def load_models(self) -> bool:
-        """Загрузка моделей YOLO с оптимизацией для устройства"""
+        """Предварительная загрузка моделей, используемых режимами камер"""
+        logger.info("🤖 Загрузка моделей YOLO...")
+        for model_key in self.required_models():
+            with self.model_locks[model_key]:
+                if not self._ensure_loaded(model_key):
+                    return False
+
+        logger.info("✅ YOLO модели загружены и сконфигурированы успешно")
+        # Выводим статистику производительности
+        self._log_performance_info()
+        return True
+
+    def acquire(self, model_key: str, consumer=None) -> Optional[YOLO]:
+        """Модель для камеры (загружается при первом запросе); парный вызов - release()
+
+        consumer (процессор камеры с методом swap_model) получает новые версии модели
+        """
+        with self.model_locks[model_key]:
+            if not self._ensure_loaded(model_key):
+                return None
+            with self.refs_lock:
+                self.model_refs[model_key] += 1
+                self.model_idle_since[model_key] = None
+                if consumer is not None:
+                    self.model_consumers[model_key].add(consumer)
+            return self.models[model_key]
+
+    def release(self, model_key: str, consumer=None):
+        """Камера больше не использует модель; без камер начинается отсчет простоя"""
+        with self.refs_lock:
+            if self.model_refs[model_key] > 0:
+                self.model_refs[model_key] -= 1
+            if self.model_refs[model_key] == 0:
+                self.model_idle_since[model_key] = time.time()
+            if consumer is not None:
+                self.model_consumers[model_key].discard(consumer)
+                # Отключенная камера не задерживает завершение замены
+                self._confirm_swap(model_key, None, consumer.camera_id)
+
+    def _ensure_loaded(self, model_key: str) -> bool:
+        """Загрузка и прогрев модели, если она еще не загружена (под model_locks[model_key])"""
+        if self.models[model_key] is not None:
+            return True
 
+        model_type = MODEL_TITLES.get(model_key, model_key)
         try:
-            logger.info("🤖 Загрузка моделей YOLO...")
-            self._log_device_info()
+            self._resolve_backend()
+            weights = self.model_weights[model_key]
+
+            logger.info(f"📦 Загрузка модели {model_type}: {weights} ({self.model_versions[model_key]})")
+            load_start = time.time()
+            model, info = self._load_model(weights, self.backend, model_type)
+            warmup_start = time.time()
+            self._warmup_model(model, model_type)
+            info['warmup_sec'] = round(time.time() - warmup_start, 2)
+            pool = self._build_pool(model, info['backend'], weights, model_type)
+            info['startup_sec'] = round(time.time() - load_start, 2)
+            self._record_startup(info, model_type)
+
+            with self.refs_lock:
+                self.backend_info[model_key] = info
+                self.models[model_key] = model
+                self.replica_pools[model_key] = pool
+                self.model_idle_since[model_key] = time.time()
+            self.models_loaded = True
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки модели {model_type}: {e}")
+            return False
+
+    def _record_startup(self, info: dict, model_type: str):
+        """Холодный (сборка артефакта) и теплый (из кэша) запуск экспортированной модели"""
+        if 'cache_key' not in info:
+            return
+        try:
+            report = self.export_cache.record_startup(info['cache_key'], not info['from_cache'],
+                                                      info['startup_sec'], info['warmup_sec'])
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось записать время запуска модели {model_type}: {e}")
+            return
+        if not report:
+            return
+
+        info['startup_report'] = report
+        if 'saved_sec' in report:
+            logger.info(f"   ⏱️ Запуск модели {model_type}: теплый {report['warm_sec']} с, "
+                        f"холодный {report['cold_sec']} с (выигрыш {report['saved_sec']} с)")
+        else:
+            logger.info(f"   ⏱️ Запуск модели {model_type}: {info['startup_sec']} с "
+                        f"({'теплый' if info['from_cache'] else 'холодный, со сборкой артефакта'})")
+
+    def _resolve_backend(self):
+        """Выбор backend inference при первой загрузке модели"""
+        if self.backend is not None:
+            return
+        init_device()
+        self._log_device_info()
+        requested_backend = MODEL_BACKEND_CONFIG['backend']
+        self.backend = resolve_backend(requested_backend)
+        logger.info(f"⚙️ Backend inference: {self.backend} (запрошен: {requested_backend})")
+
+    def _load_model(self, weights: str, backend: str, model_type: str) -> Tuple[YOLO, dict]:
+        """Загрузка модели выбранным backend; модели PyTorch переносятся на устройство"""
+        model, info = load_model(weights, backend, self.export_cache)
+
+        if info['backend'] == 'torch':
+            self._configure_model(model, model_type)
+        else:
+            logger.info(f"   📍 Модель {model_type}: {info['backend']} ({info['artifact']})")
+        return model, info
 
-            # Загружаем модель сегментации
-            logger.info(f"📦 Загрузка модели сегментации: {YOLO_MODELS['segmentation']}")
-            self.yolo_seg_model = YOLO(YOLO_MODELS['segmentation'])
-            self._configure_model(self.yolo_seg_model, "сегментации")
+    def _build_pool(self, model: YOLO, backend: str, weights: str, model_type: str) -> Optional[ReplicaPool]:
+        """Пул из модели и replicas-1 дополнительных копий; None - пул не нужен"""
+        replicas = self.replica_count()
+        if replicas <= 1:
+            return None
 
-            # Загружаем модель детекции
-            logger.info(f"📦 Загрузка модели детекции: {YOLO_MODELS['detection']}")
-            self.yolo_det_model = YOLO(YOLO_MODELS['detection'])
-            self._configure_model(self.yolo_det_model, "детекции")
+        threads = INFERENCE_POOL_CONFIG['threads_per_replica'] or max(1, (os.cpu_count() or 1) // replicas)
+        if backend in ('torch', 'torchscript'):
+            models = [model]
+            for _ in range(replicas - 1):
+                replica, _ = self._load_model(weights, self.backend, model_type)
+                self._warmup_model(replica, model_type)
+                models.append(replica)
+            thread_limit = 'torch'
+        else:
+            models = self._build_runtime_replicas(model, weights, model_type, backend, replicas, threads)
+            if models is None:
+                return None
+            thread_limit = EXPORT_BACKENDS[backend]['module']
+
+        pool = ReplicaPool(model_type, models, threads, INFERENCE_POOL_CONFIG['utilization_window_sec'], thread_limit)
+        pool.start()
+        return pool
+
+    def _build_runtime_replicas(self, model: YOLO, weights: str, model_type: str, backend: str,
+                                replicas: int, threads: int) -> Optional[list]:
+        """Копии экспортированной модели с сессиями runtime на threads потоков; None - пул не строится
+
+        Сессия ONNX Runtime / OpenVINO создается при первом вызове модели с числом
+        потоков runtime по умолчанию (все ядра), поэтому сессия модели пересоздается
+        при прогреве вместе с сессиями копий. Если ограничить потоки не удалось,
+        копии заняли бы replicas x ядер - используется одна модель без пула
+        """
+        models = [model]
+        try:
+            with runtime_threads(backend, threads) as report:
+                model.predictor = None  # Сессия с потоками по умолчанию пересоздается при прогреве
+                self._warmup_model(model, model_type)
+                for _ in range(replicas - 1):
+                    replica, info = self._load_model(weights, self.backend, model_type)
+                    if info['backend'] != backend:
+                        raise RuntimeError(f"копия загружена backend {info['backend']}")
+                    self._warmup_model(replica, model_type)
+                    models.append(replica)
+            if report['sessions'] < replicas:
+                raise RuntimeError(f"потоки ограничены у {report['sessions']} сессий из {replicas}")
+        except Exception as e:
+            model.predictor = None  # Без пула модель работает с потоками runtime по умолчанию
+            logger.warning(f"⚠️ Пул {model_type} не создан: не удалось ограничить потоки {backend} ({e}) - "
+                           f"{replicas} копий с потоками по умолчанию перегрузили бы ядра CPU")
+            return None
 
-            # Прогрев моделей
-            self._warmup_models()
-            self.models_loaded = True
-            logger.info("✅ YOLO модели загружены и сконфигурированы успешно")
+        logger.info(f"   🧵 {backend}: {threads} потоков на сессию, {replicas} копий")
+        return models
+
+    def swap_model(self, model_key: str, weights: str) -> dict:
+        """Замена весов модели без перезапуска: загрузка и прогрев новой версии в фоне
+
+        Возвращает запись о замене; ValueError - неизвестная модель, неверные веса
+        или загрузка другой версии еще не завершена
+        """
+        weights = str(weights or '').strip()
+        if not weights.endswith('.pt'):
+            raise ValueError("Веса модели - путь к файлу .pt")
+
+        with self.refs_lock:
+            self._check_swap_allowed(model_key)
+            self.version_counters[model_key] += 1
+            record = self._start_swap_record(model_key, f"v{self.version_counters[model_key]}", weights, 'swap')
+
+        threading.Thread(target=self._swap_worker, args=(model_key, weights, record), daemon=True).start()
+        return self._swap_view(record)
+
+    def rollback_model(self, model_key: str) -> dict:
+        """Возврат предыдущей версии: из памяти сразу, иначе повторной загрузкой ее весов"""
+        with self.refs_lock:
+            self._check_swap_allowed(model_key)
+            previous = self.previous_models[model_key]
+            if previous is None:
+                raise ValueError(f"Для модели {model_key} нет предыдущей версии")
+            record = self._start_swap_record(model_key, previous['version'], previous['weights'], 'rollback')
+
+        if previous['model'] is None:
+            threading.Thread(target=self._swap_worker, args=(model_key, previous['weights'], record),
+                             daemon=True).start()
+        else:
+            with self.model_locks[model_key]:
+                self._publish_model(model_key, previous['model'], previous['info'], record, previous['pool'])
+        return self._swap_view(record)
+
+    def _check_swap_allowed(self, model_key: str):
+        """Одна загрузка версии на модель одновременно (под refs_lock)"""
+        if model_key not in self.models:
+            raise ValueError(f"Неизвестная модель: {model_key}")
+        active = self.active_swaps[model_key]
+        if active is not None and active['status'] == 'loading':
+            raise ValueError(f"Версия {active['version']} модели {model_key} еще загружается")
+
+    def _start_swap_record(self, model_key: str, version: str, weights: str, action: str) -> dict:
+        """Запись о замене в истории (под refs_lock)"""
+        record = {
+            'model_key': model_key,
+            'action': action,
+            'from_version': self.model_versions[model_key],
+            'version': version,
+            'weights': weights,
+            'status': 'loading',
+            'requested_at': time.time(),
+            'load_sec': None,
+            'warmup_sec': None,
+            'published_at': None,
+            'swap_sec': None,
+            'pending_cameras': [],
+            'error': None
+        }
+        self.active_swaps[model_key] = record
+        self.swap_history.append(record)
+        return record
 
-            # Выводим статистику производительности
-            self._log_performance_info()
-            return True
+    def _swap_worker(self, model_key: str, weights: str, record: dict):
+        """Фоновая загрузка и прогрев версии; камеры до замены работают со старой моделью"""
+        model_type = MODEL_TITLES.get(model_key, model_key)
+        try:
+            self._resolve_backend()
+            logger.info(f"🔄 Загрузка версии {record['version']} модели {model_type}: {weights}")
+            load_start = time.time()
+            model, info = self._load_model(weights, self.backend, model_type)
+            warmup_start = time.time()
+
+            # Модель другой задачи (например, без масок) камеры режима не обслужит
+            current_task = self.backend_info.get(model_key, {}).get('task')
+            if current_task and info['task'] != current_task:
+                raise ValueError(f"задача модели {info['task']}, ожидается {current_task}")
+
+            self._warmup_model(model, model_type)
+            pool = self._build_pool(model, info['backend'], weights, model_type)
+            info['startup_sec'] = round(time.time() - load_start, 2)
+            record['load_sec'] = round(warmup_start - load_start, 2)
+            record['warmup_sec'] = round(time.time() - warmup_start, 2)
 
         except Exception as e:
-            logger.error(f"❌ Ошибка загрузки YOLO моделей: {e}")
-            self.models_loaded = False
-            return False
+            logger.error(f"❌ Ошибка загрузки версии {record['version']} модели {model_type}: {e}")
+            with self.refs_lock:
+                record['status'] = 'failed'
+                record['error'] = str(e)
+            return
+
+        with self.model_locks[model_key]:
+            self._publish_model(model_key, model, info, record, pool)
+
+    def _publish_model(self, model_key: str, model: YOLO, info: dict, record: dict,
+                       pool: Optional[ReplicaPool] = None):
+        """Атомарная замена активной модели (под model_locks[model_key])"""
+        now = time.time()
+        keep_previous = MODEL_REGISTRY_CONFIG['keep_previous']
+        with self.refs_lock:
+            # Пулы версий, которые больше не нужны ни для inference, ни для отката
+            previous = self.previous_models[model_key]
+            stale_pools = [previous['pool']] if previous else []
+            if not keep_previous:
+                stale_pools.append(self.replica_pools[model_key])
+
+            self.previous_models[model_key] = {
+                'model': self.models[model_key] if keep_previous else None,
+                'pool': self.replica_pools[model_key] if keep_previous else None,
+                'version': self.model_versions[model_key],
+                'weights': self.model_weights[model_key],
+                'info': self.backend_info.get(model_key)
+            }
+            self.models[model_key] = model
+            self.replica_pools[model_key] = pool
+            self.model_versions[model_key] = record['version']
+            self.model_weights[model_key] = record['weights']
+            self.backend_info[model_key] = info
+            self.models_loaded = True
+            if self.model_refs[model_key] == 0:
+                self.model_idle_since[model_key] = now
+
+            consumers = list(self.model_consumers[model_key])
+            record['published_at'] = now
+            record['pending_cameras'] = [consumer.camera_id for consumer in consumers]
+            record['status'] = 'swapping'
+            self._confirm_swap(model_key, record['version'], None)
+
+        # Камеры применяют модель перед следующим кадром; текущий кадр досчитывается старой
+        for consumer in consumers:
+            consumer.swap_model(model, record['version'], model_key)
+        for stale_pool in stale_pools:
+            if stale_pool is not None and stale_pool is not pool:
+                stale_pool.stop()
+        logger.info(f"🔁 Модель {MODEL_TITLES.get(model_key, model_key)}: {record['from_version']} -> "
+                    f"{record['version']} ({record['weights']}), камер: {len(consumers)}")
+
+    def on_model_applied(self, model_key: str, version: str, camera_id: str):
+        """Камера перешла на новую версию модели"""
+        with self.refs_lock:
+            self._confirm_swap(model_key, version, camera_id)
+
+    def _confirm_swap(self, model_key: str, version: Optional[str], camera_id: Optional[str]):
+        """Снятие камеры из ожидающих; замена завершена, когда ожидающих нет (под refs_lock)"""
+        record = self.active_swaps[model_key]
+        if record is None or record['status'] != 'swapping':
+            return
+        if version is not None and record['version'] != version:
+            return
+        if camera_id in record['pending_cameras']:
+            record['pending_cameras'].remove(camera_id)
+        if not record['pending_cameras']:
+            record['status'] = 'active'
+            record['swap_sec'] = round(time.time() - record['published_at'], 3)
+
+    def get_model_version(self, model_key: str, model: YOLO) -> Optional[str]:
+        """Версия переданной модели (активная или предыдущая)"""
+        with self.refs_lock:
+            return self._find_version(model_key, model)
+
+    def _find_version(self, model_key: str, model: YOLO) -> Optional[str]:
+        if model is None:
+            return None
+        if model is self.models[model_key]:
+            return self.model_versions[model_key]
+        previous = self.previous_models[model_key]
+        if previous is not None and model is previous['model']:
+            return previous['version']
+        return None
+
+    def _find_pool(self, model: YOLO) -> Optional[ReplicaPool]:
+        """Пул копий активной или предыдущей версии модели"""
+        with self.refs_lock:
+            for model_key in self.models:
+                if model is self.models[model_key]:
+                    return self.replica_pools[model_key]
+                previous = self.previous_models[model_key]
+                if previous is not None and model is previous['model']:
+                    return previous['pool']
+        return None
+
+    def _record_version_frames(self, model: YOLO, frames: int) -> Optional[str]:
+        """Кадры, обработанные каждой версией модели; возвращает ключ модели"""
+        with self.refs_lock:
+            for model_key in self.models:
+                version = self._find_version(model_key, model)
+                if version is not None:
+                    counts = self.version_frames[model_key]
+                    counts[version] = counts.get(version, 0) + frames
+                    return model_key
+        return None
+
+    @staticmethod
+    def _swap_view(record: dict) -> dict:
+        view = dict(record)
+        view['pending_cameras'] = list(record['pending_cameras'])
+        return view
+
+    def get_registry_info(self) -> Dict[str, Any]:
+        """Версии моделей, кадры по версиям и история замен"""
+        with self.refs_lock:
+            models = {}
+            for model_key in self.models:
+                previous = self.previous_models[model_key]
+                active = self.active_swaps[model_key]
+                models[model_key] = {
+                    'version': self.model_versions[model_key],
+                    'weights': self.model_weights[model_key],
+                    'loaded': self.models[model_key] is not None,
+                    'cameras': self.model_refs[model_key],
+                    'previous_version': previous['version'] if previous else None,
+                    'previous_weights': previous['weights'] if previous else None,
+                    'previous_in_memory': bool(previous and previous['model'] is not None),
+                    'frames_by_version': dict(self.version_frames[model_key]),
+                    'swap': self._swap_view(active) if active else None
+                }
+            history = [self._swap_view(record) for record in self.swap_history]
+        return {'models': models, 'history': history}
+
+    def start(self):
+        """Запуск выгрузки простаивающих моделей"""
+        if (self.idle_thread and self.idle_thread.is_alive()) or not MODEL_LOADING_CONFIG['idle_unload_sec']:
+            return
+
+        self._stop_event.clear()
+        self.idle_thread = threading.Thread(target=self._idle_loop, daemon=True)
+        self.idle_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.idle_thread and self.idle_thread.is_alive():
+            self.idle_thread.join(timeout=3)
+
+    def _idle_loop(self):
+        while not self._stop_event.wait(MODEL_LOADING_CONFIG['check_interval']):
+            self.unload_idle_models()
+
+    def unload_idle_models(self, now: float = None):
+        """Выгрузка моделей без камер дольше idle_unload_sec"""
+        now = now or time.time()
+        for model_key in self.models:
+            with self.model_locks[model_key]:
+                with self.refs_lock:
+                    idle_since = self.model_idle_since[model_key]
+                    idle = (self.models[model_key] is not None and self.model_refs[model_key] == 0
+                            and idle_since is not None
+                            and now - idle_since >= MODEL_LOADING_CONFIG['idle_unload_sec'])
+                if idle:
+                    logger.info(f"💤 Модель {MODEL_TITLES.get(model_key, model_key)} не используется "
+                                f"{now - idle_since:.0f} с - выгружается")
+                    self._unload_model(model_key)
+
+    def _unload_model(self, model_key: str):
+        """Выгрузка одной модели (под model_locks[model_key])"""
+        with self.refs_lock:
+            self.models[model_key] = None
+            self.model_idle_since[model_key] = None
+            pools = [self.replica_pools[model_key]]
+            self.replica_pools[model_key] = None
+            # Откат после выгрузки - повторной загрузкой весов предыдущей версии
+            if self.previous_models[model_key] is not None:
+                pools.append(self.previous_models[model_key]['pool'])
+                self.previous_models[model_key]['model'] = None
+                self.previous_models[model_key]['pool'] = None
+        for pool in pools:
+            if pool is not None:
+                pool.stop()
+        self.models_loaded = any(model is not None for model in self.models.values())
+        gc.collect()
+        if self.device_info['available']:
+            import torch
+            torch.cuda.empty_cache()
 
     def _log_device_info(self):
         """Логирование информации об устройстве"""
@@ -65,6 +549,7 @@ class ModelManager:
             logger.info(f"   📊 Количество GPU: {self.device_info['gpu_count']}")
 
             # Дополнительная информация о CUDA
+            import torch
             if torch.cuda.is_available():
                 logger.info(f"   🔧 CUDA версия: {torch.version.cuda}")
                 logger.info(f"   ⚡ cuDNN версия: {torch.backends.cudnn.version()}")
@@ -95,41 +580,32 @@ class ModelManager:
             logger.error(f"❌ Ошибка конфигурации модели {model_type}: {e}")
             raise
 
-    def _warmup_models(self):
-        """Прогрев моделей для оптимизации производительности"""
+    def _warmup_model(self, model: YOLO, model_type: str):
+        """Прогрев модели для оптимизации производительности"""
 
         try:
-            logger.info("🔥 Прогрев моделей...")
-
             # Создаем тестовое изображение
             import numpy as np
+            import torch
             dummy_image = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
 
-            # Прогреваем модель сегментации
-            if self.yolo_seg_model:
-                with torch.no_grad():
-                    _ = self.yolo_seg_model(dummy_image, **YOLO_CONFIG)
-                logger.info("   ✅ Модель сегментации прогрета")
-
-            # Прогреваем модель детекции
-            if self.yolo_det_model:
-                with torch.no_grad():
-                    _ = self.yolo_det_model(dummy_image, **YOLO_CONFIG)
-                logger.info("   ✅ Модель детекции прогрета")
+            with torch.no_grad():
+                _ = model(dummy_image, **self._predict_options(model=model))
+            logger.info(f"   🔥 Модель {model_type} прогрета")
 
             # Очищаем кэш GPU
             if self.device_info['available']:
                 torch.cuda.empty_cache()
-                logger.info("   🧹 GPU кэш очищен") 
 
         except Exception as e:
-            logger.warning(f"⚠️ Ошибка прогрева моделей: {e}")
+            logger.warning(f"⚠️ Ошибка прогрева модели {model_type}: {e}")
 
     def _log_performance_info(self):
         """Логирование информации о производительности"""
 
         if self.device_info['available']:
             # Информация об использовании GPU памяти
+            import torch
             allocated = torch.cuda.memory_allocated(0) / 1024**2  # MB
             cached = torch.cuda.memory_reserved(0) / 1024**2  # MB
             logger.info("📊 Статистика GPU памяти:")
@@ -149,67 +625,144 @@ class ModelManager:
         """Проверка загружены ли модели"""
         return self.models_loaded
 
-    def predict_with_stats(self, model: YOLO, image, model_name: str = "unknown"):
-        """Inference с отслеживанием производительности"""
-        if not model or not self.models_loaded:
+    def predict_with_stats(self, model: YOLO, image, model_name: str = "unknown", imgsz: int = None,
+                           camera_id: str = None):
+        """Inference с отслеживанием производительности (imgsz - размер входа вместо YOLO_CONFIG)"""
+        if not model:
             return None
 
-        import time
-
         start_time = time.time()
 
         try:
             # Выполняем inference
-            with torch.no_grad():
-                results = model(image, **YOLO_CONFIG)
+            results = self._infer(model, image, imgsz)
             
             # Записываем статистику
-            inference_time = time.time() - start_time
-            self.performance_stats['inference_times'].append(inference_time)
-            self.performance_stats['total_inferences'] += 1
+            self._record_inference(time.time() - start_time, model, model_name, [camera_id])
+            return results
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка inference {model_name}: {e}")
+            return None
 
-            # Ограничиваем историю
-            if len(self.performance_stats['inference_times']) > 100:
-                self.performance_stats['inference_times'].pop(0)
+    def predict_batch_with_stats(self, model: YOLO, images: list, model_name: str = "unknown", imgsz: int = None,
+                                 camera_ids: list = None):
+        """Пакетный inference нескольких кадров за один проход модели (camera_ids - камера каждого кадра)"""
+        if not model or not images:
+            return None
 
-            # Логируем каждые 100 inference
-            if self.performance_stats['total_inferences'] % 100 == 0:
-                avg_time = sum(self.performance_stats['inference_times'][-50:]) / min(50, len(self.performance_stats['inference_times']))
-                fps = 1.0 / avg_time if avg_time > 0 else 0
-                logger.info(f"📊 {model_name}: {self.performance_stats['total_inferences']} inference, "
-                           f"avg time: {avg_time*1000:.1f}ms, FPS: {fps:.1f}")
+        start_time = time.time()
 
+        try:
+            # Список изображений обрабатывается ultralytics одним batch
+            results = self._infer(model, list(images), imgsz)
+
+            # Время пакета распределяется поровну между кадрами
+            self._record_inference(time.time() - start_time, model, model_name,
+                                   camera_ids or [None] * len(images))
             return results
 
         except Exception as e:
-            logger.error(f"❌ Ошибка inference {model_name}: {e}")
+            logger.error(f"❌ Ошибка пакетного inference {model_name}: {e}")
             return None
 
+    def _infer(self, model: YOLO, images, imgsz: int = None):
+        """Вызов модели; при пуле - на наименее загруженной копии"""
+        options = self._predict_options(imgsz, model)
+        pool = self._find_pool(model)
+        if pool is not None:
+            try:
+                future = pool.submit(lambda replica: self._call_model(replica, images, options))
+            except RuntimeError:
+                # Пул остановлен заменой или выгрузкой модели - кадр досчитывается самой моделью
+                future = None
+            if future is not None:
+                return future.result()
+        return self._call_model(model, images, options)
+
+    @staticmethod
+    def _call_model(model: YOLO, images, options: dict):
+        import torch
+        with torch.no_grad():
+            return model(images, **options)
+
+    def _predict_options(self, imgsz: int = None, model: YOLO = None) -> dict:
+        """Параметры inference; фрагменты кадра обрабатываются с меньшим imgsz"""
+        options = YOLO_CONFIG
+        if imgsz is not None and imgsz != YOLO_CONFIG['imgsz']:
+            options = {**options, 'imgsz': imgsz}
+
+        info = self._model_info(model)
+        # Экспортированные модели хранятся в точности артефакта (FP32, кроме TorchScript на GPU)
+        if info.get('backend', 'torch') != 'torch' and options['half'] != info.get('half', False):
+            options = {**options, 'half': info.get('half', False)}
+        # Артефакт с фиксированным входом: фрагменты кадра масштабируются до его imgsz
+        if info.get('dynamic') is False and options['imgsz'] != info['imgsz']:
+            options = {**options, 'imgsz': info['imgsz']}
+        return options
+
+    def _model_info(self, model: YOLO) -> dict:
+        """Описание backend, которым загружена модель"""
+        for model_key, loaded_model in self.models.items():
+            if model is loaded_model:
+                return self.backend_info.get(model_key, {})
+            # Кадры, начатые до замены модели, досчитываются предыдущей версией
+            previous = self.previous_models[model_key]
+            if previous is not None and model is previous['model']:
+                return previous['info'] or {}
+        return {}
+
+    def _record_inference(self, elapsed: float, model: YOLO, model_name: str, camera_ids: list):
+        """Запись времени inference в гистограммы модели и камер"""
+        frames = len(camera_ids)
+        model_key = self._record_version_frames(model, frames)
+        self.inference_latency.record(elapsed, frames, model_key, camera_ids)
+
+        previous_total = self.performance_stats['total_inferences']
+        self.performance_stats['total_inferences'] += frames
+
+        # Логируем каждые 100 inference
+        if self.performance_stats['total_inferences'] // 100 > previous_total // 100:
+            recent = self._recent_latency()
+            logger.info(f"📊 {model_name}: {self.performance_stats['total_inferences']} inference, "
+                        f"avg time: {recent['avg_ms']:.1f}ms, p99: {recent['p99_ms']:.1f}ms, "
+                        f"FPS: {recent['throughput_fps']:.1f}")
+
+    def _recent_latency(self) -> dict:
+        """Задержка inference за самое короткое окно"""
+        stats = self.inference_latency.overall.get_stats()
+        windows = stats.get('windows', {})
+        return next(iter(windows.values())) if windows else {}
+
     def get_performance_stats(self) -> Dict[str, Any]:
         """Получение статистики производительности"""
 
-        if not self.performance_stats['inference_times']:
+        recent = self._recent_latency()
+        if not recent.get('count'):
             return {
-                'total_inferences': 0,
+                'total_inferences': self.performance_stats['total_inferences'],
                 'average_time_ms': 0,
                 'fps': 0,
                 'device': self.device_info['device']
             }
-    
-        recent_times = self.performance_stats['inference_times'][-50:]  # Последние 50
-        avg_time = sum(recent_times) / len(recent_times)
-        fps = 1.0 / avg_time if avg_time > 0 else 0
 
         stats = {
             'total_inferences': self.performance_stats['total_inferences'],
-            'average_time_ms': round(avg_time * 1000, 1),
-            'fps': round(fps, 1),
+            'average_time_ms': round(recent['avg_ms'], 1),
+            'fps': round(1000 / recent['avg_ms'], 1) if recent['avg_ms'] > 0 else 0,
+            'p50_ms': recent['p50_ms'],
+            'p90_ms': recent['p90_ms'],
+            'p99_ms': recent['p99_ms'],
+            'max_ms': recent['max_ms'],
+            'throughput_fps': recent['throughput_fps'],
+            'latency': self.inference_latency.get_stats(),
             'device': self.device_info['device'],
             'device_info': self.device_info
         }
 
         # Добавляем GPU статистику если доступна
         if self.device_info['available']:
+            import torch
             stats.update({
                 'gpu_memory_allocated_mb': round(torch.cuda.memory_allocated(0) / 1024**2, 1),
                 'gpu_memory_cached_mb': round(torch.cuda.memory_reserved(0) / 1024**2, 1),
@@ -223,6 +776,7 @@ class ModelManager:
 
         try:
             # Простая оценка на основе памяти
+            import torch
             allocated = torch.cuda.memory_allocated(0)
             total = torch.cuda.get_device_properties(0).total_memory
             return round((allocated / total) * 100, 1)
@@ -233,18 +787,16 @@ class ModelManager:
         """Выгрузка моделей из памяти"""
 
         try:
-            if self.yolo_seg_model:
-                del self.yolo_seg_model
-                self.yolo_seg_model = None
-                logger.info("🗑️ Модель сегментации выгружена")
-
-            if self.yolo_det_model:
-                del self.yolo_det_model
-                self.yolo_det_model = None
-                logger.info("🗑️ Модель детекции выгружена")
+            self.stop()
+            for model_key in self.models:
+                with self.model_locks[model_key]:
+                    if self.models[model_key] is not None:
+                        self._unload_model(model_key)
+                        logger.info(f"🗑️ Модель {MODEL_TITLES.get(model_key, model_key)} выгружена")
 
             # Очищаем GPU память
             if self.device_info['available']:
+                import torch
                 torch.cuda.empty_cache()
                 torch.cuda.synchronize()
                 logger.info("🧹 GPU память очищена")
@@ -259,24 +811,50 @@ class ModelManager:
         """Получение подробной информации о моделях"""
 
         info = {
-            'segmentation_model': YOLO_MODELS['segmentation'],
-            'detection_model': YOLO_MODELS['detection'],
+            'segmentation_model': self.model_weights['segmentation'],
+            'detection_model': self.model_weights['detection'],
             'models_loaded': self.models_loaded,
             'segmentation_loaded': self.yolo_seg_model is not None,
             'detection_loaded': self.yolo_det_model is not None,
             'device_info': self.device_info,
+            'backend': self.backend,
+            'backend_info': self.backend_info,
+            'lazy_loading': MODEL_LOADING_CONFIG['lazy'],
+            'models': self._get_models_status(),
             'yolo_config': YOLO_CONFIG,
             'performance_stats': self.get_performance_stats()
         }
 
         return info
 
+    def _get_models_status(self) -> Dict[str, Any]:
+        """Состояние каждой модели: загружена ли, сколько камер использует, время простоя"""
+        now = time.time()
+        required = self.required_models()
+        with self.refs_lock:
+            return {
+                model_key: {
+                    'weights': self.model_weights[model_key],
+                    'version': self.model_versions[model_key],
+                    'used_by_modes': model_key in required,
+                    'loaded': self.models[model_key] is not None,
+                    'cameras': self.model_refs[model_key],
+                    'idle_sec': (round(now - self.model_idle_since[model_key], 1)
+                                 if self.model_idle_since[model_key] is not None else None),
+                    'startup_sec': self.backend_info.get(model_key, {}).get('startup_sec'),
+                    'replica_pool': (self.replica_pools[model_key].get_stats()
+                                     if self.replica_pools[model_key] else None)
+                }
+                for model_key in self.models
+            }
+
     def optimize_memory(self):
         """Оптимизация использования памяти"""
 
         try:
             if self.device_info['available']:
                 # Очищаем неиспользуемую память
+                import torch
                 torch.cuda.empty_cache()
 
                 # Принудительная сборка мусора
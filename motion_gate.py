@@ -0,0 +1,98 @@
+"""
+motion_gate.py - Дешевый предфильтр движения для пропуска inference на статичных сценах
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from config import MOTION_GATE_CONFIG
+
+
+class MotionGate:
+    """Вычитание фона на уменьшенном кадре; решает, нужен ли inference для кадра"""
+
+    def __init__(self):
+        self.size = (MOTION_GATE_CONFIG['width'], MOTION_GATE_CONFIG['height'])
+        self.blur_kernel = MOTION_GATE_CONFIG['blur_kernel']
+        self.pixel_threshold = MOTION_GATE_CONFIG['pixel_threshold']
+        self.area_threshold = MOTION_GATE_CONFIG['area_threshold']
+        self.background_alpha = MOTION_GATE_CONFIG['background_alpha']
+        self.refresh_interval = MOTION_GATE_CONFIG['refresh_interval']
+
+        self.background: np.ndarray = None  # Фон (float32) в уменьшенном разрешении
+        self.last_inference_time = 0.0
+        self.last_changed_fraction = 0.0
+
+        self.stats = {
+            'checks': 0,
+            'skips': 0,
+            'forced_refreshes': 0,
+            'frames_compared': 0,
+            'check_time': 0.0
+        }
+
+    def should_infer(self, frame, now: float = None) -> bool:
+        """True, если в кадре есть заметные изменения или истек интервал принудительного обновления"""
+        now = now if now is not None else time.time()
+        self.last_changed_fraction = self._update_background(frame)
+        self.stats['checks'] += 1
+
+        if self.last_changed_fraction >= self.area_threshold:
+            return True
+
+        # Старые детекции не должны жить дольше интервала обновления
+        if now - self.last_inference_time >= self.refresh_interval:
+            self.stats['forced_refreshes'] += 1
+            return True
+
+        self.stats['skips'] += 1
+        return False
+
+    def observe(self, frame):
+        """Обновление фона без принятия решения (когда inference обязателен)"""
+        self.last_changed_fraction = self._update_background(frame)
+
+    def _update_background(self, frame) -> float:
+        """Доля пикселей, заметно отличающихся от фона, с обновлением фона"""
+        check_start = time.perf_counter()
+
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (self.blur_kernel, self.blur_kernel), 0)
+
+        if self.background is None:
+            self.background = gray.astype(np.float32)
+            changed_fraction = 1.0
+        else:
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+            changed_fraction = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+            cv2.accumulateWeighted(gray, self.background, self.background_alpha)
+
+        self.stats['frames_compared'] += 1
+        self.stats['check_time'] += time.perf_counter() - check_start
+        return changed_fraction
+
+    def mark_inference(self, now: float = None):
+        """Отметка о выполненном inference"""
+        self.last_inference_time = now if now is not None else time.time()
+
+    def reset(self):
+        """Сброс фона (например, при переподключении камеры)"""
+        self.background = None
+        self.last_inference_time = 0.0
+        self.last_changed_fraction = 0.0
+
+    def get_stats(self) -> dict:
+        """Статистика предфильтра"""
+        checks = self.stats['checks']
+        compared = self.stats['frames_compared']
+        return {
+            'checks': checks,
+            'skips': self.stats['skips'],
+            'forced_refreshes': self.stats['forced_refreshes'],
+            'hit_rate': round(self.stats['skips'] / checks, 3) if checks else 0,
+            'avg_check_ms': round(self.stats['check_time'] / compared * 1000, 3) if compared else 0,
+            'last_changed_fraction': round(self.last_changed_fraction, 4)
+        }
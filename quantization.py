@@ -0,0 +1,263 @@
+"""
+quantization.py - Построение INT8-модели ONNX по изображениям алармов и сравнение с FP32
+
+Запуск: python quantization.py [--models segmentation detection]
+Калибровка - статическое квантование ONNX Runtime (QDQ) на изображениях из
+CORRECT_DIR/INCORRECT_DIR; оценка - согласованность детекций людей с FP32,
+разница площади масок, доля алармов с людьми и ускорение inference
+"""
+
+import argparse
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from config import (
+    CORRECT_DIR, INCORRECT_DIR, YOLO_MODELS, YOLO_CONFIG, MODEL_BACKEND_CONFIG,
+    QUANTIZATION_CONFIG, LOGGING_CONFIG
+)
+from detections import PersonDetections
+from model_backends import ExportCache, get_export_entry, is_backend_available
+from tracker import box_iou
+
+logger = logging.getLogger(__name__)
+
+
+def collect_alarm_images() -> List[Tuple[Path, str]]:
+    """Изображения оцененных алармов с меткой 'correct' (человек есть) или 'incorrect'"""
+    images = []
+    for directory, label in ((CORRECT_DIR, 'correct'), (INCORRECT_DIR, 'incorrect')):
+        if directory.exists():
+            images.extend((path, label) for path in sorted(directory.glob('*.jpg')))
+    return images
+
+
+def split_images(images: list) -> Tuple[list, list, bool]:
+    """Калибровочная и оценочная выборки; при нехватке изображений оценка идет по калибровочным"""
+    shuffled = list(images)
+    random.Random(QUANTIZATION_CONFIG['seed']).shuffle(shuffled)
+
+    calibration = shuffled[:QUANTIZATION_CONFIG['calibration_images']]
+    evaluation = shuffled[len(calibration):len(calibration) + QUANTIZATION_CONFIG['eval_images']]
+    if evaluation:
+        return calibration, evaluation, False
+    return calibration, calibration[:QUANTIZATION_CONFIG['eval_images']], True
+
+
+def letterbox_tensor(image: np.ndarray, imgsz: int) -> np.ndarray:
+    """Вход модели как в ultralytics: letterbox до imgsz, RGB, 0..1, NCHW float32"""
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def build_int8_model(fp32_path: str, int8_path: Path, calibration: list, imgsz: int) -> float:
+    """Статическое INT8-квантование ONNX-модели; возвращает время построения"""
+    import onnx
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class AlarmImagesReader(CalibrationDataReader):
+        """Калибровочные изображения по одному на шаг"""
+
+        def __init__(self):
+            self.paths = iter(path for path, _ in calibration)
+
+        def get_next(self):
+            for path in self.paths:
+                image = cv2.imread(str(path))
+                if image is not None:
+                    return {input_name: letterbox_tensor(image, imgsz)}
+            return None
+
+    start = time.time()
+    quantize_static(
+        fp32_path, str(int8_path), AlarmImagesReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=QUANTIZATION_CONFIG['per_channel']
+    )
+
+    # Метаданные ultralytics (классы, stride, imgsz) переносятся из FP32-модели
+    fp32_model = onnx.load(fp32_path, load_external_data=False)
+    int8_model = onnx.load(str(int8_path))
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, str(int8_path))
+    return time.time() - start
+
+
+def run_model(model: YOLO, samples: list) -> Tuple[List[Tuple[PersonDetections, str]], float]:
+    """Люди на каждом изображении и среднее время inference (мс)"""
+    options = {**YOLO_CONFIG, 'device': 'cpu', 'half': False}
+    outputs = []
+    elapsed = 0.0
+
+    for path, label in samples:
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        start = time.time()
+        results = model(image, **options)
+        # Первый вызов (инициализация сессии) в замер не входит
+        if outputs:
+            elapsed += time.time() - start
+        outputs.append((PersonDetections.from_result(results[0] if results else None, image.shape[:2]), label))
+
+    timed = max(len(outputs) - 1, 1)
+    return outputs, elapsed / timed * 1000
+
+
+def _count_matches(iou: np.ndarray) -> int:
+    """Число пар боксов, сопоставленных жадно по убыванию IoU"""
+    matched = 0
+    used_rows, used_columns = set(), set()
+    for flat_index in np.argsort(-iou, axis=None):
+        row, column = np.unravel_index(flat_index, iou.shape)
+        if iou[row, column] < QUANTIZATION_CONFIG['match_iou']:
+            break
+        if row in used_rows or column in used_columns:
+            continue
+        used_rows.add(row)
+        used_columns.add(column)
+        matched += 1
+    return matched
+
+
+def compare_outputs(fp32_outputs: list, int8_outputs: list) -> Dict[str, float]:
+    """Согласованность INT8 с FP32: совпадение боксов людей, площадь масок, решения об аларме"""
+    matched = fp32_total = int8_total = 0
+    area_deltas = []
+    decision_agreement = 0
+    persons = {'fp32': {'correct': [], 'incorrect': []}, 'int8': {'correct': [], 'incorrect': []}}
+
+    for (fp32, label), (int8, _) in zip(fp32_outputs, int8_outputs):
+        fp32_total += len(fp32)
+        int8_total += len(int8)
+        if len(fp32) and len(int8):
+            matched += _count_matches(box_iou(fp32.boxes, int8.boxes))
+
+        fp32_area = fp32.total_area()
+        if fp32_area:
+            area_deltas.append(abs(int8.total_area() - fp32_area) / fp32_area)
+
+        decision_agreement += (len(fp32) > 0) == (len(int8) > 0)
+        persons['fp32'][label].append(len(fp32) > 0)
+        persons['int8'][label].append(len(int8) > 0)
+
+    images = len(fp32_outputs)
+    report = {
+        'images': images,
+        'box_recall_vs_fp32': round(matched / fp32_total, 3) if fp32_total else 1.0,
+        'box_precision_vs_fp32': round(matched / int8_total, 3) if int8_total else 1.0,
+        'alarm_decision_agreement': round(decision_agreement / images, 3) if images else 0,
+        'mask_area_rel_delta': round(float(np.mean(area_deltas)), 3) if area_deltas else 0
+    }
+    # Доля верных алармов, где модель видит человека, и ложных, где видит его по ошибке
+    for precision, by_label in persons.items():
+        for label, found in by_label.items():
+            report[f'{precision}_person_rate_{label}'] = round(float(np.mean(found)), 3) if found else None
+    return report
+
+
+def quantize_model(model_key: str, cache: ExportCache, samples: Optional[list] = None) -> Optional[dict]:
+    """Экспорт FP32 ONNX, построение INT8, сравнение и запись отчета в manifest"""
+    samples = samples if samples is not None else collect_alarm_images()
+    if not samples:
+        logger.error(f"❌ Нет изображений алармов для калибровки в {CORRECT_DIR} и {INCORRECT_DIR}")
+        return None
+
+    weights = YOLO_MODELS[model_key]
+    torch_model = YOLO(weights)
+    fp32_entry, _ = get_export_entry(torch_model, weights, 'onnx', cache)
+    imgsz = fp32_entry['imgsz']
+
+    calibration, evaluation, overlaps = split_images(samples)
+    logger.info(f"🔢 {model_key}: калибровка на {len(calibration)} изображениях, оценка на {len(evaluation)}")
+
+    int8_key = cache.int8_key(fp32_entry)
+    int8_path = Path(fp32_entry['path']).with_name(Path(fp32_entry['path']).stem + '-int8.onnx')
+    build_time = build_int8_model(fp32_entry['path'], int8_path, calibration, imgsz)
+
+    fp32_outputs, fp32_ms = run_model(YOLO(fp32_entry['path'], task=torch_model.task), evaluation)
+    int8_outputs, int8_ms = run_model(YOLO(str(int8_path), task=torch_model.task), evaluation)
+
+    report = compare_outputs(fp32_outputs, int8_outputs)
+    report.update({
+        'model': model_key,
+        'imgsz': imgsz,
+        'calibration_images': len(calibration),
+        'eval_overlaps_calibration': overlaps,
+        'fp32_ms': round(fp32_ms, 2),
+        'int8_ms': round(int8_ms, 2),
+        'speedup': round(fp32_ms / int8_ms, 2) if int8_ms else 0,
+        'build_time_sec': round(build_time, 1)
+    })
+
+    cache.put(int8_key, {
+        **fp32_entry,
+        'key': int8_key,
+        'path': str(int8_path),
+        'backend': 'onnx-int8',
+        'source': fp32_entry['path'],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'report': report
+    })
+    return report
+
+
+def _log_report(report: dict):
+    logger.info(f"📊 {report['model']}: FP32 {report['fp32_ms']} мс, INT8 {report['int8_ms']} мс, ускорение x{report['speedup']}")
+    logger.info(f"   🎯 Боксы людей относительно FP32: recall {report['box_recall_vs_fp32']}, precision {report['box_precision_vs_fp32']}")
+    logger.info(f"   🚨 Совпадение решений об аларме: {report['alarm_decision_agreement']}, "
+                f"разница площади масок: {report['mask_area_rel_delta']:.1%}")
+    logger.info(f"   ✅ Человек на верных алармах: FP32 {report['fp32_person_rate_correct']}, INT8 {report['int8_person_rate_correct']}")
+    logger.info(f"   ❌ Человек на ложных алармах: FP32 {report['fp32_person_rate_incorrect']}, INT8 {report['int8_person_rate_incorrect']}")
+    if report['eval_overlaps_calibration']:
+        logger.warning("   ⚠️ Изображений мало - оценка выполнена на калибровочной выборке")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8-квантование моделей YOLO по изображениям алармов")
+    parser.add_argument('--models', nargs='+', choices=sorted(YOLO_MODELS), default=sorted(YOLO_MODELS))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, LOGGING_CONFIG['level']), format=LOGGING_CONFIG['format'])
+
+    if not is_backend_available('onnx'):
+        logger.error("❌ Для квантования нужен onnxruntime (pip install onnxruntime onnx)")
+        return 1
+
+    cache = ExportCache(MODEL_BACKEND_CONFIG['export_dir'])
+    samples = collect_alarm_images()
+    for model_key in args.models:
+        try:
+            report = quantize_model(model_key, cache, samples)
+            if report is None:
+                return 1
+            _log_report(report)
+        except Exception as e:
+            logger.error(f"❌ Ошибка квантования модели {model_key}: {e}")
+            return 1
+
+    logger.info("💡 Для использования INT8: MODEL_BACKEND_CONFIG['backend'] = 'onnx', QUANTIZATION_CONFIG['enabled'] = True")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
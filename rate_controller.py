@@ -0,0 +1,118 @@
+"""
+rate_controller.py - Адаптивный регулятор частоты inference камеры
+"""
+
+import math
+import time
+from collections import deque
+
+from config import ADAPTIVE_RATE_CONFIG
+
+
+class AdaptiveRateController:
+    """Регулятор шага пропуска кадров по задержке inference и заполнению очереди"""
+
+    def __init__(self, initial_skip: int):
+        self.min_skip = ADAPTIVE_RATE_CONFIG['min_skip']
+        self.max_skip = ADAPTIVE_RATE_CONFIG['max_skip']
+        self.target_fps = ADAPTIVE_RATE_CONFIG['target_fps']
+        self.latency_budget = ADAPTIVE_RATE_CONFIG['latency_budget_ms'] / 1000.0
+        self.update_interval = ADAPTIVE_RATE_CONFIG['update_interval']
+        self.high_watermark = ADAPTIVE_RATE_CONFIG['high_watermark']
+        self.low_watermark = ADAPTIVE_RATE_CONFIG['low_watermark']
+        self.utilization = ADAPTIVE_RATE_CONFIG['utilization']
+
+        self.frame_skip = self._clamp(initial_skip)
+        self.latency_avg = 0.0  # Задержка от захвата до результата (скользящее среднее)
+        self.source_fps = 0.0
+        self.last_update = time.time()
+        self.last_grabbed = None  # Счетчик кадров источника на момент последнего пересчета
+        self.latency_samples = 0  # Кадров с задержкой с момента последнего пересчета
+        self.decisions = deque(maxlen=20)
+        self.total_adjustments = 0
+
+    def _clamp(self, frame_skip: int) -> int:
+        return max(self.min_skip, min(self.max_skip, int(frame_skip)))
+
+    def record_latency(self, latency: float):
+        """Учет задержки обработанного кадра"""
+        if self.latency_avg == 0:
+            self.latency_avg = latency
+        else:
+            self.latency_avg = 0.8 * self.latency_avg + 0.2 * latency
+        self.latency_samples += 1
+
+    def maybe_update(self, grabbed_frames: int, queue_size: int, queue_capacity: int,
+                     service_time: float) -> int:
+        """Пересчет шага пропуска раз в update_interval; возвращает текущий шаг"""
+        now = time.time()
+        if self.last_grabbed is None:
+            # Первый вызов задает точку отсчета
+            self.last_grabbed = grabbed_frames
+            self.last_update = now
+            return self.frame_skip
+
+        elapsed = now - self.last_update
+        if elapsed < self.update_interval:
+            return self.frame_skip
+
+        self.source_fps = (grabbed_frames - self.last_grabbed) / elapsed
+        self.last_update = now
+        self.last_grabbed = grabbed_frames
+
+        if self.source_fps <= 0:
+            return self.frame_skip
+
+        # Желаемая частота inference ограничена целью и пропускной способностью модели
+        desired_fps = self.target_fps
+        if service_time > 0:
+            desired_fps = min(desired_fps, self.utilization / service_time)
+        ideal_skip = self._clamp(math.ceil(self.source_fps / desired_fps))
+
+        occupancy = queue_size / queue_capacity if queue_capacity else 0.0
+        # Без новых кадров задержка устарела и не должна повторно снижать частоту
+        over_budget = self.latency_samples > 0 and self.latency_avg > self.latency_budget
+        self.latency_samples = 0
+
+        new_skip = self.frame_skip
+        reason = None
+        if occupancy >= self.high_watermark or over_budget:
+            # Перегрузка: быстро уменьшаем частоту
+            new_skip = self._clamp(max(ideal_skip, math.ceil(self.frame_skip * 1.5)))
+            reason = 'queue' if occupancy >= self.high_watermark else 'latency'
+        elif ideal_skip > self.frame_skip:
+            new_skip = ideal_skip
+            reason = 'capacity'
+        elif ideal_skip < self.frame_skip and occupancy <= self.low_watermark:
+            # Есть запас: сокращаем разрыв до расчетного шага вдвое
+            new_skip = self.frame_skip - max(1, (self.frame_skip - ideal_skip) // 2)
+            reason = 'headroom'
+
+        if new_skip != self.frame_skip:
+            self.decisions.append({
+                'time': round(now, 3),
+                'from': self.frame_skip,
+                'to': new_skip,
+                'reason': reason,
+                'source_fps': round(self.source_fps, 1),
+                'latency_ms': round(self.latency_avg * 1000, 1),
+                'queue_occupancy': round(occupancy, 2)
+            })
+            self.frame_skip = new_skip
+            self.total_adjustments += 1
+
+        return self.frame_skip
+
+    def get_stats(self) -> dict:
+        """Текущее состояние регулятора и последние решения"""
+        return {
+            'enabled': True,
+            'frame_skip': self.frame_skip,
+            'source_fps': round(self.source_fps, 1),
+            'effective_inference_fps': round(self.source_fps / self.frame_skip, 2) if self.frame_skip else 0,
+            'target_fps': self.target_fps,
+            'latency_ms': round(self.latency_avg * 1000, 1),
+            'latency_budget_ms': round(self.latency_budget * 1000, 1),
+            'total_adjustments': self.total_adjustments,
+            'recent_decisions': list(self.decisions)
+        }
@@ -0,0 +1,145 @@
+"""
+replica_pool.py - Пул копий модели: каждая копия в своем потоке с ограниченным числом потоков torch
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelReplica:
+    """Копия модели и ее рабочий поток"""
+
+    def __init__(self, index: int, model):
+        self.index = index
+        self.model = model
+        self.tasks = queue.Queue()
+        self.thread = None
+        self.in_flight = 0  # Поставлено и еще не выполнено
+        self.requests = 0
+        self.busy_time = 0.0
+        # Загрузка за последнее полное окно и накопление текущего окна
+        self.window_start = time.time()
+        self.window_busy = 0.0
+        self.utilization: Optional[float] = None
+
+
+class ReplicaPool:
+    """K копий одной модели для параллельного inference нескольких камер
+
+    Вызов направляется копии с наименьшим числом ожидающих запросов;
+    при равенстве - менее загруженной. Каждый рабочий поток ограничивает
+    число потоков torch, чтобы K x threads соответствовало числу ядер;
+    сессии ONNX Runtime / OpenVINO создаются с тем же числом потоков
+    до построения пула (thread_limit - чем ограничены потоки inference)
+    """
+
+    def __init__(self, name: str, models: list, threads_per_replica: int, window_sec: float,
+                 thread_limit: str = 'torch'):
+        self.name = name
+        self.threads_per_replica = threads_per_replica
+        self.window_sec = window_sec
+        self.thread_limit = thread_limit
+        self.replicas: List[ModelReplica] = [ModelReplica(index, model) for index, model in enumerate(models)]
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        for replica in self.replicas:
+            replica.thread = threading.Thread(target=self._worker_loop, args=(replica,), daemon=True)
+            replica.thread.start()
+        logger.info(f"🧩 Пул {self.name}: {len(self.replicas)} копий по {self.threads_per_replica} потоков "
+                    f"{self.thread_limit}")
+
+    def stop(self):
+        """Остановка после выполнения уже поставленных запросов"""
+        with self.lock:
+            self.running = False
+        for replica in self.replicas:
+            replica.tasks.put(None)
+        for replica in self.replicas:
+            if replica.thread and replica.thread.is_alive() and replica.thread is not threading.current_thread():
+                replica.thread.join(timeout=3)
+
+    def submit(self, fn: Callable) -> Future:
+        """Постановка вызова fn(model) наименее загруженной копии; RuntimeError - пул остановлен"""
+        future = Future()
+        with self.lock:
+            if not self.running:
+                raise RuntimeError(f"пул {self.name} остановлен")
+            replica = min(self.replicas, key=lambda r: (r.in_flight, r.utilization or 0.0))
+            replica.in_flight += 1
+        replica.tasks.put((fn, future))
+        return future
+
+    def run(self, fn: Callable):
+        """Синхронный вызов fn(model) на копии из пула"""
+        return self.submit(fn).result()
+
+    def _worker_loop(self, replica: ModelReplica):
+        import torch
+        torch.set_num_threads(self.threads_per_replica)
+
+        while True:
+            task = replica.tasks.get()
+            if task is None:
+                break
+            fn, future = task
+
+            start = time.time()
+            try:
+                future.set_result(fn(replica.model))
+            except Exception as e:
+                future.set_exception(e)
+            finished = time.time()
+
+            with self.lock:
+                replica.in_flight -= 1
+                replica.requests += 1
+                replica.busy_time += finished - start
+                replica.window_busy += finished - start
+                if finished - replica.window_start >= self.window_sec:
+                    replica.utilization = replica.window_busy / (finished - replica.window_start)
+                    replica.window_start = finished
+                    replica.window_busy = 0.0
+
+    def get_stats(self) -> dict:
+        """Загрузка копий: доля занятого времени за окно, запросы, очередь"""
+        now = time.time()
+        with self.lock:
+            replicas = []
+            for replica in self.replicas:
+                # До конца первого окна и при простое дольше окна загрузка считается по текущему
+                elapsed = now - replica.window_start
+                if replica.utilization is None or elapsed >= self.window_sec:
+                    utilization = replica.window_busy / elapsed if elapsed > 0 else 0.0
+                else:
+                    utilization = replica.utilization
+                replicas.append({
+                    'index': replica.index,
+                    'requests': replica.requests,
+                    'in_flight': replica.in_flight,
+                    'avg_ms': round(replica.busy_time / replica.requests * 1000, 1) if replica.requests else 0,
+                    'utilization': round(min(utilization, 1.0), 3)
+                })
+
+        # Потоков inference на ядро CPU: больше 1 - копии конкурируют за ядра
+        threads_total = len(self.replicas) * self.threads_per_replica
+        cpu_count = os.cpu_count() or 1
+        return {
+            'replicas': len(self.replicas),
+            'threads_per_replica': self.threads_per_replica,
+            'thread_limit': self.thread_limit,
+            'threads_total': threads_total,
+            'cpu_count': cpu_count,
+            'oversubscription': round(threads_total / cpu_count, 2),
+            'window_sec': self.window_sec,
+            'per_replica': replicas
+        }
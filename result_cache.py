@@ -0,0 +1,147 @@
+"""
+result_cache.py - Кэш результатов обработки по отпечатку кадра для зависших и повторяющихся потоков
+"""
+
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import RESULT_CACHE_CONFIG
+from detections import PersonDetections
+
+
+class CachedResult:
+    """Люди, площадь сегментации и отрисованный кадр для одного отпечатка"""
+
+    __slots__ = ('detections', 'area', 'overlay', 'created_at')
+
+    def __init__(self, detections: PersonDetections, area: int, overlay: np.ndarray, created_at: float):
+        self.detections = detections
+        self.area = area
+        self.overlay = overlay
+        self.created_at = created_at
+
+
+class FrameResultCache:
+    """Результаты камеры по отпечатку кадра: LRU с ограничением времени жизни
+
+    Отпечаток - уменьшенный серый кадр; кадры совпадают, если яркость ни одной
+    ячейки отпечатков не отличается больше чем на tolerance: шум кодека
+    усредняется, а человек даже на малой части кадра меняет свои ячейки. Поток, кадры которого frozen_after_sec
+    подряд совпадают с предыдущим, считается зависшим
+    """
+
+    def __init__(self):
+        self.size = (RESULT_CACHE_CONFIG['width'], RESULT_CACHE_CONFIG['height'])
+        self.tolerance = RESULT_CACHE_CONFIG['tolerance']
+        self.max_entries = RESULT_CACHE_CONFIG['max_entries']
+        self.ttl = RESULT_CACHE_CONFIG['ttl_sec']
+        self.frozen_after = RESULT_CACHE_CONFIG['frozen_after_sec']
+
+        self.entries: OrderedDict = OrderedDict()  # Номер записи -> (отпечаток, CachedResult)
+        self.next_entry_id = 0
+        # Отпечаток последнего кадра и время, с которого он не меняется
+        self.last_fingerprint: Optional[np.ndarray] = None
+        self.repeat_since: Optional[float] = None
+        self.frozen = False
+
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'frozen_events': 0,
+            'fingerprint_time': 0.0
+        }
+
+    def fingerprint(self, frame) -> np.ndarray:
+        """Отпечаток кадра: усреднение по областям сглаживает шум кодека"""
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _matches(self, fingerprint_a: np.ndarray, fingerprint_b: np.ndarray) -> bool:
+        return cv2.norm(fingerprint_a, fingerprint_b, cv2.NORM_INF) <= self.tolerance
+
+    def lookup(self, frame, now: float = None) -> Tuple[np.ndarray, Optional[CachedResult]]:
+        """Отпечаток кадра и сохраненный результат (None - нет или устарел)"""
+        now = now if now is not None else time.time()
+        start = time.perf_counter()
+        fingerprint = self.fingerprint(frame)
+        self.stats['lookups'] += 1
+        self._update_frozen(fingerprint, now)
+
+        # Поиск с последнего использованного: при зависании совпадает первый же
+        entry_id, entry = None, None
+        for candidate_id in reversed(self.entries):
+            candidate_fingerprint, candidate = self.entries[candidate_id]
+            if self._matches(fingerprint, candidate_fingerprint):
+                entry_id, entry = candidate_id, candidate
+                break
+        self.stats['fingerprint_time'] += time.perf_counter() - start
+
+        if entry is not None and now - entry.created_at > self.ttl:
+            # Устаревший результат пересчитывается: модель или сцена могли измениться
+            del self.entries[entry_id]
+            self.stats['expired'] += 1
+            entry = None
+
+        if entry is None:
+            self.stats['misses'] += 1
+            return fingerprint, None
+
+        self.entries.move_to_end(entry_id)
+        self.stats['hits'] += 1
+        return fingerprint, entry
+
+    def _update_frozen(self, fingerprint: np.ndarray, now: float):
+        """Зависание - совпадение каждого кадра с предыдущим дольше frozen_after_sec"""
+        if self.last_fingerprint is None or not self._matches(fingerprint, self.last_fingerprint):
+            self.last_fingerprint = fingerprint
+            self.repeat_since = now
+            self.frozen = False
+            return
+
+        if not self.frozen and now - self.repeat_since >= self.frozen_after:
+            self.frozen = True
+            self.stats['frozen_events'] += 1
+
+    def store(self, fingerprint: np.ndarray, detections: PersonDetections, area: int, overlay: np.ndarray,
+              now: float = None):
+        """Сохранение результата кадра; самый давно использованный вытесняется"""
+        result = CachedResult(detections, area, overlay, now if now is not None else time.time())
+        self.entries[self.next_entry_id] = (fingerprint, result)
+        self.next_entry_id += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        """Сброс результатов (смена модели, зон или плиток); состояние потока сохраняется"""
+        self.entries.clear()
+
+    def reset(self):
+        """Сброс результатов и состояния потока (переподключение камеры)"""
+        self.clear()
+        self.last_fingerprint = None
+        self.repeat_since = None
+        self.frozen = False
+
+    def frozen_for(self, now: float = None) -> float:
+        """Сколько секунд кадр не меняется"""
+        if self.repeat_since is None:
+            return 0.0
+        return (now if now is not None else time.time()) - self.repeat_since
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        lookups = stats['lookups']
+        stats['entries'] = len(self.entries)
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        stats['avg_fingerprint_ms'] = round(stats.pop('fingerprint_time') / lookups * 1000, 3) if lookups else 0
+        stats['frozen'] = self.frozen
+        stats['unchanged_sec'] = round(self.frozen_for(), 1)
+        return stats
@@ -0,0 +1,184 @@
+"""
+roi_zones.py - Зоны интереса камеры: вырезка фрагментов кадра для inference и фильтрация людей
+"""
+
+import math
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from config import ROI_CONFIG, YOLO_CONFIG
+from detections import PersonDetections
+
+
+def fit_rect(x1: int, y1: int, x2: int, y2: int, min_size: int, width: int, height: int) -> Tuple[int, int, int, int]:
+    """Расширение прямоугольника до минимального размера и ограничение кадром width x height"""
+    for low, high, limit in ((0, 2, width), (1, 3, height)):
+        coords = [x1, y1, x2, y2]
+        shortage = min_size - (coords[high] - coords[low])
+        if shortage > 0:
+            coords[low] -= shortage // 2
+            coords[high] += shortage - shortage // 2
+        # Сдвиг внутрь кадра с сохранением размера, если возможно
+        if coords[low] < 0:
+            coords[high] -= coords[low]
+            coords[low] = 0
+        if coords[high] > limit:
+            coords[low] -= coords[high] - limit
+            coords[high] = limit
+        coords[low] = max(0, coords[low])
+        x1, y1, x2, y2 = coords
+    return int(x1), int(y1), int(x2), int(y2)
+
+
+def merge_rects(rects: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """Объединение пересекающихся прямоугольников, чтобы человек не попал в два фрагмента"""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+def crop_imgsz(rects: List[Tuple[int, int, int, int]]) -> int:
+    """Размер входа модели по наибольшему фрагменту (кратно 32, не больше базового)"""
+    longest_side = max((max(x2 - x1, y2 - y1) for x1, y1, x2, y2 in rects), default=0)
+    return min(YOLO_CONFIG['imgsz'], max(32, int(math.ceil(longest_side / 32)) * 32))
+
+
+class ZoneLayout:
+    """Неизменяемая раскладка зон камеры; заменяется целиком при изменении через API"""
+
+    def __init__(self, zones: List[dict], width: int, height: int):
+        self.zones = zones  # Нормализованные описания зон (для API)
+        self.width = width
+        self.height = height
+
+        # Маска всех зон в координатах кадра
+        self.zone_mask = np.zeros((height, width), np.uint8)
+        for zone in zones:
+            cv2.fillPoly(self.zone_mask, [np.array(zone['points'], np.int32)], 1)
+        self.zone_mask = self.zone_mask.astype(bool)
+
+        self.crop_rects = self._build_crop_rects()
+        crop_area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in self.crop_rects)
+        # Фрагменты почти на весь кадр не дают выигрыша - обрабатываем кадр целиком
+        self.full_frame = crop_area >= ROI_CONFIG['max_crop_fraction'] * width * height
+
+    @property
+    def crop_imgsz(self) -> int:
+        """Размер входа для фрагментов; считается при inference, так как базовый imgsz
+        задается init_device при загрузке моделей, уже после построения зон"""
+        return crop_imgsz(self.crop_rects)
+
+    @classmethod
+    def from_definitions(cls, definitions: list, width: int, height: int) -> 'ZoneLayout':
+        """Проверка описаний зон из API; ValueError при ошибке
+
+        Прямоугольник: {'name': ..., 'type': 'rect', 'rect': [x1, y1, x2, y2]}
+        Многоугольник: {'name': ..., 'type': 'polygon', 'points': [[x, y], ...]}
+        """
+        if not isinstance(definitions, list):
+            raise ValueError("Зоны должны передаваться списком")
+        if len(definitions) > ROI_CONFIG['max_zones']:
+            raise ValueError(f"Не больше {ROI_CONFIG['max_zones']} зон на камеру")
+
+        zones = []
+        for index, definition in enumerate(definitions):
+            if not isinstance(definition, dict):
+                raise ValueError(f"Зона {index}: ожидается объект")
+
+            zone_type = definition.get('type', 'rect')
+            if zone_type == 'rect':
+                rect = definition.get('rect')
+                if not isinstance(rect, (list, tuple)) or len(rect) != 4:
+                    raise ValueError(f"Зона {index}: rect должен быть [x1, y1, x2, y2]")
+                x1, y1, x2, y2 = (int(value) for value in rect)
+                points = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+            elif zone_type == 'polygon':
+                raw_points = definition.get('points')
+                if not isinstance(raw_points, (list, tuple)) or len(raw_points) < 3:
+                    raise ValueError(f"Зона {index}: многоугольник задается минимум тремя точками")
+                points = [[int(point[0]), int(point[1])] for point in raw_points]
+            else:
+                raise ValueError(f"Зона {index}: неизвестный тип {zone_type}")
+
+            for x, y in points:
+                if not (0 <= x <= width and 0 <= y <= height):
+                    raise ValueError(f"Зона {index}: точка ({x}, {y}) вне кадра {width}x{height}")
+
+            xs = [x for x, _ in points]
+            ys = [y for _, y in points]
+            if max(xs) - min(xs) < 2 or max(ys) - min(ys) < 2:
+                raise ValueError(f"Зона {index}: пустая область")
+
+            zones.append({
+                'name': str(definition.get('name', f'zone{index + 1}')),
+                'type': zone_type,
+                'points': points
+            })
+
+        return cls(zones, width, height)
+
+    def _build_crop_rects(self) -> List[Tuple[int, int, int, int]]:
+        """Прямоугольники вырезки: рамки зон с отступом, пересекающиеся объединяются"""
+        padding = ROI_CONFIG['crop_padding']
+        min_size = ROI_CONFIG['min_crop_size']
+
+        rects = []
+        for zone in self.zones:
+            points = np.array(zone['points'])
+            x1, y1 = points.min(axis=0) - padding
+            x2, y2 = points.max(axis=0) + padding
+            rects.append(fit_rect(x1, y1, x2, y2, min_size, self.width, self.height))
+
+        return merge_rects(rects)
+
+    def filter_detections(self, detections: PersonDetections) -> PersonDetections:
+        """Только люди внутри зон; маски обрезаются по зонам (площадь считается в зонах)"""
+        keep = []
+        masks = []
+        for i in range(len(detections)):
+            x1, y1, x2, y2 = detections.rects[i]
+            mask = detections.masks[i]
+            if mask is not None:
+                clipped = mask & self.zone_mask[y1:y2, x1:x2]
+                if clipped.any():
+                    keep.append(i)
+                    masks.append(clipped)
+            else:
+                # Без маски человек относится к зоне по точке опоры (низ бокса)
+                foot_x = min(int((x1 + x2) / 2), self.width - 1)
+                foot_y = max(min(y2 - 1, self.height - 1), 0)
+                if self.zone_mask[foot_y, foot_x]:
+                    keep.append(i)
+                    masks.append(None)
+
+        filtered = detections.select(keep)
+        filtered.masks = masks
+        return filtered
+
+    def draw(self, frame):
+        """Контуры зон на кадре (кадр изменяется на месте)"""
+        for zone in self.zones:
+            cv2.polylines(frame, [np.array(zone['points'], np.int32)], True, (255, 200, 0), 2)
+        return frame
+
+    def to_dict(self) -> dict:
+        return {
+            'zones': self.zones,
+            'crop_rects': [list(rect) for rect in self.crop_rects],
+            'full_frame_inference': self.full_frame,
+            'crop_imgsz': self.crop_imgsz
+        }
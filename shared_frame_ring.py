@@ -0,0 +1,127 @@
+"""
+shared_frame_ring.py - Кольцевой буфер кадров фиксированной формы в разделяемой памяти
+"""
+
+import logging
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Флаги назначения кадра
+FRAME_FLAG_PREVIEW = 1
+FRAME_FLAG_INFERENCE = 2
+
+# Счетчики в заголовке буфера
+HEADER_WRITE_SEQ = 0
+HEADER_GRABBED = 1
+HEADER_SKIPPED = 2
+HEADER_RETRIEVE_NS = 3
+HEADER_SOURCE_DONE = 4  # Источник без повтора закончился
+HEADER_FIELDS = 5
+
+
+class SharedFrameRing:
+    """Кольцо из N слотов кадров: один писатель, читатели получают numpy-представления без копий"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, shape: Tuple[int, int, int], slots: int, owner: bool):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = owner
+
+        # Раскладка: заголовок, номера кадров слотов, флаги, время захвата, время декодирования, кадры.
+        # Номер слота равен -1 на время записи, поэтому читатель может проверить
+        # вызовом is_valid(seq), что кадр не перезаписан, пока он им пользовался
+        offset = 0
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.header.nbytes
+        self.slot_seqs = np.ndarray((slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.slot_seqs.nbytes
+        self.slot_flags = np.ndarray((slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.slot_flags.nbytes
+        self.slot_times = np.ndarray((slots,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self.slot_times.nbytes
+        self.slot_decode = np.ndarray((slots,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self.slot_decode.nbytes
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def _required_size(shape: Tuple[int, int, int], slots: int) -> int:
+        """Размер блока разделяемой памяти"""
+        return 8 * (HEADER_FIELDS + 4 * slots) + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, shape: Tuple[int, int, int], slots: int) -> 'SharedFrameRing':
+        """Создание нового буфера (владелец отвечает за unlink)"""
+        shm = shared_memory.SharedMemory(create=True, size=cls._required_size(shape, slots))
+        ring = cls(shm, shape, slots, owner=True)
+        ring.header[:] = 0
+        ring.slot_seqs[:] = -1
+        ring.slot_flags[:] = 0
+        ring.slot_times[:] = 0
+        ring.slot_decode[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, shape: Tuple[int, int, int], slots: int) -> 'SharedFrameRing':
+        """Подключение к существующему буферу по имени"""
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, shape, slots, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, frame: np.ndarray, flags: int, captured_at: float, decode_time: float = 0.0) -> int:
+        """Запись кадра в следующий слот (только процесс захвата)"""
+        seq = int(self.header[HEADER_WRITE_SEQ]) + 1
+        slot = seq % self.slots
+
+        self.slot_seqs[slot] = -1
+        self.frames[slot][...] = frame
+        self.slot_flags[slot] = flags
+        self.slot_times[slot] = captured_at
+        self.slot_decode[slot] = decode_time
+        self.slot_seqs[slot] = seq
+        self.header[HEADER_WRITE_SEQ] = seq
+        return seq
+
+    def latest_seq(self) -> int:
+        """Номер последнего записанного кадра (0 - кадров еще нет)"""
+        return int(self.header[HEADER_WRITE_SEQ])
+
+    def read(self, seq: int) -> Optional[Tuple[np.ndarray, int, float, float]]:
+        """Кадр по номеру без копирования (кадр, флаги, время захвата, время декодирования) или None"""
+        slot = seq % self.slots
+        if self.slot_seqs[slot] != seq:
+            return None
+        return self.frames[slot], int(self.slot_flags[slot]), float(self.slot_times[slot]), float(self.slot_decode[slot])
+
+    def is_valid(self, seq: int) -> bool:
+        """Проверка, что кадр с номером seq еще не перезаписан"""
+        return self.slot_seqs[seq % self.slots] == seq
+
+    def add_counter(self, field: int, value: int = 1):
+        """Увеличение счетчика в заголовке (только процесс захвата)"""
+        self.header[field] += value
+
+    def get_counter(self, field: int) -> int:
+        """Значение счетчика из заголовка"""
+        return int(self.header[field])
+
+    def close(self):
+        """Отключение от буфера; владелец также удаляет блок памяти"""
+        # Представления должны быть освобождены до закрытия блока
+        self.header = self.slot_seqs = self.slot_flags = self.slot_times = self.slot_decode = self.frames = None
+        try:
+            if self.owner:
+                self.shm.unlink()
+            self.shm.close()
+        except BufferError:
+            # Кто-то еще держит представление кадра - блок освободится сборщиком мусора
+            logger.debug(f"Разделяемая память {self.shm.name} еще используется читателями")
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка закрытия разделяемой памяти {self.shm.name}: {e}")
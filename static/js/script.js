@@ -2,8 +2,8 @@
 let statusCheckInterval;
 let segmentationUpdateInterval;
 let cameraStates = {
-    camera1: { connected: false, processing: false, segmentation_area: 0 },
-    camera2: { connected: false, processing: false, segmentation_area: 0 }
+    camera1: { connected: false, processing: false, connection_status: 'disconnected', segmentation_area: 0 },
+    camera2: { connected: false, processing: false, connection_status: 'disconnected', segmentation_area: 0 }
 };
 
 let segmentationStats = {
@@ -97,7 +97,18 @@ async function connectCamera(cameraId) {
         
         const result = await response.json();
         
-        if (result.status === 'success') {
+        if (result.status === 'success' && result.connection_status === 'pending') {
+            // Подключение выполняется на сервере в фоне, состояние придет с обновлением статуса
+            updateCameraStatus(cameraId, false, false, 'pending');
+            startVideoStreams(cameraId);
+            logMessage(`Камера ${num}: подключение запущено`, 'success');
+            showNotification(`Камера ${num} подключается...`, 'success');
+            
+            // Обновление интерфейса (отключение отменяет попытки подключения)
+            connectBtn.style.display = 'none';
+            disconnectBtn.style.display = 'inline-block';
+            
+        } else if (result.status === 'success') {
             // Успешное подключение
             updateCameraStatus(cameraId, true, false);
             startVideoStreams(cameraId);
@@ -148,7 +159,7 @@ async function disconnectCamera(cameraId) {
         
         if (result.status === 'success') {
             // Успешное отключение
-            updateCameraStatus(cameraId, false, false);
+            updateCameraStatus(cameraId, false, false, 'disconnected');
             stopVideoStreams(cameraId);
             
             // Сбрасываем площадь сегментации
@@ -178,37 +189,42 @@ async function checkCameraStatus() {
         const response = await fetch('/camera_status');
         const status = await response.json();
         
-        // Обновление статуса камер
-        updateCameraStatus('camera1', status.camera1.connected, status.camera1.processing);
-        updateCameraStatus('camera2', status.camera2.connected, status.camera2.processing);
-        
-        // Обновление площади сегментации
-        updateSegmentationArea('camera1', status.camera1.segmentation_area || 0);
-        updateSegmentationArea('camera2', status.camera2.segmentation_area || 0);
+        for (const cameraId of ['camera1', 'camera2']) {
+            const num = cameraId === 'camera1' ? '1' : '2';
+            const camera = getCameraStatus(status, cameraId);
+            
+            // Обновление статуса и площади сегментации камеры
+            updateCameraStatus(cameraId, camera.connected, camera.processing, camera.connection_status);
+            updateSegmentationArea(cameraId, camera.segmentation_area || 0);
+            
+            // Запуск видео потока для подключенной камеры
+            if (camera.connected || isConnecting(camera.connection_status)) {
+                startVideoStreams(cameraId);
+                document.getElementById(`connect${num}`).style.display = 'none';
+                document.getElementById(`disconnect${num}`).style.display = 'inline-block';
+            }
+        }
         
         // Обновление произведения площадей
         updateAreaProduct(status.area_product || 0);
         
-        // Запуск видео потоков для подключенных камер
-        if (status.camera1.connected) {
-            startVideoStreams('camera1');
-            document.getElementById('connect1').style.display = 'none';
-            document.getElementById('disconnect1').style.display = 'inline-block';
-        }
-        
-        if (status.camera2.connected) {
-            startVideoStreams('camera2');
-            document.getElementById('connect2').style.display = 'none';
-            document.getElementById('disconnect2').style.display = 'inline-block';
-        }
-        
     } catch (error) {
         logMessage(`Ошибка проверки статуса камер: ${error.message}`, 'error');
     }
 }
 
+// Статус камеры из ответа /camera_status; удаленная через API камера отображается отключенной
+function getCameraStatus(status, cameraId) {
+    return status[cameraId] || { connected: false, processing: false, connection_status: 'disconnected', segmentation_area: 0 };
+}
+
+// Камера подключается или переподключается в фоне
+function isConnecting(connectionStatus) {
+    return connectionStatus === 'pending' || connectionStatus === 'reconnecting';
+}
+
 // Обновление статуса камеры
-function updateCameraStatus(cameraId, connected, processing) {
+function updateCameraStatus(cameraId, connected, processing, connectionStatus) {
     const num = cameraId === 'camera1' ? '1' : '2';
     const statusElement = document.getElementById(`status${num}`);
     
@@ -219,8 +235,14 @@ function updateCameraStatus(cameraId, connected, processing) {
     
     cameraStates[cameraId].connected = connected;
     cameraStates[cameraId].processing = processing;
+    if (connectionStatus !== undefined) {
+        cameraStates[cameraId].connection_status = connectionStatus;
+    }
     
-    if (connected && processing) {
+    if (!connected && isConnecting(connectionStatus)) {
+        indicator.className = 'status-indicator disconnected';
+        text.textContent = connectionStatus === 'pending' ? 'Подключение...' : 'Переподключение...';
+    } else if (connected && processing) {
         indicator.className = 'status-indicator processing';
         text.textContent = 'Обработка';
     } else if (connected) {
@@ -398,20 +420,19 @@ function startStatusUpdates() {
             const response = await fetch('/camera_status');
             const status = await response.json();
             
-            // Проверка изменений в статусе камер
-            if (status.camera1.connected !== cameraStates.camera1.connected ||
-                status.camera1.processing !== cameraStates.camera1.processing) {
-                updateCameraStatus('camera1', status.camera1.connected, status.camera1.processing);
+            for (const cameraId of ['camera1', 'camera2']) {
+                const camera = getCameraStatus(status, cameraId);
+                
+                // Проверка изменений в статусе камеры
+                if (camera.connected !== cameraStates[cameraId].connected ||
+                    camera.processing !== cameraStates[cameraId].processing ||
+                    camera.connection_status !== cameraStates[cameraId].connection_status) {
+                    updateCameraStatus(cameraId, camera.connected, camera.processing, camera.connection_status);
+                }
+                
+                // Обновление площади сегментации
+                updateSegmentationArea(cameraId, camera.segmentation_area || 0);
             }
-            
-            if (status.camera2.connected !== cameraStates.camera2.connected ||
-                status.camera2.processing !== cameraStates.camera2.processing) {
-                updateCameraStatus('camera2', status.camera2.connected, status.camera2.processing);
-            }
-            
-            // Обновление площади сегментации
-            updateSegmentationArea('camera1', status.camera1.segmentation_area || 0);
-            updateSegmentationArea('camera2', status.camera2.segmentation_area || 0);
             updateAreaProduct(status.area_product || 0);
             
         } catch (error) {
@@ -0,0 +1,176 @@
+"""
+tiling.py - Inference по перекрывающимся плиткам кадра исходного разрешения с объединением детекций
+"""
+
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from config import TILING_CONFIG
+from detections import PersonDetections
+
+
+class TiledInference:
+    """Разбиение кадра на плитки и слияние детекций соседних плиток (NMS по IoU и IoS)"""
+
+    def __init__(self, tile_size: int, overlap: float):
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.nms_iou = TILING_CONFIG['nms_iou']
+        self.nms_ios = TILING_CONFIG['nms_ios']
+        self.merge_masks = TILING_CONFIG['merge_masks']
+
+        self._rects_cache: Dict[Tuple[int, int], List[Tuple[int, int, int, int]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'frames': 0,
+            'tiles': 0,
+            'inference_time': 0.0,
+            'detections_before_merge': 0,
+            'detections_after_merge': 0
+        }
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> 'TiledInference':
+        """Проверка настроек плиток из API; ValueError при ошибке"""
+        if not isinstance(settings, dict):
+            raise ValueError("Настройки плиток должны передаваться объектом")
+
+        try:
+            tile_size = int(settings.get('tile_size', TILING_CONFIG['tile_size']))
+            overlap = float(settings.get('overlap', TILING_CONFIG['overlap']))
+        except (TypeError, ValueError):
+            raise ValueError("tile_size и overlap должны быть числами")
+
+        min_size, max_size = TILING_CONFIG['min_tile_size'], TILING_CONFIG['max_tile_size']
+        if not min_size <= tile_size <= max_size or tile_size % 32:
+            raise ValueError(f"tile_size должен быть кратен 32 и лежать в диапазоне {min_size}-{max_size}")
+        if not 0 <= overlap <= TILING_CONFIG['max_overlap']:
+            raise ValueError(f"overlap должен лежать в диапазоне 0-{TILING_CONFIG['max_overlap']}")
+
+        return cls(tile_size, overlap)
+
+    def tile_rects(self, frame_shape: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        """Плитки (x1, y1, x2, y2), покрывающие кадр с заданным перекрытием"""
+        frame_shape = tuple(frame_shape[:2])
+        rects = self._rects_cache.get(frame_shape)
+        if rects is None:
+            frame_h, frame_w = frame_shape
+            xs = self._axis_starts(frame_w)
+            ys = self._axis_starts(frame_h)
+            rects = [
+                (x, y, min(x + self.tile_size, frame_w), min(y + self.tile_size, frame_h))
+                for y in ys for x in xs
+            ]
+            self._rects_cache[frame_shape] = rects
+        return rects
+
+    def _axis_starts(self, length: int) -> List[int]:
+        """Начала плиток по одной оси; последняя плитка прижимается к краю кадра"""
+        if length <= self.tile_size:
+            return [0]
+
+        step = max(1, int(self.tile_size * (1 - self.overlap)))
+        starts = list(range(0, length - self.tile_size, step))
+        starts.append(length - self.tile_size)
+        return starts
+
+    def merge(self, detections: PersonDetections) -> PersonDetections:
+        """Подавление дублей на стыках плиток; маски подавленных дублей объединяются с оставшейся"""
+        count = len(detections)
+        if count < 2:
+            self._count_merge(count, count)
+            return detections
+
+        boxes = detections.boxes
+        areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+        order = np.argsort(-detections.scores)
+        suppressed = np.zeros(count, bool)
+        rects = detections.rects.copy()
+        masks = list(detections.masks)
+        keep = []
+
+        for position, i in enumerate(order):
+            if suppressed[i]:
+                continue
+            keep.append(i)
+
+            others = order[position + 1:]
+            others = others[~suppressed[others]]
+            if others.size == 0:
+                continue
+
+            # Пересечение с оставшимися боксами
+            inter_w = np.clip(np.minimum(boxes[i, 2], boxes[others, 2]) - np.maximum(boxes[i, 0], boxes[others, 0]), 0, None)
+            inter_h = np.clip(np.minimum(boxes[i, 3], boxes[others, 3]) - np.maximum(boxes[i, 1], boxes[others, 1]), 0, None)
+            intersection = inter_w * inter_h
+            union = areas[i] + areas[others] - intersection
+            iou = intersection / np.maximum(union, 1e-6)
+            # IoS: человек, обрезанный краем плитки, почти целиком лежит внутри полного бокса
+            ios = intersection / np.maximum(np.minimum(areas[i], areas[others]), 1e-6)
+
+            duplicates = others[(iou >= self.nms_iou) | (ios >= self.nms_ios)]
+            suppressed[duplicates] = True
+
+            if self.merge_masks:
+                for j in duplicates:
+                    if masks[i] is not None and masks[j] is not None:
+                        rects[i], masks[i] = self._union_masks(rects[i], masks[i], rects[j], masks[j])
+
+        merged = PersonDetections(
+            boxes[keep],
+            detections.scores[keep],
+            rects[keep],
+            [masks[i] for i in keep]
+        )
+        # Бокс оставшейся детекции расширяется до объединенной маски
+        if self.merge_masks:
+            merged.boxes[:, :2] = np.minimum(merged.boxes[:, :2], merged.rects[:, :2])
+            merged.boxes[:, 2:] = np.maximum(merged.boxes[:, 2:], merged.rects[:, 2:])
+
+        self._count_merge(count, len(merged))
+        return merged
+
+    @staticmethod
+    def _union_masks(rect_a, mask_a: np.ndarray, rect_b, mask_b: np.ndarray):
+        """Объединение двух масок, заданных в своих прямоугольниках"""
+        x1 = min(rect_a[0], rect_b[0])
+        y1 = min(rect_a[1], rect_b[1])
+        x2 = max(rect_a[2], rect_b[2])
+        y2 = max(rect_a[3], rect_b[3])
+
+        union = np.zeros((y2 - y1, x2 - x1), bool)
+        for (rx1, ry1, rx2, ry2), mask in ((rect_a, mask_a), (rect_b, mask_b)):
+            union[ry1 - y1:ry2 - y1, rx1 - x1:rx2 - x1] |= mask
+        return np.array([x1, y1, x2, y2], np.int32), union
+
+    def _count_merge(self, before_merge: int, after_merge: int):
+        with self._lock:
+            self.stats['detections_before_merge'] += before_merge
+            self.stats['detections_after_merge'] += after_merge
+
+    def record(self, elapsed: float, tiles: int):
+        """Учет стоимости плиточного inference одного кадра"""
+        with self._lock:
+            self.stats['frames'] += 1
+            self.stats['tiles'] += tiles
+            self.stats['inference_time'] += elapsed
+
+    def get_stats(self) -> dict:
+        """Стоимость плиток: плиток на кадр, время на плитку и на кадр, число слитых дублей"""
+        with self._lock:
+            stats = dict(self.stats)
+
+        frames = stats['frames']
+        tiles = stats['tiles']
+        return {
+            'enabled': True,
+            'tile_size': self.tile_size,
+            'overlap': self.overlap,
+            'frames': frames,
+            'tiles_per_frame': round(tiles / frames, 1) if frames else 0,
+            'avg_tile_ms': round(stats['inference_time'] / tiles * 1000, 2) if tiles else 0,
+            'avg_frame_ms': round(stats['inference_time'] / frames * 1000, 2) if frames else 0,
+            'merged_duplicates': stats['detections_before_merge'] - stats['detections_after_merge']
+        }
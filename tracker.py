@@ -0,0 +1,286 @@
+"""
+tracker.py - Сопровождение людей между ключевыми кадрами (фильтр Калмана + сопоставление по IoU)
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import TRACKER_CONFIG
+from detections import PersonDetections
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Матрица IoU боксов xyxy (len(a) x len(b))"""
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+class BoxTrack:
+    """Трек одного человека: состояние [cx, cy, w, h, vx, vy, vw, vh] с постоянной скоростью"""
+
+    __slots__ = ('track_id', 'x', 'P', 'score', 'mask', 'mask_rect', 'mask_center',
+                 'hits', 'missed', 'alarmed')
+
+    def __init__(self, track_id: int, box: np.ndarray, score: float, rect: np.ndarray, mask: Optional[np.ndarray]):
+        self.track_id = track_id
+        self.x = np.zeros(8)
+        self.x[:4] = self._box_to_measurement(box)
+
+        position_var = TRACKER_CONFIG['measurement_std'] ** 2
+        velocity_var = TRACKER_CONFIG['initial_velocity_std'] ** 2
+        self.P = np.diag([position_var] * 4 + [velocity_var] * 4)
+
+        self.hits = 1
+        self.missed = 0
+        self.alarmed = False
+        self._set_observation(score, rect, mask)
+
+    @staticmethod
+    def _box_to_measurement(box: np.ndarray) -> np.ndarray:
+        x1, y1, x2, y2 = box
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+    def _set_observation(self, score: float, rect: np.ndarray, mask: Optional[np.ndarray]):
+        """Маска последней детекции; на промежуточных кадрах сдвигается вместе с центром бокса"""
+        self.score = float(score)
+        self.mask = mask
+        self.mask_rect = rect.copy()
+        self.mask_center = self.x[:2].copy()
+
+    def predict(self, dt: float):
+        """Прогноз состояния через dt секунд"""
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4) * dt
+
+        # Шум процесса: случайное ускорение
+        acceleration_var = TRACKER_CONFIG['acceleration_std'] ** 2
+        q = np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]]) * acceleration_var
+        Q = np.zeros((8, 8))
+        for i in range(4):
+            Q[np.ix_([i, i + 4], [i, i + 4])] = q
+
+        self.x = F @ self.x
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+        self.P = F @ self.P @ F.T + Q
+
+    def update(self, box: np.ndarray, score: float, rect: np.ndarray, mask: Optional[np.ndarray]):
+        """Коррекция состояния по сопоставленной детекции"""
+        H = np.zeros((4, 8))
+        H[:, :4] = np.eye(4)
+        R = np.eye(4) * TRACKER_CONFIG['measurement_std'] ** 2
+
+        innovation = self._box_to_measurement(box) - H @ self.x
+        S = H @ self.P @ H.T + R
+        K = self.P @ H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ innovation
+        self.P = (np.eye(8) - K @ H) @ self.P
+
+        self.hits += 1
+        self.missed = 0
+        self._set_observation(score, rect, mask)
+
+    def box(self) -> np.ndarray:
+        cx, cy, w, h = self.x[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], np.float32)
+
+    def shifted_mask(self, frame_shape: Tuple[int, int]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Прямоугольник и маска последней детекции, сдвинутые к прогнозу (обрезаются кадром)"""
+        dx, dy = np.round(self.x[:2] - self.mask_center).astype(int)
+        x1, y1, x2, y2 = self.mask_rect + np.array([dx, dy, dx, dy])
+        frame_h, frame_w = frame_shape
+
+        clipped = np.array([
+            min(max(x1, 0), frame_w), min(max(y1, 0), frame_h),
+            min(max(x2, 0), frame_w), min(max(y2, 0), frame_h)
+        ], np.int32)
+        clipped[2] = max(clipped[2], clipped[0])
+        clipped[3] = max(clipped[3], clipped[1])
+
+        if self.mask is None:
+            return clipped, None
+        mask = self.mask[clipped[1] - y1:clipped[3] - y1, clipped[0] - x1:clipped[2] - x1]
+        return clipped, mask
+
+
+class PersonTracker:
+    """Треки людей камеры: inference только на ключевых кадрах, между ними - прогноз
+
+    Ключевой кадр - каждый keyframe_interval-й обработанный кадр, но не реже
+    max_keyframe_gap секунд. Идентификаторы треков используются для подавления
+    повторных алармов по одному и тому же человеку
+    """
+
+    def __init__(self):
+        self.keyframe_interval = TRACKER_CONFIG['keyframe_interval']
+        self.max_keyframe_gap = TRACKER_CONFIG['max_keyframe_gap']
+        self.iou_threshold = TRACKER_CONFIG['iou_threshold']
+        self.max_missed = TRACKER_CONFIG['max_missed']
+        self.min_hits = TRACKER_CONFIG['min_hits']
+
+        self.tracks: List[BoxTrack] = []
+        self.next_track_id = 1
+        self.last_update_time: Optional[float] = None
+        self.last_keyframe_time: Optional[float] = None
+        self.frames_since_keyframe = 0
+        self.lock = threading.Lock()
+
+        self.stats = {
+            'keyframes': 0,
+            'propagated_frames': 0,
+            'tracks_created': 0,
+            'tracks_lost': 0,
+            'alarms_suppressed': 0
+        }
+
+    def reset(self):
+        """Сброс треков (смена зон, плиток или переподключение камеры)"""
+        with self.lock:
+            self.tracks = []
+            self.last_update_time = None
+            self.last_keyframe_time = None
+            self.frames_since_keyframe = 0
+
+    def needs_keyframe(self, now: float) -> bool:
+        """Нужен ли inference для текущего кадра"""
+        if self.last_keyframe_time is None:
+            return True
+        if now - self.last_keyframe_time >= self.max_keyframe_gap:
+            return True
+        return self.frames_since_keyframe + 1 >= self.keyframe_interval
+
+    def _predict(self, now: float):
+        dt = now - self.last_update_time if self.last_update_time is not None else 0.0
+        if dt > 0:
+            for track in self.tracks:
+                track.predict(dt)
+        self.last_update_time = now
+
+    def update(self, detections: PersonDetections, now: float) -> PersonDetections:
+        """Ключевой кадр: сопоставление детекций с треками; детекции с идентификаторами треков"""
+        with self.lock:
+            self._predict(now)
+            self.last_keyframe_time = now
+            self.frames_since_keyframe = 0
+            self.stats['keyframes'] += 1
+
+            matches, unmatched_detections = self._associate(detections)
+            matched_tracks = set()
+            detection_tracks = {}
+            for track_index, detection_index in matches:
+                track = self.tracks[track_index]
+                track.update(detections.boxes[detection_index], detections.scores[detection_index],
+                             detections.rects[detection_index], detections.masks[detection_index])
+                matched_tracks.add(track_index)
+                detection_tracks[detection_index] = track
+
+            # Несопоставленные треки живут max_missed ключевых кадров
+            alive = []
+            for index, track in enumerate(self.tracks):
+                if index not in matched_tracks:
+                    track.missed += 1
+                    if track.missed > self.max_missed:
+                        self.stats['tracks_lost'] += 1
+                        continue
+                alive.append(track)
+            self.tracks = alive
+
+            for detection_index in unmatched_detections:
+                track = BoxTrack(self.next_track_id, detections.boxes[detection_index],
+                                 detections.scores[detection_index], detections.rects[detection_index],
+                                 detections.masks[detection_index])
+                self.next_track_id += 1
+                self.tracks.append(track)
+                self.stats['tracks_created'] += 1
+                detection_tracks[detection_index] = track
+
+            # Возвращаются только подтвержденные треки (min_hits попаданий)
+            keep = [index for index in range(len(detections))
+                    if detection_tracks[index].hits >= self.min_hits]
+            result = detections.select(keep)
+            result.track_ids = [detection_tracks[index].track_id for index in keep]
+            return result
+
+    def _associate(self, detections: PersonDetections):
+        """Жадное сопоставление по убыванию IoU прогноза и детекции"""
+        if not self.tracks or not len(detections):
+            return [], list(range(len(detections)))
+
+        track_boxes = np.array([track.box() for track in self.tracks])
+        iou = box_iou(track_boxes, detections.boxes)
+
+        matches = []
+        used_tracks, used_detections = set(), set()
+        for flat_index in np.argsort(-iou, axis=None):
+            track_index, detection_index = np.unravel_index(flat_index, iou.shape)
+            if iou[track_index, detection_index] < self.iou_threshold:
+                break
+            if track_index in used_tracks or detection_index in used_detections:
+                continue
+            matches.append((int(track_index), int(detection_index)))
+            used_tracks.add(track_index)
+            used_detections.add(detection_index)
+
+        unmatched = [index for index in range(len(detections)) if index not in used_detections]
+        return matches, unmatched
+
+    def propagate(self, now: float, frame_shape: Tuple[int, int]) -> PersonDetections:
+        """Промежуточный кадр: прогноз боксов и сдвиг масок подтвержденных треков"""
+        with self.lock:
+            self._predict(now)
+            self.frames_since_keyframe += 1
+            self.stats['propagated_frames'] += 1
+
+            tracks = [track for track in self.tracks if track.missed == 0 and track.hits >= self.min_hits]
+            if not tracks:
+                return PersonDetections.empty()
+
+            rects, masks = [], []
+            for track in tracks:
+                rect, mask = track.shifted_mask(frame_shape)
+                rects.append(rect)
+                masks.append(mask)
+
+            return PersonDetections(
+                np.array([track.box() for track in tracks], np.float32),
+                np.array([track.score for track in tracks], np.float32),
+                np.array(rects, np.int32),
+                masks,
+                [track.track_id for track in tracks]
+            )
+
+    def take_unalarmed(self, track_ids: List[int]) -> List[int]:
+        """Треки из track_ids, по которым еще не было аларма"""
+        with self.lock:
+            ids = set(track_ids)
+            unalarmed = [track.track_id for track in self.tracks if track.track_id in ids and not track.alarmed]
+            if not unalarmed:
+                self.stats['alarms_suppressed'] += 1
+            return unalarmed
+
+    def mark_alarmed(self, track_ids: List[int]):
+        with self.lock:
+            ids = set(track_ids)
+            for track in self.tracks:
+                if track.track_id in ids:
+                    track.alarmed = True
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['active_tracks'] = sum(1 for track in self.tracks if track.hits >= self.min_hits)
+
+        frames = stats['keyframes'] + stats['propagated_frames']
+        stats['enabled'] = True
+        stats['keyframe_interval'] = self.keyframe_interval
+        stats['keyframe_ratio'] = round(stats['keyframes'] / frames, 3) if frames else 0
+        return stats